@@ -8,6 +8,7 @@ from login import auth_bp, _current_user_claims
 from users import users_bp
 from scores import scores_bp
 from questions import questions_bp
+from exports import exports_bp
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv() 
@@ -23,6 +24,7 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(users_bp)
 app.register_blueprint(scores_bp)
 app.register_blueprint(questions_bp)
+app.register_blueprint(exports_bp)
 
 # --- Routes principales ---
 @app.route("/")
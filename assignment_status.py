@@ -0,0 +1,34 @@
+"""
+Status vocabulary of quiz assignments, shared by the list endpoints and exports.
+
+    pending      not started yet
+    in_progress  started, not finished
+    finished     finished, whatever the outcome (terminated included)
+    passed       finished and passed, not terminated
+    failed       finished and not passed, not terminated
+    terminated   ended by a critical violation
+
+ASSIGNMENT_STATUS maps each status to its Mongo filter; assignment_status()
+gives the single status reported for a document (terminated, passed, failed,
+in_progress or pending).
+"""
+
+from typing import Any, Dict
+
+
+ASSIGNMENT_STATUS: Dict[str, Dict[str, Any]] = {
+    "pending": {"started_at": None, "finished_at": None},
+    "in_progress": {"started_at": {"$ne": None}, "finished_at": None},
+    "finished": {"finished_at": {"$ne": None}},
+    "passed": {"finished_at": {"$ne": None}, "terminated": {"$ne": True}, "passed": True},
+    "failed": {"finished_at": {"$ne": None}, "terminated": {"$ne": True}, "passed": {"$ne": True}},
+    "terminated": {"terminated": True},
+}
+
+
+def assignment_status(doc: Dict[str, Any]) -> str:
+    if doc.get("terminated"):
+        return "terminated"
+    if doc.get("finished_at"):
+        return "passed" if doc.get("passed") else "failed"
+    return "in_progress" if doc.get("started_at") else "pending"
@@ -0,0 +1,193 @@
+"""
+Content-addressed storage for proctoring images.
+
+Images are stored once as binary (JPEG from the exam page) keyed by the
+SHA-256 of their bytes, in GridFS or in a directory on disk. Documents
+only keep the key, so the same capture logged twice is stored once.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+from typing import Optional, Tuple
+
+from configuration import get_db, IMAGE_STORE_BACKEND, IMAGE_STORE_DIR, IMAGE_STORE_BUCKET, IMAGE_THUMBNAIL_WIDTH
+
+
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+
+
+def decode_data_url(data_url: str) -> Optional[Tuple[bytes, str]]:
+    """Split a data URL (or bare base64) into (bytes, content type)."""
+    if not data_url or not isinstance(data_url, str):
+        return None
+    content_type = "image/jpeg"
+    payload = data_url
+    if data_url.startswith("data:") and "," in data_url:
+        header, payload = data_url.split(",", 1)
+        content_type = header[5:].split(";", 1)[0] or content_type
+    try:
+        data = base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        return None
+    return (data, content_type) if data else None
+
+
+class GridFSBackend:
+    """Blobs in a GridFS bucket, the file _id being the content key."""
+
+    def __init__(self, bucket: str) -> None:
+        self.bucket = bucket
+
+    def _fs(self):
+        import gridfs
+        return gridfs.GridFS(get_db(), collection=self.bucket)
+
+    def exists(self, key: str) -> bool:
+        return self._fs().exists(key)
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        from gridfs.errors import FileExists
+        try:
+            self._fs().put(data, _id=key, content_type=content_type)
+        except FileExists:
+            # Another request stored the same bytes first
+            pass
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        from gridfs.errors import NoFile
+        try:
+            f = self._fs().get(key)
+        except NoFile:
+            return None
+        return f.read(), (f.content_type or "image/jpeg")
+
+    def delete(self, key: str) -> None:
+        self._fs().delete(key)
+
+
+class DiskBackend:
+    """Blobs as files under ``root``, fanned out by the first two hex digits.
+
+    Keep ``root`` outside the app directory: every file under it is served
+    as a static file.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _path(self, key: str, content_type: str) -> str:
+        return os.path.join(self.root, key[:2], key + _EXTENSIONS.get(content_type, ".bin"))
+
+    def _find(self, key: str) -> Optional[Tuple[str, str]]:
+        for content_type in list(_EXTENSIONS) + ["application/octet-stream"]:
+            path = self._path(key, content_type)
+            if os.path.exists(path):
+                return path, content_type
+        return None
+
+    def exists(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        path = self._path(key, content_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        found = self._find(key)
+        if found is None:
+            return None
+        path, content_type = found
+        with open(path, "rb") as fp:
+            return fp.read(), content_type
+
+    def delete(self, key: str) -> None:
+        found = self._find(key)
+        if found is not None:
+            os.remove(found[0])
+
+
+class ImageStore:
+    """put/get images by content hash over a GridFS or disk backend."""
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data: bytes, content_type: str = "image/jpeg") -> str:
+        key = self.key_for(data)
+        if not self.backend.exists(key):
+            self.backend.put(key, data, content_type)
+        return key
+
+    def put_data_url(self, data_url: str) -> Optional[str]:
+        """Store a base64 data URL as binary; None if it does not decode."""
+        decoded = decode_data_url(data_url)
+        if decoded is None:
+            return None
+        return self.put(*decoded)
+
+    def get(self, key: Optional[str]) -> Optional[Tuple[bytes, str]]:
+        if not key:
+            return None
+        return self.backend.get(key)
+
+    def data_url(self, key: Optional[str]) -> Optional[str]:
+        """The stored image as a data URL, for callers that embed it inline."""
+        found = self.get(key)
+        if found is None:
+            return None
+        data, content_type = found
+        return f"data:{content_type};base64,{base64.b64encode(data).decode()}"
+
+    def thumbnail(self, key: str, width: int = IMAGE_THUMBNAIL_WIDTH,
+                  source: Optional[bytes] = None) -> Optional[Tuple[bytes, str]]:
+        """JPEG thumbnail of the image under ``key``, generated on first use and stored.
+
+        ``source`` supplies the original bytes when they are not in the store
+        (legacy inline images); only the thumbnail is stored then.
+        """
+        thumb_key = f"{key}.w{width}"
+        found = self.backend.get(thumb_key)
+        if found is not None:
+            return found
+        if source is None:
+            original = self.get(key)
+            if original is None:
+                return None
+            source = original[0]
+
+        import cv2
+        import numpy as np
+        img = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        h, w = img.shape[:2]
+        if w > width:
+            img = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if not ok:
+            return None
+        data = buf.tobytes()
+        self.backend.put(thumb_key, data, "image/jpeg")
+        return data, "image/jpeg"
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+
+def _make_backend():
+    if IMAGE_STORE_BACKEND == "disk":
+        return DiskBackend(IMAGE_STORE_DIR)
+    return GridFSBackend(IMAGE_STORE_BUCKET)
+
+
+image_store = ImageStore(_make_backend())
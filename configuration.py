@@ -20,6 +20,12 @@ ASSIGNMENTS_COLLECTION = "quiz_assignments"
 QUESTIONS_COLLECTION = "questions"
 SECTIONS_COLLECTION = "sections"
 USER_ATTEMPTS_COLLECTION = "user_attempts"
+PROCTORING_SESSIONS_COLLECTION = "proctoring_sessions"
+FACE_REFERENCES_COLLECTION = "face_references"
+STATS_COLLECTION = "stats"
+QUESTION_USAGE_COLLECTION = "question_usage"
+DAILY_ROLLUPS_COLLECTION = "daily_rollups"
+ITEM_ANALYSIS_COLLECTION = "item_analysis"
 
 JWT_SECRET = os.environ.get("JWT_SECRET", "dev-secret-change-me")
 JWT_ALG = "HS256"
@@ -37,6 +43,70 @@ SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
 SMTP_FROM_EMAIL = os.environ.get("SMTP_FROM_EMAIL", "noreply@oaca.local")
 SMTP_FROM_NAME = os.environ.get("SMTP_FROM_NAME", "OACA Aviation System")
 
+# --- Proctoring ---
+# "memory" keeps sessions in this process; "mongo" shares them between workers
+PROCTORING_SESSION_BACKEND = os.environ.get("PROCTORING_SESSION_BACKEND", "memory").lower()
+PROCTORING_SESSION_MAX = int(os.environ.get("PROCTORING_SESSION_MAX", "500"))
+PROCTORING_SESSION_TTL = int(os.environ.get("PROCTORING_SESSION_TTL", str(3 * 60 * 60)))
+REFERENCE_CACHE_SIZE = int(os.environ.get("REFERENCE_CACHE_SIZE", "256"))
+# Frame analysis runs in a process pool; 0 workers analyses inline on the request thread
+FRAME_ANALYSIS_WORKERS = int(os.environ.get("FRAME_ANALYSIS_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+FRAME_ANALYSIS_QUEUE = int(os.environ.get("FRAME_ANALYSIS_QUEUE", str(FRAME_ANALYSIS_WORKERS * 4 or 4)))
+FRAME_ANALYSIS_TIMEOUT = float(os.environ.get("FRAME_ANALYSIS_TIMEOUT", "5"))
+FRAME_RETRY_AFTER_MS = int(os.environ.get("FRAME_RETRY_AFTER_MS", "3000"))
+# Frames whose thumbnail barely differs from the last analysed one reuse its verdict
+FRAME_GATE_ENABLED = os.environ.get("FRAME_GATE_ENABLED", "true").lower() == "true"
+FRAME_GATE_THRESHOLD = float(os.environ.get("FRAME_GATE_THRESHOLD", "4.0"))
+FRAME_GATE_MAX_AGE = float(os.environ.get("FRAME_GATE_MAX_AGE", "10"))
+# Face detector backend: "haar" cascade, or "dnn" (res10 SSD via cv2.dnn, falls back to Haar without the model)
+FACE_DETECTOR = os.environ.get("FACE_DETECTOR", "haar").lower()
+_MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+FACE_DNN_PROTOTXT = os.environ.get("FACE_DNN_PROTOTXT", os.path.join(_MODELS_DIR, "res10_300x300_ssd_deploy.prototxt"))
+# The .caffemodel is in .vercelignore; serverless deployments set FACE_DNN_MODEL to a fetched copy
+FACE_DNN_MODEL = os.environ.get("FACE_DNN_MODEL", os.path.join(_MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel"))
+FACE_DNN_CONFIDENCE = float(os.environ.get("FACE_DNN_CONFIDENCE", "0.5"))
+# Seconds between runs of the expensive detectors (face count runs on every frame)
+CHECK_IDENTITY_INTERVAL = float(os.environ.get("CHECK_IDENTITY_INTERVAL", "4"))
+CHECK_EYES_INTERVAL = float(os.environ.get("CHECK_EYES_INTERVAL", "8"))
+# Frame cadence hinted to the client: tight while anomalous, relaxed once calm, stretched under load
+FRAME_INTERVAL_MS = int(os.environ.get("FRAME_INTERVAL_MS", "2000"))
+FRAME_INTERVAL_MIN_MS = int(os.environ.get("FRAME_INTERVAL_MIN_MS", "1000"))
+FRAME_INTERVAL_MAX_MS = int(os.environ.get("FRAME_INTERVAL_MAX_MS", "5000"))
+FRAME_INTERVAL_CEILING_MS = int(os.environ.get("FRAME_INTERVAL_CEILING_MS", "10000"))
+FRAME_CALM_FRAMES = int(os.environ.get("FRAME_CALM_FRAMES", "5"))
+# /ws/proctoring: idle seconds before the server closes the stream, largest accepted frame
+PROCTORING_STREAM_IDLE_TIMEOUT = float(os.environ.get("PROCTORING_STREAM_IDLE_TIMEOUT", "60"))
+PROCTORING_STREAM_MAX_FRAME = int(os.environ.get("PROCTORING_STREAM_MAX_FRAME", str(2 * 1024 * 1024)))
+# Browsers with a local face detector send heartbeats while nothing changes; the server audits them
+PRESCREEN_ENABLED = os.environ.get("PRESCREEN_ENABLED", "true").lower() == "true"
+PRESCREEN_AUDIT_RATE = float(os.environ.get("PRESCREEN_AUDIT_RATE", "0.1"))
+# Kept below the 15s no-face rule so a full frame is always analysed within its grace period
+PRESCREEN_MAX_GAP = float(os.environ.get("PRESCREEN_MAX_GAP", "10"))
+PRESCREEN_MAX_MISSED_AUDITS = int(os.environ.get("PRESCREEN_MAX_MISSED_AUDITS", "3"))
+# Repeats of a non-critical violation within this many seconds become one log entry (0 writes each at once)
+VIOLATION_COALESCE_WINDOW = float(os.environ.get("VIOLATION_COALESCE_WINDOW", "10"))
+VIOLATION_FLUSH_BATCH = int(os.environ.get("VIOLATION_FLUSH_BATCH", "100"))
+
+# --- Platform statistics ---
+# Counters are kept up to date on write and recomputed from the collections this often (seconds)
+STATS_RECONCILE_INTERVAL = float(os.environ.get("STATS_RECONCILE_INTERVAL", "3600"))
+# Public /api/stats/* responses are cached per process (and by browsers/CDN) for a per-endpoint TTL
+STATS_CACHE_ENABLED = os.environ.get("STATS_CACHE_ENABLED", "true").lower() == "true"
+# email -> display name lookups shared by endpoints that decorate results with user names
+USER_PROFILE_CACHE_TTL = float(os.environ.get("USER_PROFILE_CACHE_TTL", "300"))
+USER_PROFILE_CACHE_SIZE = int(os.environ.get("USER_PROFILE_CACHE_SIZE", "2048"))
+# Item analysis reads finished assignments this many at a time into one response matrix
+ITEM_ANALYSIS_CHUNK_SIZE = int(os.environ.get("ITEM_ANALYSIS_CHUNK_SIZE", "5000"))
+
+# --- Image store ---
+# Violation and reference images: "gridfs" (in MONGO_URI) or "disk" under IMAGE_STORE_DIR.
+# The app directory is served as static files, so the disk store lives outside it.
+IMAGE_STORE_BACKEND = os.environ.get("IMAGE_STORE_BACKEND", "gridfs").lower()
+IMAGE_STORE_DIR = os.environ.get("IMAGE_STORE_DIR", os.path.join(os.path.expanduser("~"), ".oaca", "images"))
+IMAGE_STORE_BUCKET = os.environ.get("IMAGE_STORE_BUCKET", "images")
+# Width in pixels of violation thumbnails (generated once, then kept in the image store)
+IMAGE_THUMBNAIL_WIDTH = int(os.environ.get("IMAGE_THUMBNAIL_WIDTH", "160"))
+
 # Debug: Print SMTP configuration on startup
 print(f"[CONFIG] SMTP_USERNAME loaded: {'SET' if SMTP_USERNAME else 'NOT SET'}")
 print(f"[CONFIG] SMTP_PASSWORD loaded: {'SET' if SMTP_PASSWORD else 'NOT SET'}")
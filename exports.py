@@ -0,0 +1,232 @@
+"""
+Streaming exports of scores, assignments and violations as CSV or NDJSON.
+
+Rows are written straight from a Mongo cursor (batches of EXPORT_BATCH) through
+a generator response, so an export of any size never sits in worker memory.
+Every dataset takes the same query parameters:
+
+    format   csv (default) or ndjson
+    since    ISO date, inclusive, on created_at
+    until    ISO date, exclusive, on created_at
+    airport  airport of the candidate
+    status   scores: passed|failed; assignments and violations: a status
+             of assignment_status.ASSIGNMENT_STATUS
+    fields   comma-separated columns (default: every column of the dataset)
+"""
+
+import csv
+import datetime
+import io
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from flask import Blueprint, Response, jsonify, request
+
+from assignment_status import ASSIGNMENT_STATUS, assignment_status
+from configuration import get_db, SCORES_COLLECTION, USERS_COLLECTION, ASSIGNMENTS_COLLECTION
+from login import _current_user_claims
+
+exports_bp = Blueprint("exports", __name__)
+
+# Rows per cursor batch and per chunk written to the response
+EXPORT_BATCH = 500
+
+SCORE_FIELDS = ["email", "category", "attempted", "correct", "total_with_keys", "percentage_score", "passed", "created_at"]
+ASSIGNMENT_FIELDS = [
+    "assignment_id", "email", "airport", "assigned_by", "total", "created_at", "started_at", "finished_at",
+    "duration_seconds", "duration_used_seconds", "score", "total_with_keys", "attempted", "percentage_score",
+    "passed", "terminated", "termination_reason", "terminated_at", "violations", "status",
+]
+VIOLATION_FIELDS = [
+    "assignment_id", "email", "airport", "index", "type", "message", "timestamp", "count", "has_image",
+    "terminated", "termination_reason",
+]
+
+# Same rule as submit_score: more than 70% of the keyed questions correct
+_SCORE_PCT = [{"$multiply": ["$correct", 100]}, {"$multiply": ["$total_with_keys", 70]}]
+_SCORE_STATUS = {
+    "passed": {"total_with_keys": {"$gt": 0}, "$expr": {"$gt": _SCORE_PCT}},
+    "failed": {"$or": [{"total_with_keys": {"$not": {"$gt": 0}}}, {"$expr": {"$lte": _SCORE_PCT}}]},
+}
+
+
+def _parse_date(value: str) -> datetime.datetime:
+    """ISO date or datetime as naive UTC like the stored dates."""
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)  # ObjectId and friends
+
+
+def _score_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    total = doc.get("total_with_keys") or 0
+    percentage = round(doc.get("correct", 0) / total * 100, 2) if total else 0
+    return dict(doc, percentage_score=percentage, passed=percentage > 70)
+
+
+def _assignment_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(doc, assignment_id=str(doc["_id"]), status=assignment_status(doc))
+
+
+def _violation_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    v = doc.get("violation") or {}
+    return {
+        "assignment_id": v.get("assignment_id") or str(doc["_id"]),
+        "email": doc.get("email"),
+        "airport": doc.get("airport"),
+        "index": doc.get("index"),
+        "type": v.get("type"),
+        "message": v.get("message"),
+        "timestamp": v.get("timestamp"),
+        "count": v.get("count") or 1,
+        "has_image": bool(v.get("has_image")),
+        "terminated": bool(doc.get("terminated")),
+        "termination_reason": doc.get("termination_reason"),
+    }
+
+
+def _csv_stream(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    pending = 0
+    for row in rows:
+        writer.writerow([_cell(row.get(f)) for f in fields])
+        pending += 1
+        if pending >= EXPORT_BATCH:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue()
+
+
+def _ndjson_stream(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    chunk: List[str] = []
+    for row in rows:
+        chunk.append(json.dumps({f: _cell(row.get(f)) for f in fields}, ensure_ascii=False))
+        if len(chunk) >= EXPORT_BATCH:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def _export(dataset: str, available: List[str], rows: Callable[[Dict[str, Any], Dict[str, int]], Iterable[Dict[str, Any]]],
+            statuses: Dict[str, Dict[str, Any]]):
+    """Validate the common parameters and stream rows(match, projection) in the requested format."""
+    claims = _current_user_claims()
+    if not claims:
+        return jsonify({"error": "Unauthorized"}), 401
+    if claims.get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    fields = [f.strip() for f in (request.args.get("fields") or "").split(",") if f.strip()] or available
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}", "available": available}), 400
+    status = request.args.get("status") or None
+    if status and status not in statuses:
+        return jsonify({"error": f"status must be one of: {', '.join(statuses)}"}), 400
+    try:
+        since = _parse_date(request.args["since"]) if request.args.get("since") else None
+        until = _parse_date(request.args["until"]) if request.args.get("until") else None
+    except ValueError:
+        return jsonify({"error": "Invalid since or until"}), 400
+
+    match: Dict[str, Any] = dict(statuses[status]) if status else {}
+    if since or until:
+        created: Dict[str, Any] = {}
+        if since:
+            created["$gte"] = since
+        if until:
+            created["$lt"] = until
+        match["created_at"] = created
+    airport = request.args.get("airport") or None
+    if airport:
+        if dataset == "scores":
+            # Scores do not carry the airport; match the airport's candidates instead
+            match["email"] = {"$in": get_db()[USERS_COLLECTION].distinct("email", {"airport": airport})}
+        else:
+            match["airport"] = airport
+
+    stream = _csv_stream if fmt == "csv" else _ndjson_stream
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    return Response(
+        stream(rows(match, {f: 1 for f in fields}), fields),
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="{dataset}-{stamp}.{fmt}"',
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",  # let proxies pass chunks through as they are written
+        },
+    )
+
+
+@exports_bp.route("/api/export/scores", methods=["GET"])  # stream scores (admin)
+def export_scores():
+    """Stream the scores collection as CSV/NDJSON, oldest first"""
+    def rows(match, projection):
+        projection = dict(projection, correct=1, total_with_keys=1)
+        cursor = get_db()[SCORES_COLLECTION].find(match, projection).sort("_id", 1).batch_size(EXPORT_BATCH)
+        return (_score_row(doc) for doc in cursor)
+    return _export("scores", SCORE_FIELDS, rows, _SCORE_STATUS)
+
+
+@exports_bp.route("/api/export/assignments", methods=["GET"])  # stream quiz assignments (admin)
+def export_assignments():
+    """Stream quiz assignments as CSV/NDJSON, oldest first (answers and images are not exported)"""
+    def rows(match, projection):
+        projection = dict(projection, started_at=1, finished_at=1, terminated=1, passed=1)
+        projection.pop("assignment_id", None)
+        projection.pop("status", None)
+        cursor = get_db()[ASSIGNMENTS_COLLECTION].find(match, projection).sort("_id", 1).batch_size(EXPORT_BATCH)
+        return (_assignment_row(doc) for doc in cursor)
+    return _export("assignments", ASSIGNMENT_FIELDS, rows, ASSIGNMENT_STATUS)
+
+
+@exports_bp.route("/api/export/violations", methods=["GET"])  # stream violation log entries (admin)
+def export_violations():
+    """Stream one row per violation log entry, filtered on the parent assignment"""
+    def rows(match, projection):
+        pipeline = [
+            {"$match": dict(match, violation_log={"$exists": True, "$ne": []})},
+            {"$sort": {"_id": 1}},
+            {"$project": {
+                "email": 1, "airport": 1, "terminated": 1, "termination_reason": 1,
+                # Images never leave the database, only whether there is one
+                "violation_log": {"$map": {
+                    "input": "$violation_log",
+                    "as": "v",
+                    "in": {
+                        "assignment_id": "$$v.assignment_id",
+                        "type": "$$v.type",
+                        "message": "$$v.message",
+                        "timestamp": "$$v.timestamp",
+                        "count": "$$v.count",
+                        "has_image": {"$or": [
+                            {"$ne": [{"$ifNull": ["$$v.image_id", ""]}, ""]},
+                            {"$ne": [{"$ifNull": ["$$v.captured_image", ""]}, ""]},
+                        ]},
+                    },
+                }},
+            }},
+            {"$unwind": {"path": "$violation_log", "includeArrayIndex": "index"}},
+            {"$project": {"email": 1, "airport": 1, "terminated": 1, "termination_reason": 1, "index": 1, "violation": "$violation_log"}},
+        ]
+        cursor = get_db()[ASSIGNMENTS_COLLECTION].aggregate(pipeline, allowDiskUse=True, batchSize=EXPORT_BATCH)
+        return (_violation_row(doc) for doc in cursor)
+    return _export("violations", VIOLATION_FIELDS, rows, ASSIGNMENT_STATUS)
@@ -0,0 +1,558 @@
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from configuration import (
+    FRAME_ANALYSIS_WORKERS,
+    FRAME_ANALYSIS_QUEUE,
+    FRAME_ANALYSIS_TIMEOUT,
+    FRAME_RETRY_AFTER_MS,
+    FRAME_GATE_ENABLED,
+    FRAME_GATE_THRESHOLD,
+    FRAME_GATE_MAX_AGE,
+    FACE_DETECTOR,
+    FACE_DNN_PROTOTXT,
+    FACE_DNN_MODEL,
+    FACE_DNN_CONFIDENCE,
+)
+
+
+# Cascades are loaded once per process (request thread or pool worker)
+_cascades: Dict[str, Any] = {}
+
+
+def _cascade(name: str):
+    import cv2
+    cascade = _cascades.get(name)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + name)
+        _cascades[name] = cascade
+    return cascade
+
+
+class HaarFaceDetector:
+    """Haar cascade face detector, the original detection path."""
+
+    name = "haar"
+
+    def available(self) -> bool:
+        return not _cascade('haarcascade_frontalface_default.xml').empty()
+
+    def detect(self, img, gray) -> List[Tuple[int, int, int, int]]:
+        faces = _cascade('haarcascade_frontalface_default.xml').detectMultiScale(gray, 1.1, 3)
+        return [tuple(int(v) for v in f) for f in faces]
+
+
+class DnnFaceDetector:
+    """res10 SSD face detector run through cv2.dnn on the CPU.
+
+    The frame is resized to the fixed 300x300 network input, so the cost
+    does not grow with the camera resolution. Boxes are returned in frame
+    pixels, most confident first.
+    """
+
+    name = "dnn"
+    INPUT_SIZE = (300, 300)
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, prototxt: str, model: str, confidence: float) -> None:
+        self.prototxt = prototxt
+        self.model = model
+        self.confidence = confidence
+        self._net = None
+
+    def available(self) -> bool:
+        return self._load() is not None
+
+    def _load(self):
+        if self._net is None and os.path.exists(self.prototxt) and os.path.exists(self.model):
+            import cv2
+            net = cv2.dnn.readNetFromCaffe(self.prototxt, self.model)
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._net = net
+        return self._net
+
+    def detect(self, img, gray) -> List[Tuple[int, int, int, int]]:
+        import cv2
+        net = self._load()
+        height, width = img.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(img, self.INPUT_SIZE), 1.0, self.INPUT_SIZE, self.MEAN)
+        net.setInput(blob)
+        detections = net.forward()
+        faces = []
+        for i in range(detections.shape[2]):
+            if float(detections[0, 0, i, 2]) < self.confidence:
+                continue
+            x1, y1, x2, y2 = detections[0, 0, i, 3:7]
+            x1, y1 = max(0, int(x1 * width)), max(0, int(y1 * height))
+            x2, y2 = min(width, int(x2 * width)), min(height, int(y2 * height))
+            if x2 > x1 and y2 > y1:
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+        return faces
+
+
+# One detector per process; the pool workers pick it from the same configuration
+_face_detector = None
+
+
+def use_face_detector(name: str):
+    """Select the face detector backend ("haar" or "dnn") for this process.
+
+    Falls back to Haar when the DNN model files cannot be loaded.
+    """
+    global _face_detector
+    if name == "dnn":
+        detector = DnnFaceDetector(FACE_DNN_PROTOTXT, FACE_DNN_MODEL, FACE_DNN_CONFIDENCE)
+        try:
+            if detector.available():
+                _face_detector = detector
+                return _face_detector
+            print(f"DNN face model not found at {FACE_DNN_MODEL}, using Haar cascade")
+        except Exception as e:
+            print(f"DNN face model failed to load, using Haar cascade: {e}")
+    elif name != "haar":
+        print(f"Unknown FACE_DETECTOR {name!r}, using Haar cascade")
+    _face_detector = HaarFaceDetector()
+    return _face_detector
+
+
+def face_detector():
+    if _face_detector is None:
+        return use_face_detector(FACE_DETECTOR)
+    return _face_detector
+
+
+DESCRIPTOR_SIZE = 64  # side of the square thumbnail used for template/SSIM terms
+
+
+class ReferenceDescriptor:
+    """Identity-check features of a reference face, computed once at setup.
+
+    Holds the crop size, the normalized grey-level histogram (centred and
+    scaled to unit norm) and the 64x64 float32 thumbnail with its mean/std,
+    so comparing a new face costs two resizes and a few dot products.
+    """
+
+    __slots__ = ("shape", "hist_unit", "vector", "vector_unit", "mean", "std")
+
+    def __init__(self, shape, hist_unit, vector, mean: float, std: float) -> None:
+        import numpy as np
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.hist_unit = hist_unit
+        self.vector = vector
+        self.mean = mean
+        self.std = std
+        # Zero-mean, unit-norm copy: template correlation becomes a dot product
+        n = vector.size
+        if std > 0:
+            self.vector_unit = ((vector - mean) / (std * np.sqrt(n))).astype(np.float32)
+        else:
+            self.vector_unit = np.zeros_like(vector)
+
+    @staticmethod
+    def _unit_hist(face):
+        import numpy as np
+        hist = np.bincount(face.ravel(), minlength=256).astype(np.float32)
+        hist /= max(float(hist.sum()), 1.0)
+        hist -= hist.mean()
+        norm = float(np.linalg.norm(hist))
+        return hist / norm if norm > 0 else hist
+
+    @classmethod
+    def from_face(cls, face) -> "ReferenceDescriptor":
+        """Build the descriptor from a grayscale uint8 face crop."""
+        import cv2
+        import numpy as np
+        small = cv2.resize(face, (DESCRIPTOR_SIZE, DESCRIPTOR_SIZE))
+        vector = small.astype(np.float32).ravel()
+        return cls(face.shape, cls._unit_hist(face), vector, float(vector.mean()), float(vector.std()))
+
+    def similarity(self, face) -> Dict[str, float]:
+        """Compare a grayscale face crop against this reference.
+
+        Same three terms and weights as the original per-frame formula:
+        histogram correlation, normalized cross-correlation (what
+        TM_CCOEFF_NORMED gives for equal-size inputs, taken here on the
+        64x64 thumbnails) and 1 - MSE/255^2.
+        """
+        import cv2
+        import numpy as np
+        # Bring the crop to the reference size first, as the original check did
+        face = cv2.resize(face, (self.shape[1], self.shape[0]))
+        small = cv2.resize(face, (DESCRIPTOR_SIZE, DESCRIPTOR_SIZE))
+        cur = small.astype(np.float32).ravel()
+
+        hist_similarity = float(np.dot(self.hist_unit, self._unit_hist(face)))
+
+        cur_std = float(cur.std())
+        if cur_std > 0:
+            template_similarity = float(np.dot(cur - cur.mean(), self.vector_unit)) / (cur_std * np.sqrt(cur.size))
+        else:
+            template_similarity = 0.0
+
+        diff = cur - self.vector
+        ssim_similarity = 1 - float(np.dot(diff, diff)) / cur.size / (255 ** 2)
+
+        return {
+            "hist": hist_similarity,
+            "template": template_similarity,
+            "ssim": ssim_similarity,
+            # Combined similarity score (weighted average)
+            "combined": hist_similarity * 0.4 + template_similarity * 0.4 + ssim_similarity * 0.2,
+        }
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "shape": list(self.shape),
+            "hist_unit": self.hist_unit.tobytes(),
+            "vector": self.vector.tobytes(),
+            "mean": self.mean,
+            "std": self.std,
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "ReferenceDescriptor":
+        import numpy as np
+        return cls(
+            doc["shape"],
+            np.frombuffer(doc["hist_unit"], np.float32).copy(),
+            np.frombuffer(doc["vector"], np.float32).copy(),
+            float(doc["mean"]),
+            float(doc["std"]),
+        )
+
+
+def prepare_reference(image_bytes: bytes) -> Optional[Dict[str, Any]]:
+    """Detect and validate the reference face of a setup capture.
+
+    Returns None when the image cannot be decoded, {"error": message} when
+    the capture is unusable, else the grayscale face crop with its quality
+    measurements.
+    """
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+
+    # Convert to grayscale for face detection
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    detector = face_detector()
+    if not detector.available():
+        return {"error": "Face detection model not available"}
+
+    faces = detector.detect(img, gray)
+    if len(faces) == 0:
+        return {"error": "No face detected. Please ensure your face is clearly visible in the camera."}
+    if len(faces) > 1:
+        return {"error": f"Multiple faces detected ({len(faces)}). Please ensure only your face is visible."}
+
+    x, y, w, h = faces[0]
+    face = gray[y:y+h, x:x+w]
+
+    # Validate face quality
+    face_ratio = (w * h) / (img.shape[0] * img.shape[1])
+    if face_ratio < 0.05:  # Face too small
+        return {"error": "Face too small. Please move closer to the camera."}
+    elif face_ratio > 0.3:  # Face too large
+        return {"error": "Face too large. Please move away from the camera."}
+
+    # Check face brightness/contrast
+    mean_brightness = float(np.mean(face))
+    if mean_brightness < 50:  # Too dark
+        return {"error": "Face too dark. Please improve lighting."}
+    elif mean_brightness > 200:  # Too bright
+        return {"error": "Face too bright. Please adjust lighting."}
+
+    return {"face": face, "face_ratio": float(face_ratio), "brightness": mean_brightness}
+
+
+def analyze_frame(image_bytes: bytes, reference: Optional[ReferenceDescriptor] = None,
+                  checks: Optional[Dict[str, bool]] = None) -> Optional[Dict[str, Any]]:
+    """Run the OpenCV part of a proctoring check on one JPEG frame.
+
+    This is stateless so it can run in a worker process: timers and alerts
+    are decided by the caller from the returned measurements. ``checks``
+    selects the expensive detectors ("identity", "eyes"); face detection
+    always runs, and more than one face escalates to all detectors on the
+    same frame. Returns None when the image cannot be decoded.
+    """
+    import cv2
+    import numpy as np
+
+    checks = checks or {"identity": True, "eyes": True}
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+
+    # Convert to grayscale for face detection
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = face_detector().detect(img, gray)
+    timings["faces"] = (time.perf_counter() - started) * 1000
+
+    run_identity = bool(checks.get("identity")) or len(faces) > 1
+    run_eyes = bool(checks.get("eyes")) or len(faces) > 1
+
+    out: Dict[str, Any] = {
+        "height": int(img.shape[0]),
+        "width": int(img.shape[1]),
+        "faces": faces,
+        "eyes": None,
+        "similarity": None,
+        "similarity_error": None,
+        "new_reference": None,
+        "checks": {"identity": False, "eyes": False},
+        "timings": timings,
+    }
+
+    if len(faces) > 0:
+        x, y, w, h = out["faces"][0]
+        current_face = gray[y:y+h, x:x+w]
+
+        if reference is not None:
+            if run_identity:
+                t = time.perf_counter()
+                try:
+                    out["similarity"] = reference.similarity(current_face)
+                except Exception as e:
+                    out["similarity_error"] = str(e)
+                timings["identity"] = (time.perf_counter() - t) * 1000
+                out["checks"]["identity"] = True
+        else:
+            # Caller adopts the first detected face as the reference
+            out["new_reference"] = ReferenceDescriptor.from_face(current_face)
+
+        if run_eyes:
+            # Eye detection within face region
+            t = time.perf_counter()
+            out["eyes"] = len(_cascade('haarcascade_eye.xml').detectMultiScale(current_face))
+            timings["eyes"] = (time.perf_counter() - t) * 1000
+            out["checks"]["eyes"] = True
+
+    out["analysis_ms"] = (time.perf_counter() - started) * 1000
+    return out
+
+
+GATE_THUMBNAIL_SIZE = (32, 24)
+
+
+def frame_thumbnail(image_bytes: bytes):
+    """Tiny grayscale thumbnail used by the motion gate, or None if undecodable.
+
+    The JPEG is decoded at 1/8 scale, which skips most of the IDCT work.
+    """
+    import cv2
+    import numpy as np
+    small = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if small is None:
+        return None
+    return cv2.resize(small, GATE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class MotionGate:
+    """Decides whether a frame differs enough from the last analysed one.
+
+    The comparison is against the thumbnail of the last *analysed* frame, so
+    slow drift still adds up to a change, and a verdict is never reused for
+    longer than ``max_age`` seconds.
+    """
+
+    def __init__(self, enabled: bool, threshold: float, max_age: float) -> None:
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.analysed = 0
+
+    def should_reuse(self, assignment_id: Optional[str], previous, thumbnail, age: Optional[float]) -> bool:
+        import cv2
+        reason = None
+        diff = None
+        if not self.enabled:
+            reason = "disabled"
+        elif previous is None or thumbnail is None or age is None:
+            reason = "no_previous"
+        elif age > self.max_age:
+            reason = "max_age"
+        elif previous.shape != thumbnail.shape:
+            reason = "shape"
+        else:
+            diff = float(cv2.absdiff(previous, thumbnail).mean())
+            if diff > self.threshold:
+                reason = "changed"
+        reuse = reason is None
+        with self._lock:
+            if reuse:
+                self.reused += 1
+            else:
+                self.analysed += 1
+        diff_text = f"{diff:.2f}" if diff is not None else "-"
+        print(f"[FRAME GATE] assignment={assignment_id} decision={'reuse' if reuse else 'analyse'} reason={reason or 'unchanged'} diff={diff_text}")
+        return reuse
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.reused + self.analysed
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "max_age_seconds": self.max_age,
+                "reused": self.reused,
+                "analysed": self.analysed,
+                "skip_rate": round(self.reused / total, 3) if total else None,
+            }
+
+
+class AnalysisOverloaded(Exception):
+    """Raised when the analysis queue is full and the frame was shed."""
+
+    def __init__(self, retry_after_ms: int) -> None:
+        super().__init__(f"frame analysis queue full, retry in {retry_after_ms} ms")
+        self.retry_after_ms = retry_after_ms
+
+
+class FrameAnalysisPool:
+    """Bounded front for analyze_frame backed by a process pool.
+
+    At most ``max_pending`` frames are queued or running; extra frames are
+    shed immediately instead of piling up behind the workers.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float, retry_after_ms: int) -> None:
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.retry_after_ms = retry_after_ms
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.analysed = 0
+        self.shed = 0
+        self.timeouts = 0
+        self._analysis_ms: deque = deque(maxlen=500)
+        self._latency_ms: deque = deque(maxlen=500)
+
+    @property
+    def mode(self) -> str:
+        return "process" if self.workers > 0 else "inline"
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                try:
+                    # spawn avoids forking a threaded server with open Mongo sockets
+                    ctx = multiprocessing.get_context("spawn")
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+                except Exception as e:
+                    # e.g. no /dev/shm on serverless runtimes
+                    print(f"Frame analysis pool unavailable, analysing inline: {e}")
+                    self.workers = 0
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _retry_hint(self) -> int:
+        # Jitter spreads retries so shed clients don't come back in lockstep
+        return int(self.retry_after_ms * random.uniform(1.0, 1.5))
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def analyze(self, image_bytes: bytes, reference: Optional[ReferenceDescriptor] = None,
+                checks: Optional[Dict[str, bool]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.shed += 1
+                raise AnalysisOverloaded(self._retry_hint())
+            self.pending += 1
+
+        started = time.perf_counter()
+        executor = self._get_executor()
+        if executor is None:
+            try:
+                result = analyze_frame(image_bytes, reference, checks)
+            finally:
+                self._release()
+        else:
+            try:
+                future = executor.submit(analyze_frame, image_bytes, reference, checks)
+            except BrokenProcessPool:
+                self._release()
+                self._reset_executor()
+                raise AnalysisOverloaded(self._retry_hint())
+            # The slot is freed when the worker is done, not when we stop waiting
+            future.add_done_callback(self._release)
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                with self._lock:
+                    self.timeouts += 1
+                    self.shed += 1
+                raise AnalysisOverloaded(self._retry_hint())
+            except BrokenProcessPool:
+                self._reset_executor()
+                raise AnalysisOverloaded(self._retry_hint())
+
+        with self._lock:
+            self.analysed += 1
+            self._latency_ms.append((time.perf_counter() - started) * 1000)
+            if result is not None:
+                self._analysis_ms.append(result.get("analysis_ms", 0.0))
+        return result
+
+    @staticmethod
+    def _summary(samples) -> Dict[str, Optional[float]]:
+        values = sorted(samples)
+        if not values:
+            return {"avg": None, "p50": None, "p95": None, "max": None}
+        return {
+            "avg": round(sum(values) / len(values), 2),
+            "p50": round(values[len(values) // 2], 2),
+            "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+            "max": round(values[-1], 2),
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "queue_depth": self.pending,
+                "queue_capacity": self.max_pending,
+                "analysed": self.analysed,
+                "shed": self.shed,
+                "timeouts": self.timeouts,
+                "analysis_ms": self._summary(self._analysis_ms),
+                "latency_ms": self._summary(self._latency_ms),
+            }
+
+
+motion_gate = MotionGate(FRAME_GATE_ENABLED, FRAME_GATE_THRESHOLD, FRAME_GATE_MAX_AGE)
+
+analysis_pool = FrameAnalysisPool(
+    FRAME_ANALYSIS_WORKERS,
+    FRAME_ANALYSIS_QUEUE,
+    FRAME_ANALYSIS_TIMEOUT,
+    FRAME_RETRY_AFTER_MS,
+)
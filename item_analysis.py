@@ -0,0 +1,218 @@
+"""
+Item analysis over the answers stored on finished assignments.
+
+submit_score keeps one {id, section, your, correct, is_correct} row per
+question. The batch job reads finished, non-terminated assignments
+ITEM_ANALYSIS_CHUNK_SIZE at a time into a candidates x questions response
+matrix and reduces it column-wise with NumPy into sufficient statistics per
+question: responses, correct responses, sums of the rest score (total correct
+minus the item itself) and option counts. The item_analysis collection keeps
+those sums, so new submissions are folded in with $inc from a finished_at
+watermark, and the derived metrics are computed on read:
+
+- difficulty: p-value, the share of correct responses
+- discrimination: corrected point-biserial between the item and the rest score
+- option rates: share of candidates choosing each option ("" is omitted)
+"""
+
+import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from configuration import get_db, ASSIGNMENTS_COLLECTION, ITEM_ANALYSIS_COLLECTION, ITEM_ANALYSIS_CHUNK_SIZE
+
+
+OPTIONS = ("A", "B", "C", "D")
+_OMITTED = len(OPTIONS)  # column of option_counts for blank or unknown choices
+_STAT_FIELDS = ("responses", "correct", "rest_sum", "rest_sq_sum", "rest_correct_sum")
+# Submissions written in the last minute may still be in flight; the watermark stays behind them
+_SETTLE_SECONDS = 60
+_META_ID = "_watermark"
+
+
+class _Accumulator:
+    """Per-question sums, grown as new (section, question id) pairs appear."""
+
+    def __init__(self) -> None:
+        import numpy as np
+
+        self.columns: Dict[Tuple[str, Any], int] = {}
+        self.stats = np.zeros((len(_STAT_FIELDS), 0))
+        self.option_counts = np.zeros((len(OPTIONS) + 1, 0), dtype=np.int64)
+        self.candidates = 0
+
+    def column(self, key: Tuple[str, Any]) -> int:
+        col = self.columns.get(key)
+        if col is None:
+            col = self.columns[key] = len(self.columns)
+        return col
+
+    def add_chunk(self, rows: List[int], cols: List[int], correct: List[bool], choices: List[int], n: int) -> None:
+        """Reduce one chunk of n candidates given as (row, column, correct, choice) coordinates."""
+        import numpy as np
+
+        q = len(self.columns)
+        if q > self.stats.shape[1]:
+            grow = q - self.stats.shape[1]
+            self.stats = np.pad(self.stats, ((0, 0), (0, grow)))
+            self.option_counts = np.pad(self.option_counts, ((0, 0), (0, grow)))
+        if not rows:
+            return
+        rows_a = np.asarray(rows, dtype=np.int64)
+        cols_a = np.asarray(cols, dtype=np.int64)
+
+        # Response matrix: -1 not asked, 0 wrong, 1 correct
+        matrix = np.full((n, q), -1, dtype=np.int8)
+        matrix[rows_a, cols_a] = np.asarray(correct, dtype=np.int8)
+        asked = matrix >= 0
+        right = (matrix == 1).astype(np.float64)
+
+        total = right.sum(axis=1)
+        rest = (total[:, None] - right) * asked
+        self.stats[0] += asked.sum(axis=0)
+        self.stats[1] += right.sum(axis=0)
+        self.stats[2] += rest.sum(axis=0)
+        self.stats[3] += (rest * rest).sum(axis=0)
+        self.stats[4] += (rest * right).sum(axis=0)
+
+        choice = np.full((n, q), -1, dtype=np.int8)
+        choice[rows_a, cols_a] = np.asarray(choices, dtype=np.int8)
+        for option in range(len(OPTIONS) + 1):
+            self.option_counts[option] += (choice == option).sum(axis=0)
+        self.candidates += n
+
+
+def _choice_code(your: Any) -> int:
+    your = str(your or "").strip().upper()
+    return OPTIONS.index(your) if your in OPTIONS else _OMITTED
+
+
+def metrics(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Difficulty, discrimination and option rates for stored item documents (vectorized)."""
+    import numpy as np
+
+    if not docs:
+        return []
+    stats = np.array([[float(d.get(f) or 0) for f in _STAT_FIELDS] for d in docs]).T
+    n, c, rest_sum, rest_sq_sum, rest_correct_sum = stats
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = c / n
+        mean = rest_sum / n
+        sd = np.sqrt(np.maximum(rest_sq_sum / n - mean * mean, 0))
+        mean_right = rest_correct_sum / c
+        mean_wrong = (rest_sum - rest_correct_sum) / (n - c)
+        r_pb = (mean_right - mean_wrong) / sd * np.sqrt(p * (1 - p))
+    r_pb = np.where((c > 0) & (c < n) & (sd > 0), r_pb, np.nan)
+
+    def num(value: float, digits: int) -> Optional[float]:
+        return None if np.isnan(value) else round(float(value), digits)
+
+    items = []
+    for i, d in enumerate(docs):
+        counts = d.get("option_counts") or {}
+        responses = int(n[i])
+        items.append({
+            "section": d.get("section"),
+            "question_id": d.get("question_id"),
+            "key": d.get("key"),
+            "responses": responses,
+            "difficulty": num(p[i], 3),
+            "discrimination": num(r_pb[i], 3),
+            "option_rates": {
+                option: round(int(counts.get(option, 0)) / responses, 3) if responses else None
+                for option in OPTIONS + ("",)
+            },
+        })
+    return items
+
+
+class ItemAnalysis:
+    """Item statistics per (section, question_id) in the item_analysis collection."""
+
+    def __init__(self, chunk_size: int = ITEM_ANALYSIS_CHUNK_SIZE) -> None:
+        self.chunk_size = max(1, chunk_size)
+        self._indexed = False
+
+    def _collection(self):
+        coll = get_db()[ITEM_ANALYSIS_COLLECTION]
+        if not self._indexed:
+            try:
+                coll.create_index([("section", 1), ("question_id", 1)], unique=True, sparse=True)
+            except Exception:
+                pass
+            self._indexed = True
+        return coll
+
+    def watermark(self) -> Optional[datetime.datetime]:
+        meta = self._collection().find_one({"_id": _META_ID})
+        return meta.get("finished_through") if meta else None
+
+    def run(self, full: bool = False) -> Dict[str, Any]:
+        """Fold assignments finished since the watermark into the item statistics.
+
+        full=True recomputes everything from scratch: each item is replaced with
+        the new run's id, then items left from earlier runs are deleted.
+        """
+        from bson import ObjectId
+        from pymongo import ReplaceOne, UpdateOne
+
+        coll = self._collection()
+        run = ObjectId()
+        since = None if full else self.watermark()
+        until = datetime.datetime.utcnow() - datetime.timedelta(seconds=_SETTLE_SECONDS)
+        finished: Dict[str, Any] = {"$lte": until}
+        if since is not None:
+            finished["$gt"] = since
+        query = {"finished_at": finished, "terminated": {"$ne": True}, "answers.0": {"$exists": True}}
+
+        acc = _Accumulator()
+        keys: Dict[int, Optional[str]] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        correct: List[bool] = []
+        choices: List[int] = []
+        n = 0
+        cursor = get_db()[ASSIGNMENTS_COLLECTION].find(query, {"answers": 1}).batch_size(1000)
+        for doc in cursor:
+            for answer in doc.get("answers") or []:
+                if answer.get("correct") is None or answer.get("id") is None:
+                    continue  # unkeyed questions cannot be scored
+                col = acc.column((str(answer.get("section") or "Unknown"), answer["id"]))
+                keys[col] = answer["correct"]
+                rows.append(n)
+                cols.append(col)
+                correct.append(bool(answer.get("is_correct")))
+                choices.append(_choice_code(answer.get("your")))
+            n += 1
+            if n >= self.chunk_size:
+                acc.add_chunk(rows, cols, correct, choices, n)
+                rows, cols, correct, choices, n = [], [], [], [], 0
+        acc.add_chunk(rows, cols, correct, choices, n)
+
+        ops = []
+        for (section, question_id), col in acc.columns.items():
+            sums = {f: float(acc.stats[i, col]) for i, f in enumerate(_STAT_FIELDS)}
+            sums["responses"] = int(sums["responses"])
+            sums["correct"] = int(sums["correct"])
+            counts = {f"option_counts.{option}": int(acc.option_counts[i, col]) for i, option in enumerate(OPTIONS + ("",))}
+            item = {"section": section, "question_id": question_id}
+            if full:
+                doc = dict(item, key=keys[col], run=run, option_counts={k.split(".", 1)[1]: v for k, v in counts.items()}, **sums)
+                ops.append(ReplaceOne(item, doc, upsert=True))
+            else:
+                ops.append(UpdateOne(item, {"$inc": dict(sums, **counts), "$set": {"key": keys[col]}}, upsert=True))
+        for i in range(0, len(ops), 1000):
+            coll.bulk_write(ops[i:i + 1000], ordered=False)
+        if full:
+            # Items are replaced in place, so readers never see an empty table; drop the ones no run produced
+            coll.delete_many({"_id": {"$ne": _META_ID}, "run": {"$ne": run}})
+        coll.update_one({"_id": _META_ID}, {"$set": {"finished_through": until}}, upsert=True)
+        return {"candidates": acc.candidates, "questions": len(acc.columns), "finished_through": until.isoformat()}
+
+    def items(self, section: Optional[str] = None, min_responses: int = 1) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"_id": {"$ne": _META_ID}, "responses": {"$gte": min_responses}}
+        if section:
+            query["section"] = section
+        return metrics(list(self._collection().find(query, {"_id": 0})))
+
+
+item_analysis = ItemAnalysis()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+OACA Maintenance Tasks
+One-off migrations and backfills, run against the configured MONGO_URI.
+Every task is idempotent and can be re-run after an interruption.
+
+Usage:
+    python maintenance.py migrate-images [--batch 100] [--dry-run]
+    python maintenance.py reconcile-stats
+    python maintenance.py backfill-question-usage
+    python maintenance.py backfill-airports [--batch 500]
+    python maintenance.py backfill-rollups
+    python maintenance.py item-analysis [--full]
+"""
+
+import argparse
+import sys
+
+from configuration import get_db, ASSIGNMENTS_COLLECTION, USERS_COLLECTION
+
+
+def migrate_images(batch: int = 100, dry_run: bool = False) -> None:
+    """Move inline base64 images out of assignment documents into the blob store.
+
+    violation_log[].captured_image becomes violation_log[].image_id and
+    reference_image becomes reference_image_id.
+    """
+    from blob_store import decode_data_url, image_store
+
+    def store(data_url):
+        if dry_run:
+            return "dry-run" if decode_data_url(data_url) else None
+        return image_store.put_data_url(data_url)
+
+    coll = get_db()[ASSIGNMENTS_COLLECTION]
+    query = {"$or": [
+        {"reference_image": {"$exists": True}},
+        {"violation_log.captured_image": {"$exists": True}},
+    ]}
+    migrated = images = failed = 0
+    last_id = None
+    while True:
+        page_query = dict(query, _id={"$gt": last_id}) if last_id is not None else query
+        docs = list(coll.find(page_query, {"reference_image": 1, "violation_log": 1}).sort("_id", 1).limit(batch))
+        if not docs:
+            break
+        for doc in docs:
+            last_id = doc["_id"]
+            update_set = {}
+            update_unset = {}
+
+            if "reference_image" in doc:
+                key = store(doc["reference_image"]) if doc["reference_image"] else None
+                if key or not doc["reference_image"]:
+                    if key:
+                        update_set["reference_image_id"] = key
+                        images += 1
+                    update_unset["reference_image"] = ""
+                else:
+                    failed += 1
+
+            # Entries are updated in place by position: live exams only ever $push to
+            # violation_log, so entries appended meanwhile are left untouched
+            for i, entry in enumerate(doc.get("violation_log") or []):
+                if "captured_image" not in entry:
+                    continue
+                key = store(entry["captured_image"]) if entry["captured_image"] else None
+                if entry["captured_image"] and not key:
+                    # Left inline: nothing readable to move
+                    failed += 1
+                    continue
+                update_set[f"violation_log.{i}.image_id"] = key
+                update_unset[f"violation_log.{i}.captured_image"] = ""
+                images += 1 if key else 0
+
+            if dry_run or not (update_set or update_unset):
+                migrated += 1 if (update_set or update_unset) else 0
+                continue
+            update = {}
+            if update_set:
+                update["$set"] = update_set
+            if update_unset:
+                update["$unset"] = update_unset
+            coll.update_one({"_id": doc["_id"]}, update)
+            migrated += 1
+        print(f"  ... {migrated} assignments, {images} images")
+
+    verb = "Would migrate" if dry_run else "Migrated"
+    print(f"{verb} {migrated} assignments ({images} images, {failed} undecodable images left inline)")
+
+
+def reconcile_stats() -> None:
+    """Recount the materialized platform statistics (safe to run from cron)."""
+    from stats import platform_stats
+
+    doc = platform_stats.reconcile()
+    print(f"Stats: {doc['completed']} completed, {doc['passed']} passed, {doc['failed']} failed, "
+          f"best {doc['best_score']}, {doc['total_users']} users")
+
+
+def backfill_question_usage() -> None:
+    """Seed the most-asked counters from every finished assignment."""
+    from stats import question_usage
+
+    questions, sections = question_usage.backfill()
+    print(f"Question usage: {questions} questions, {sections} sections")
+
+
+def backfill_airports(batch: int = 500) -> None:
+    """Copy each user's airport onto their assignments and index it for the airport reports."""
+    db = get_db()
+    coll = db[ASSIGNMENTS_COLLECTION]
+    coll.create_index([("airport", 1), ("finished_at", 1)])
+    db[USERS_COLLECTION].create_index("airport")
+
+    updated = 0
+    for airport in db[USERS_COLLECTION].distinct("airport"):
+        if not airport:
+            continue
+        emails = [u["email"] for u in db[USERS_COLLECTION].find({"airport": airport}, {"email": 1}) if u.get("email")]
+        for i in range(0, len(emails), batch):
+            result = coll.update_many(
+                {"email": {"$in": emails[i:i + batch]}, "airport": {"$ne": airport}},
+                {"$set": {"airport": airport}}
+            )
+            updated += result.modified_count
+        print(f"  ... {airport}: {len(emails)} users")
+    print(f"Updated airport on {updated} assignments")
+
+
+def backfill_rollups() -> None:
+    """Rebuild the daily analytics rollups from every assignment (run after backfill-airports)."""
+    from stats import daily_rollups
+
+    buckets = daily_rollups.backfill()
+    print(f"Daily rollups: {buckets} buckets")
+
+
+def run_item_analysis(full: bool = False) -> None:
+    """Fold newly finished assignments into the item statistics (safe to run from cron)."""
+    import time
+    from item_analysis import item_analysis
+
+    start = time.perf_counter()
+    result = item_analysis.run(full=full)
+    print(f"Item analysis: {result['candidates']} assignments, {result['questions']} questions "
+          f"through {result['finished_through']} in {time.perf_counter() - start:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OACA maintenance tasks")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("migrate-images", help="move inline violation/reference images to the blob store")
+    p.add_argument("--batch", type=int, default=100, help="assignments per batch")
+    p.add_argument("--dry-run", action="store_true", help="count what would change without writing")
+
+    sub.add_parser("reconcile-stats", help="recount the materialized platform statistics")
+    sub.add_parser("backfill-question-usage", help="seed most-asked question/section counters")
+
+    p = sub.add_parser("backfill-airports", help="copy user airports onto their assignments")
+    p.add_argument("--batch", type=int, default=500, help="emails per update")
+
+    sub.add_parser("backfill-rollups", help="rebuild the daily analytics rollups")
+
+    p = sub.add_parser("item-analysis", help="update per-question difficulty and discrimination")
+    p.add_argument("--full", action="store_true", help="recompute from every finished assignment")
+
+    args = parser.parse_args()
+    if args.command == "migrate-images":
+        migrate_images(args.batch, args.dry_run)
+    elif args.command == "reconcile-stats":
+        reconcile_stats()
+    elif args.command == "backfill-question-usage":
+        backfill_question_usage()
+    elif args.command == "backfill-airports":
+        backfill_airports(args.batch)
+    elif args.command == "backfill-rollups":
+        backfill_rollups()
+    elif args.command == "item-analysis":
+        run_item_analysis(args.full)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
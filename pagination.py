@@ -0,0 +1,123 @@
+"""
+Keyset pagination and projection profiles shared by the list endpoints.
+
+Lists are ordered by a date field (created_at unless stated) then _id, both
+descending. A page ends with next_cursor, "<date iso>|<_id>" of its last
+document; the next page resumes strictly after it, so pages stay stable while
+new documents are inserted and no page costs more than ``limit`` index reads.
+Documents without the date sort last and are paged by _id alone.
+
+Each endpoint names its projections ("summary" for tables and cards,
+"detail" for a full report). Lists return the summary projection unless
+?profile=detail is asked for. Requests without limit or cursor keep the old
+behaviour of returning a plain JSON array; with either one the response is
+
+    {"items": [...], "next_cursor": str|None, "total": int, "total_estimated": bool}
+
+where total comes from the collection metadata (estimated_document_count)
+when the list is unfiltered, and from a capped count otherwise.
+"""
+
+import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import request
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Filtered counts stop here and report the total as an estimate
+COUNT_CAP = 10000
+
+_indexed = set()
+
+
+def keyset_cursor(doc: Dict[str, Any], field: str = "created_at") -> str:
+    value = doc.get(field)
+    return f"{value.isoformat() if isinstance(value, datetime.datetime) else ''}|{doc['_id']}"
+
+
+def keyset_match(cursor: str, field: str = "created_at") -> Dict[str, Any]:
+    """Keyset condition for the documents after ``cursor`` in (field, _id) descending order."""
+    from bson import ObjectId
+    value, _, oid = cursor.partition("|")
+    oid = ObjectId(oid)
+    if not value:
+        # Undated documents sort last; only the _id tie-break remains
+        return {field: None, "_id": {"$lt": oid}}
+    value = datetime.datetime.fromisoformat(value)
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: None},
+        {field: value, "_id": {"$lt": oid}},
+    ]}
+
+
+def page_args(profiles: Dict[str, Dict[str, int]], default_profile: str = "summary") -> Tuple[Optional[int], Optional[str], Dict[str, int]]:
+    """(limit, cursor, projection) from the query string; ValueError on bad input.
+
+    limit is None for the legacy unpaginated array (no limit and no cursor).
+    """
+    profile = request.args.get("profile") or default_profile
+    if profile not in profiles:
+        raise ValueError(f"profile must be one of: {', '.join(profiles)}")
+    cursor = request.args.get("cursor") or None
+    limit: Optional[int] = None
+    if request.args.get("limit") or cursor:
+        limit = int(request.args.get("limit") or DEFAULT_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        limit = min(limit, MAX_PAGE_SIZE)
+    if cursor:
+        try:
+            keyset_match(cursor)  # reject malformed cursors before querying
+        except Exception:
+            raise ValueError("Invalid cursor")
+    return limit, cursor, dict(profiles[profile])
+
+
+def _ensure_index(coll, prefix: Sequence[str], field: str) -> None:
+    key = (coll.name, tuple(prefix), field)
+    if key in _indexed:
+        return
+    try:
+        coll.create_index([(p, 1) for p in prefix] + [(field, -1), ("_id", -1)])
+    except Exception:
+        pass
+    _indexed.add(key)
+
+
+def find_page(coll, query: Dict[str, Any], projection: Dict[str, int], limit: Optional[int], cursor: Optional[str],
+              field: str = "created_at", index_prefix: Sequence[str] = ()) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of ``coll`` in (field, _id) descending order, plus the cursor of the next page.
+
+    index_prefix names the equality fields of ``query`` so the matching
+    (prefix..., field, _id) index serves the keyset scan.
+    """
+    if limit is not None:
+        _ensure_index(coll, index_prefix, field)
+    if cursor:
+        query = {"$and": [query, keyset_match(cursor, field)]} if query else keyset_match(cursor, field)
+    if projection and all(v for v in projection.values()):
+        # Inclusion profiles still need the sort keys for the cursor
+        projection = dict(projection, **{field: 1})
+    find = coll.find(query, projection or None).sort([(field, -1), ("_id", -1)])
+    if limit is None:
+        return list(find), None
+    docs = list(find.limit(limit + 1))
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, keyset_cursor(docs[-1], field)
+    return docs, None
+
+
+def page_total(coll, query: Dict[str, Any]) -> Tuple[int, bool]:
+    """(total, estimated): collection metadata when unfiltered, otherwise a count capped at COUNT_CAP."""
+    if not query:
+        return coll.estimated_document_count(), True
+    count = coll.count_documents(query, limit=COUNT_CAP)
+    return count, count >= COUNT_CAP
+
+
+def page_response(items: List[Dict[str, Any]], next_cursor: Optional[str], total: Tuple[int, bool]) -> Dict[str, Any]:
+    return {"items": items, "next_cursor": next_cursor, "total": total[0], "total_estimated": total[1]}
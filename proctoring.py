@@ -0,0 +1,865 @@
+import datetime
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from configuration import (
+    get_db,
+    FACE_REFERENCES_COLLECTION,
+    PROCTORING_SESSIONS_COLLECTION,
+    PROCTORING_SESSION_BACKEND,
+    PROCTORING_SESSION_MAX,
+    PROCTORING_SESSION_TTL,
+    REFERENCE_CACHE_SIZE,
+    CHECK_IDENTITY_INTERVAL,
+    CHECK_EYES_INTERVAL,
+    FRAME_INTERVAL_MS,
+    FRAME_INTERVAL_MIN_MS,
+    FRAME_INTERVAL_MAX_MS,
+    FRAME_INTERVAL_CEILING_MS,
+    FRAME_CALM_FRAMES,
+    PRESCREEN_ENABLED,
+    PRESCREEN_AUDIT_RATE,
+    PRESCREEN_MAX_GAP,
+    PRESCREEN_MAX_MISSED_AUDITS,
+)
+from frame_analysis import AnalysisOverloaded, ReferenceDescriptor, analysis_pool, frame_thumbnail, motion_gate
+from violation_log import violation_buffer
+
+
+POSITION_HISTORY = 30  # frames of vertical face position kept per session
+THUMBNAIL_WIDTH = 96  # stored reference thumbnail, grayscale JPEG
+
+
+class ProctoringSession:
+    """Face monitoring state for one assignment.
+
+    Timers hold the time.time() at which a condition started, or None when
+    the condition is not currently active.
+    """
+
+    __slots__ = (
+        "assignment_id",
+        "reference",
+        "last_face_time",
+        "positions",
+        "multiple_faces_since",
+        "movement_since",
+        "distance_small_since",
+        "distance_large_since",
+        "mismatch_since",
+        "last_thumbnail",
+        "last_analysis",
+        "last_analysis_at",
+        "detector_runs",
+        "clean_frames",
+        "audit_requested_at",
+        "missed_audits",
+        "heartbeat_gap",
+        "last_seen",
+    )
+
+    def __init__(self, assignment_id: str) -> None:
+        self.assignment_id = assignment_id
+        self.reference: Optional[ReferenceDescriptor] = None
+        self.last_face_time: Optional[float] = None
+        self.positions: deque = deque(maxlen=POSITION_HISTORY)
+        self.multiple_faces_since: Optional[float] = None
+        self.movement_since: Optional[float] = None
+        self.distance_small_since: Optional[float] = None
+        self.distance_large_since: Optional[float] = None
+        self.mismatch_since: Optional[float] = None
+        # Motion gate: thumbnail and verdict of the last fully analysed frame
+        self.last_thumbnail = None
+        self.last_analysis: Optional[Dict[str, Any]] = None
+        self.last_analysis_at: Optional[float] = None
+        # Check scheduler: detector name -> time it last ran
+        self.detector_runs: Dict[str, float] = {}
+        # Cadence: consecutive frames with no anomaly and no alert
+        self.clean_frames = 0
+        # Pre-screening: full-frame audit the server is waiting for
+        self.audit_requested_at: Optional[float] = None
+        self.missed_audits = 0
+        # Heartbeats stood in for frames since the last analysed frame with a face
+        self.heartbeat_gap = False
+        self.last_seen = time.time()
+
+    def touch(self) -> None:
+        self.last_seen = time.time()
+
+    def to_document(self) -> Dict[str, Any]:
+        doc: Dict[str, Any] = {
+            "_id": self.assignment_id,
+            "last_face_time": self.last_face_time,
+            "positions": list(self.positions),
+            "multiple_faces_since": self.multiple_faces_since,
+            "movement_since": self.movement_since,
+            "distance_small_since": self.distance_small_since,
+            "distance_large_since": self.distance_large_since,
+            "mismatch_since": self.mismatch_since,
+            "last_seen": self.last_seen,
+            # datetime copy drives the Mongo TTL index
+            "last_seen_at": datetime.datetime.utcfromtimestamp(self.last_seen),
+            "reference": self.reference.to_document() if self.reference is not None else None,
+            "last_thumbnail": None,
+            "last_analysis": self.last_analysis,
+            "last_analysis_at": self.last_analysis_at,
+            "detector_runs": self.detector_runs,
+            "clean_frames": self.clean_frames,
+            "audit_requested_at": self.audit_requested_at,
+            "missed_audits": self.missed_audits,
+            "heartbeat_gap": self.heartbeat_gap,
+        }
+        if self.last_thumbnail is not None:
+            doc["last_thumbnail"] = {"data": self.last_thumbnail.tobytes(), "shape": list(self.last_thumbnail.shape)}
+        return doc
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "ProctoringSession":
+        session = cls(str(doc["_id"]))
+        session.last_face_time = doc.get("last_face_time")
+        session.positions.extend(doc.get("positions") or [])
+        session.multiple_faces_since = doc.get("multiple_faces_since")
+        session.movement_since = doc.get("movement_since")
+        session.distance_small_since = doc.get("distance_small_since")
+        session.distance_large_since = doc.get("distance_large_since")
+        session.mismatch_since = doc.get("mismatch_since")
+        session.last_seen = doc.get("last_seen") or session.last_seen
+        if doc.get("reference"):
+            session.reference = ReferenceDescriptor.from_document(doc["reference"])
+        session.last_analysis = doc.get("last_analysis")
+        session.last_analysis_at = doc.get("last_analysis_at")
+        session.detector_runs = doc.get("detector_runs") or {}
+        session.clean_frames = doc.get("clean_frames") or 0
+        session.audit_requested_at = doc.get("audit_requested_at")
+        session.missed_audits = doc.get("missed_audits") or 0
+        session.heartbeat_gap = bool(doc.get("heartbeat_gap"))
+        if doc.get("last_thumbnail"):
+            import numpy as np
+            thumb = doc["last_thumbnail"]
+            session.last_thumbnail = np.frombuffer(thumb["data"], np.uint8).reshape(thumb["shape"]).copy()
+        return session
+
+
+class MemorySessionBackend:
+    """Sessions kept in this process, least recently used first."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._sessions: "OrderedDict[str, ProctoringSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, assignment_id: str) -> Optional[ProctoringSession]:
+        with self._lock:
+            session = self._sessions.get(assignment_id)
+            if session is not None:
+                self._sessions.move_to_end(assignment_id)
+            return session
+
+    def save(self, session: ProctoringSession) -> None:
+        with self._lock:
+            self._sessions[session.assignment_id] = session
+            self._sessions.move_to_end(session.assignment_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def delete(self, assignment_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(assignment_id, None)
+
+    def evict_idle(self, cutoff: float) -> int:
+        with self._lock:
+            stale = [k for k, s in self._sessions.items() if s.last_seen < cutoff]
+            for k in stale:
+                del self._sessions[k]
+            return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class MongoSessionBackend:
+    """Sessions shared between workers through a Mongo collection."""
+
+    def __init__(self, ttl_seconds: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._indexed = False
+
+    def _collection(self):
+        coll = get_db()[PROCTORING_SESSIONS_COLLECTION]
+        if not self._indexed:
+            try:
+                coll.create_index("last_seen_at", expireAfterSeconds=self.ttl_seconds)
+            except Exception:
+                pass
+            self._indexed = True
+        return coll
+
+    def load(self, assignment_id: str) -> Optional[ProctoringSession]:
+        doc = self._collection().find_one({"_id": assignment_id})
+        return ProctoringSession.from_document(doc) if doc else None
+
+    def save(self, session: ProctoringSession) -> None:
+        doc = session.to_document()
+        self._collection().replace_one({"_id": doc["_id"]}, doc, upsert=True)
+
+    def delete(self, assignment_id: str) -> None:
+        self._collection().delete_one({"_id": assignment_id})
+
+    def evict_idle(self, cutoff: float) -> int:
+        return self._collection().delete_many({"last_seen": {"$lt": cutoff}}).deleted_count
+
+    def __len__(self) -> int:
+        return self._collection().estimated_document_count()
+
+
+class SessionStore:
+    """Size-capped, idle-expiring store of ProctoringSession objects.
+
+    Backends do their own locking: the memory backend around its map, Mongo
+    per document. The store's lock only elects the thread that runs the idle
+    sweep, so one candidate's Mongo round-trip never delays another's frame.
+    """
+
+    SWEEP_INTERVAL = 60  # seconds between idle sweeps
+
+    def __init__(self, backend, ttl_seconds: int) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def _maybe_sweep(self) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        try:
+            self.backend.evict_idle(now - self.ttl_seconds)
+        except Exception as e:
+            print(f"Proctoring session sweep failed: {e}")
+
+    def get(self, assignment_id: str) -> Optional[ProctoringSession]:
+        self._maybe_sweep()
+        session = self.backend.load(assignment_id)
+        if session is not None and time.time() - session.last_seen > self.ttl_seconds:
+            self.discard(assignment_id)
+            return None
+        return session
+
+    def get_or_create(self, assignment_id: str) -> ProctoringSession:
+        session = self.get(assignment_id)
+        if session is None:
+            session = ProctoringSession(assignment_id)
+        return session
+
+    def save(self, session: ProctoringSession) -> None:
+        session.touch()
+        self.backend.save(session)
+
+    def discard(self, assignment_id: Optional[str]) -> None:
+        """Drop a session, e.g. once its assignment is finished or terminated."""
+        if not assignment_id:
+            return
+        try:
+            self.backend.delete(str(assignment_id))
+        except Exception as e:
+            print(f"Failed to discard proctoring session {assignment_id}: {e}")
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+
+class ReferenceStore:
+    """Reference faces persisted in Mongo with an in-process LRU in front.
+
+    Each assignment's reference is saved once at setup as a small grayscale
+    JPEG thumbnail plus its ReferenceDescriptor, so any worker can answer
+    check_face_setup / check_frame without the original capture.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, ReferenceDescriptor]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, assignment_id: str, descriptor: ReferenceDescriptor) -> None:
+        with self._lock:
+            self._cache[assignment_id] = descriptor
+            self._cache.move_to_end(assignment_id)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def save(self, assignment_id: str, face, descriptor: ReferenceDescriptor) -> None:
+        import cv2
+        scale = THUMBNAIL_WIDTH / float(face.shape[1])
+        thumb = cv2.resize(face, (THUMBNAIL_WIDTH, max(1, int(round(face.shape[0] * scale)))), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', thumb, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+        self._remember(assignment_id, descriptor)
+        get_db()[FACE_REFERENCES_COLLECTION].replace_one(
+            {"_id": assignment_id},
+            {
+                "_id": assignment_id,
+                "thumbnail": jpeg.tobytes() if ok else None,
+                "descriptor": descriptor.to_document(),
+                "created_at": datetime.datetime.utcnow(),
+            },
+            upsert=True,
+        )
+
+    def get(self, assignment_id: Optional[str]) -> Optional[ReferenceDescriptor]:
+        if not assignment_id:
+            return None
+        with self._lock:
+            descriptor = self._cache.get(assignment_id)
+            if descriptor is not None:
+                self._cache.move_to_end(assignment_id)
+                return descriptor
+        try:
+            doc = get_db()[FACE_REFERENCES_COLLECTION].find_one({"_id": assignment_id}, {"descriptor": 1})
+        except Exception as e:
+            print(f"Failed to load reference face for {assignment_id}: {e}")
+            return None
+        if not doc or not doc.get("descriptor"):
+            return None
+        descriptor = ReferenceDescriptor.from_document(doc["descriptor"])
+        self._remember(assignment_id, descriptor)
+        return descriptor
+
+    def forget(self, assignment_id: str) -> None:
+        """Drop the cached copy; the persisted reference is kept for audits."""
+        with self._lock:
+            self._cache.pop(assignment_id, None)
+
+
+class CheckScheduler:
+    """Runs each expensive detector at its own cadence per session.
+
+    Face counting runs on every frame. Identity and eye checks run when
+    their interval has elapsed, or on every frame while the session looks
+    anomalous (a rule timer is running, or the last verdict did not show
+    exactly one face or showed an eye anomaly).
+    """
+
+    def __init__(self, intervals: Dict[str, float]) -> None:
+        self.intervals = dict(intervals)
+        self._lock = threading.Lock()
+        self._cpu: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def is_anomalous(session: ProctoringSession) -> bool:
+        timers = (
+            session.multiple_faces_since,
+            session.movement_since,
+            session.distance_small_since,
+            session.distance_large_since,
+            session.mismatch_since,
+        )
+        if any(t is not None for t in timers):
+            return True
+        last = session.last_analysis
+        if last is None:
+            return True
+        if len(last.get("faces") or []) != 1:
+            return True
+        eyes = last.get("eyes")
+        return eyes is not None and (eyes == 0 or eyes > 2)
+
+    def plan(self, session: ProctoringSession, now: float) -> Dict[str, bool]:
+        """Which expensive detectors should run on this frame."""
+        escalate = self.is_anomalous(session)
+        checks: Dict[str, bool] = {}
+        for name, interval in self.intervals.items():
+            last_run = session.detector_runs.get(name)
+            checks[name] = escalate or last_run is None or (now - last_run) >= interval
+        return checks
+
+    def record(self, session: ProctoringSession, analysis: Dict[str, Any], now: float) -> None:
+        """Note which detectors ran and what they cost."""
+        for name, ran in (analysis.get("checks") or {}).items():
+            if ran:
+                session.detector_runs[name] = now
+        with self._lock:
+            for name, ms in (analysis.get("timings") or {}).items():
+                stats = self._cpu.setdefault(name, {"runs": 0, "total_ms": 0.0})
+                stats["runs"] += 1
+                stats["total_ms"] += ms
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            detectors = {
+                name: {
+                    "runs": int(stats["runs"]),
+                    "total_ms": round(stats["total_ms"], 1),
+                    "avg_ms": round(stats["total_ms"] / stats["runs"], 2) if stats["runs"] else None,
+                }
+                for name, stats in self._cpu.items()
+            }
+        return {"intervals_seconds": self.intervals, "detectors": detectors}
+
+
+class CadenceController:
+    """Suggests how long the client should wait before its next frame.
+
+    Calm sessions relax from ``base_ms`` towards ``max_ms`` as their run of
+    clean frames grows; anomalous sessions tighten to ``min_ms`` so rule
+    timers are sampled closely. When the analysis queue or the CPU is busy
+    the hint is stretched, up to ``ceiling_ms``, for calm sessions first.
+    """
+
+    def __init__(self, base_ms: int, min_ms: int, max_ms: int, ceiling_ms: int, calm_frames: int) -> None:
+        self.base_ms = base_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.ceiling_ms = ceiling_ms
+        self.calm_frames = max(1, calm_frames)
+        self._lock = threading.Lock()
+        self._hints = 0
+        self._hint_total_ms = 0
+        self._last_load = 0.0
+
+    @staticmethod
+    def server_load() -> float:
+        """0.0 when idle, 1.0 when the queue or the CPUs are saturated."""
+        pool = analysis_pool.metrics()
+        queue_load = pool["queue_depth"] / float(pool["queue_capacity"] or 1)
+        try:
+            cpu_load = os.getloadavg()[0] / float(os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            # getloadavg is not available on Windows
+            cpu_load = 0.0
+        return min(1.0, max(queue_load, cpu_load))
+
+    def observe(self, session: ProctoringSession, alerts: List[Dict[str, Any]]) -> None:
+        """Extend or reset the session's clean streak after a frame."""
+        if alerts or CheckScheduler.is_anomalous(session):
+            session.clean_frames = 0
+        else:
+            session.clean_frames += 1
+
+    def next_interval_ms(self, session: ProctoringSession, load: Optional[float] = None) -> int:
+        if load is None:
+            load = self.server_load()
+        if session.clean_frames == 0:
+            interval = float(self.min_ms)
+        elif session.clean_frames < self.calm_frames:
+            interval = float(self.base_ms)
+        else:
+            # Ramp from base to max over a second calm_frames run
+            ramp = min(1.0, (session.clean_frames - self.calm_frames) / float(self.calm_frames))
+            interval = self.base_ms + ramp * (self.max_ms - self.base_ms)
+
+        # Only load above half capacity throttles; at full load calm sessions wait 3x
+        pressure = max(0.0, load - 0.5) * 2
+        if pressure > 0:
+            interval *= 1 + 2 * pressure
+            limit = self.ceiling_ms if session.clean_frames else self.base_ms
+            interval = min(interval, max(limit, self.min_ms))
+
+        # Jitter keeps clients that started together from staying in lockstep
+        hint = min(int(interval * random.uniform(0.9, 1.1)), self.ceiling_ms)
+        with self._lock:
+            self._hints += 1
+            self._hint_total_ms += hint
+            self._last_load = load
+        return hint
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "base_ms": self.base_ms,
+                "min_ms": self.min_ms,
+                "max_ms": self.max_ms,
+                "ceiling_ms": self.ceiling_ms,
+                "hints": self._hints,
+                "avg_hint_ms": round(self._hint_total_ms / self._hints) if self._hints else None,
+                "last_load": round(self._last_load, 3),
+            }
+
+
+class PrescreenPolicy:
+    """Server side of browser pre-screening.
+
+    Browsers with a local face detector send a small heartbeat instead of
+    a frame while their local verdict is unchanged. The server keeps the
+    final say: it asks for random full-frame audits, always asks once no
+    frame has been analysed for ``max_gap`` seconds, and raises an alert
+    when a client keeps answering audit requests with heartbeats.
+    """
+
+    def __init__(self, enabled: bool, audit_rate: float, max_gap: float, max_missed: int) -> None:
+        self.enabled = enabled
+        self.audit_rate = audit_rate
+        self.max_gap = max_gap
+        self.max_missed = max(1, max_missed)
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.heartbeats = 0
+        self.audits_requested = 0
+        self.audits_missed = 0
+
+    def on_frame(self, session: ProctoringSession) -> None:
+        session.audit_requested_at = None
+        session.missed_audits = 0
+        with self._lock:
+            self.frames += 1
+
+    def on_heartbeat(self, session: ProctoringSession, local_faces: Optional[int],
+                     now: float) -> Tuple[bool, List[Dict[str, Any]]]:
+        """Returns (audit requested, alerts) for one heartbeat."""
+        alerts: List[Dict[str, Any]] = []
+        missed = session.audit_requested_at is not None
+        if missed:
+            session.missed_audits += 1
+            if session.missed_audits % self.max_missed == 0:
+                alerts.append({
+                    'type': 'AUDIT_MISSED',
+                    'message': 'Camera frames requested for verification were not sent',
+                    'severity': 'medium',
+                    'timestamp': datetime.datetime.now().isoformat()
+                })
+                print(f"Prescreen audit missed {session.missed_audits} times for assignment {session.assignment_id}")
+
+        stale = session.last_analysis_at is None or (now - session.last_analysis_at) >= self.max_gap
+        audit = (
+            missed
+            or stale
+            or local_faces != 1  # the client should have sent this frame itself
+            or random.random() < self.audit_rate
+        )
+        if audit and session.audit_requested_at is None:
+            session.audit_requested_at = now
+        if session.last_face_time is not None and (session.last_analysis is None or session.last_analysis.get("faces")):
+            # The last analysed frame showed a face; the next one with none starts the
+            # no-face grace afresh. Not during a no-face run, so heartbeats cannot extend it.
+            session.heartbeat_gap = True
+        with self._lock:
+            self.heartbeats += 1
+            self.audits_requested += 1 if audit else 0
+            self.audits_missed += 1 if missed else 0
+        return audit, alerts
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.frames + self.heartbeats
+            return {
+                "enabled": self.enabled,
+                "audit_rate": self.audit_rate,
+                "max_gap_seconds": self.max_gap,
+                "frames": self.frames,
+                "heartbeats": self.heartbeats,
+                "heartbeat_share": round(self.heartbeats / total, 3) if total else None,
+                "audits_requested": self.audits_requested,
+                "audits_missed": self.audits_missed,
+            }
+
+
+def apply_rules(session: ProctoringSession, analysis: Dict[str, Any], current_time: float) -> List[Dict[str, Any]]:
+    """Advance the session's timers with one frame's measurements.
+
+    Returns the alerts raised by this frame. Shared by check_frame and the
+    offline replay harness, which drives it with a simulated clock.
+    """
+    faces = analysis["faces"]
+    face_count = len(faces)
+    img_height = analysis["height"]
+    img_width = analysis["width"]
+
+    alerts = []
+
+    # Check 1: No face detected - wait 15 seconds before rejecting (more lenient)
+    if face_count == 0:
+        if session.heartbeat_gap:
+            # Heartbeats replaced the frames since the face was last seen, so when it
+            # left is unknown: the grace period starts at this frame
+            session.last_face_time = current_time
+        session.heartbeat_gap = False
+        if session.last_face_time and (current_time - session.last_face_time) > 15:
+            # Check if movement was detected before no face
+            if session.movement_since is not None:
+                # Movement + no face for 15s = REJECT (potential cheating)
+                alert = {
+                    'type': 'NO_FACE',
+                    'message': 'No face detected for more than 15 seconds after movement - rejecting',
+                    'timestamp': datetime.datetime.now().isoformat(),
+                    'severity': 'critical'
+                }
+                alerts.append(alert)
+            else:
+                # Just no face without movement - wait 15 seconds then reject
+                alert = {
+                    'type': 'NO_FACE',
+                    'message': 'No face detected for more than 15 seconds - rejecting',
+                    'timestamp': datetime.datetime.now().isoformat(),
+                    'severity': 'critical'
+                }
+                alerts.append(alert)
+    else:
+        session.last_face_time = current_time
+        session.heartbeat_gap = False
+
+        # Reset movement timer when face is detected again
+        session.movement_since = None
+
+        # Check 2: Multiple faces - wait 10 seconds before rejection
+        if face_count > 1:
+            # Check if multiple faces detected for more than 10 seconds
+            if session.multiple_faces_since is None:
+                session.multiple_faces_since = current_time
+            elif (current_time - session.multiple_faces_since) > 10:
+                alert = {
+                    'type': 'MULTIPLE_FACES',
+                    'message': f'{face_count} faces detected for more than 10 seconds - rejecting',
+                    'timestamp': datetime.datetime.now().isoformat(),
+                    'severity': 'critical'
+                }
+                alerts.append(alert)
+        else:
+            # Reset multiple face timer if only one face detected
+            session.multiple_faces_since = None
+
+        # Check 3: Face position change (standing up detection)
+        x, y, w, h = faces[0]
+        face_center_y = y + h/2
+        face_position_ratio = face_center_y / img_height
+
+        session.positions.append(face_position_ratio)  # ring buffer keeps the last 30 frames
+
+        if len(session.positions) >= 10:
+            recent = list(session.positions)[-10:]
+            avg_position = sum(recent) / len(recent)
+            if abs(face_position_ratio - avg_position) > 0.3:
+                # Movement detected - just alert, don't reject yet
+                alert = {
+                    'type': 'POSITION_CHANGE',
+                    'message': 'Significant position change detected - possible movement',
+                    'timestamp': datetime.datetime.now().isoformat(),
+                    'severity': 'low'
+                }
+                alerts.append(alert)
+
+                # Start tracking movement + no face combination
+                if session.movement_since is None:
+                    session.movement_since = current_time
+            else:
+                # Reset movement timer if position is normal
+                session.movement_since = None
+
+        # Check 4: Face size change (moving away/closer)
+        face_size_ratio = (w * h) / (img_height * img_width)
+        if face_size_ratio < 0.02:  # Face too small - moved away
+            # Check if distance change detected for more than 10 seconds
+            if session.distance_small_since is None:
+                session.distance_small_since = current_time
+            elif (current_time - session.distance_small_since) > 10:
+                alert = {
+                    'type': 'DISTANCE_CHANGE',
+                    'message': 'Student moved too far from camera for more than 10 seconds',
+                    'timestamp': datetime.datetime.now().isoformat(),
+                    'severity': 'medium'
+                }
+                alerts.append(alert)
+        elif face_size_ratio > 0.15:  # Face too large - too close
+            # Check if distance change detected for more than 10 seconds
+            if session.distance_large_since is None:
+                session.distance_large_since = current_time
+            elif (current_time - session.distance_large_since) > 10:
+                alert = {
+                    'type': 'DISTANCE_CHANGE',
+                    'message': 'Student moved too close to camera for more than 10 seconds',
+                    'timestamp': datetime.datetime.now().isoformat(),
+                    'severity': 'low'
+                }
+                alerts.append(alert)
+        else:
+            # Reset distance change timers if face size is normal
+            session.distance_small_since = None
+            session.distance_large_since = None
+
+        # Check 5: Face comparison (person switching) - Enhanced detection
+        # Only evaluated on frames where the scheduler ran the identity check
+        similarity = analysis["similarity"]
+        if similarity is not None:
+            combined_similarity = similarity["combined"]
+            print(f"Face similarity check - Hist: {similarity['hist']:.3f}, Template: {similarity['template']:.3f}, SSIM: {similarity['ssim']:.3f}, Combined: {combined_similarity:.3f}")
+
+            # More strict threshold for face matching - wait 10 seconds before rejection
+            if combined_similarity < 0.7:  # Increased from 0.6 to 0.7 for stricter matching
+                # Check if face mismatch detected for more than 10 seconds
+                if session.mismatch_since is None:
+                    session.mismatch_since = current_time
+                elif (current_time - session.mismatch_since) > 10:
+                    alert = {
+                        'type': 'FACE_MISMATCH',
+                        'message': f'Different person detected (similarity: {combined_similarity:.2f}) for more than 10 seconds - rejecting',
+                        'timestamp': datetime.datetime.now().isoformat(),
+                        'severity': 'critical'
+                    }
+                    alerts.append(alert)
+
+                    # Log the violation
+                    print(f"FACE MISMATCH DETECTED: Similarity {combined_similarity:.3f} below threshold 0.7 - REJECTING USER")
+            else:
+                # Reset face mismatch timer if face matches
+                session.mismatch_since = None
+        elif analysis["similarity_error"]:
+            print(f"Face comparison error: {analysis['similarity_error']}")
+            # If comparison fails, assume potential mismatch
+            alert = {
+                'type': 'FACE_MISMATCH',
+                'message': 'Face comparison failed - possible person switch',
+                'timestamp': datetime.datetime.now().isoformat(),
+                'severity': 'critical'
+            }
+            alerts.append(alert)
+        elif analysis.get("new_reference") is not None:
+            # Set reference face on first detection
+            session.reference = analysis["new_reference"]
+            print(f"Reference face set for assignment {session.assignment_id}")
+
+        # Check 6: Eye detection within face region (when scheduled)
+        eyes = analysis["eyes"]
+
+        if eyes == 0:
+            alert = {
+                'type': 'NO_EYES',
+                'message': 'Eyes not detected - face may be obscured',
+                'timestamp': datetime.datetime.now().isoformat(),
+                'severity': 'medium'
+            }
+            alerts.append(alert)
+        elif eyes is not None and eyes > 2:
+            alert = {
+                'type': 'MULTIPLE_EYES',
+                'message': 'Multiple eye pairs detected - possible cheating',
+                'timestamp': datetime.datetime.now().isoformat(),
+                'severity': 'high'
+            }
+            alerts.append(alert)
+
+    return alerts
+
+
+def process_frame(session: ProctoringSession, image_bytes: bytes, current_time: float,
+                  analyze: Callable[..., Optional[Dict[str, Any]]]) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """Run one JPEG frame through the proctoring pipeline.
+
+    The motion gate may reuse the last verdict; otherwise the scheduler
+    picks the detectors and ``analyze`` (the process pool, or analyze_frame
+    directly) measures the frame. Returns (analysis, alerts), or None when
+    the image cannot be decoded. AnalysisOverloaded propagates to the caller.
+    """
+    # Motion gate: an unchanged scene reuses the last verdict, only the timers advance
+    thumbnail = frame_thumbnail(image_bytes)
+    age = (current_time - session.last_analysis_at) if session.last_analysis_at else None
+    if motion_gate.should_reuse(session.assignment_id, session.last_thumbnail, thumbnail, age) and session.last_analysis is not None:
+        analysis = session.last_analysis
+    else:
+        checks = check_scheduler.plan(session, current_time)
+        analysis = analyze(image_bytes, session.reference, checks)
+        if analysis is None:
+            return None
+        check_scheduler.record(session, analysis, current_time)
+        session.last_thumbnail = thumbnail
+        session.last_analysis = {k: v for k, v in analysis.items() if k != "new_reference"}
+        session.last_analysis_at = current_time
+
+    alerts = apply_rules(session, analysis, current_time)
+    cadence.observe(session, alerts)
+    return analysis, alerts
+
+
+def handle_frame(assignment_id: Optional[str], image_bytes: bytes,
+                 analyze: Optional[Callable[..., Optional[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
+    """Check one frame for an assignment and build the client reply.
+
+    Shared by POST /api/check-frame and the /ws/proctoring stream. Returns
+    None when the image cannot be decoded.
+    """
+    session = session_store.get_or_create(assignment_id)
+    if session.reference is None:
+        # Setup may have run on another worker or before a restart
+        session.reference = reference_store.get(assignment_id)
+
+    # Gate, schedule and analyse the frame, then advance the rule timers
+    try:
+        processed = process_frame(session, image_bytes, time.time(), analyze or analysis_pool.analyze)
+    except AnalysisOverloaded as e:
+        # Analysis queue full: ask the browser to back off
+        return {
+            'success': True,
+            'skipped': True,
+            'retry_after_ms': e.retry_after_ms,
+            'next_interval_ms': max(e.retry_after_ms, cadence.next_interval_ms(session, load=1.0)),
+            'alerts': []
+        }
+    if processed is None:
+        return None
+    analysis, alerts = processed
+    prescreen.on_frame(session)
+
+    session_store.save(session)
+    return {
+        'success': True,
+        'faces_detected': len(analysis["faces"]),
+        'alerts': alerts,
+        'next_interval_ms': cadence.next_interval_ms(session),
+        'prescreen': prescreen.enabled
+    }
+
+
+def handle_heartbeat(assignment_id: Optional[str], local_faces: Optional[int]) -> Dict[str, Any]:
+    """Acknowledge a pre-screened tick that carried no frame.
+
+    Only the browser's local face count is reported, and it only decides
+    whether to ask for an audit frame. No rule timer is advanced, so a
+    heartbeat can never clear or postpone a violation by itself.
+    """
+    session = session_store.get_or_create(assignment_id)
+    audit, alerts = prescreen.on_heartbeat(session, local_faces, time.time())
+    session_store.save(session)
+    return {
+        'success': True,
+        'heartbeat': True,
+        'audit': audit,
+        'alerts': alerts,
+        'next_interval_ms': cadence.next_interval_ms(session),
+        'prescreen': prescreen.enabled
+    }
+
+
+def end_session(assignment_id: Optional[str]) -> None:
+    """Release proctoring state once an assignment is finished or terminated."""
+    if not assignment_id:
+        return
+    violation_buffer.flush(str(assignment_id))
+    session_store.discard(assignment_id)
+    reference_store.forget(str(assignment_id))
+
+
+def _make_backend():
+    if PROCTORING_SESSION_BACKEND == "mongo":
+        return MongoSessionBackend(PROCTORING_SESSION_TTL)
+    return MemorySessionBackend(PROCTORING_SESSION_MAX)
+
+
+session_store = SessionStore(_make_backend(), PROCTORING_SESSION_TTL)
+reference_store = ReferenceStore(REFERENCE_CACHE_SIZE)
+check_scheduler = CheckScheduler({"identity": CHECK_IDENTITY_INTERVAL, "eyes": CHECK_EYES_INTERVAL})
+cadence = CadenceController(
+    FRAME_INTERVAL_MS,
+    FRAME_INTERVAL_MIN_MS,
+    FRAME_INTERVAL_MAX_MS,
+    FRAME_INTERVAL_CEILING_MS,
+    FRAME_CALM_FRAMES,
+)
+prescreen = PrescreenPolicy(
+    PRESCREEN_ENABLED,
+    PRESCREEN_AUDIT_RATE,
+    PRESCREEN_MAX_GAP,
+    PRESCREEN_MAX_MISSED_AUDITS,
+)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+OACA Proctoring Stream Client
+Sends JPEG frames to a running server the way the exam page does: over the
+/ws/proctoring WebSocket when it is available, otherwise by POSTing each
+frame to /api/check-frame. Prints every reply and honours next_interval_ms.
+
+Usage:
+    python proctoring_stream_client.py --email user@oaca.local --password secret \
+        --assignment 65f0c0ffee... --frames frames/steady
+    python proctoring_stream_client.py --cookie <access_token> --assignment ... --camera
+    python proctoring_stream_client.py ... --http      # force the HTTP fallback
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Iterator, Optional
+
+COOKIE_NAME = "access_token"
+
+
+def login(base_url: str, email: str, password: str) -> str:
+    """Log in through /api/login and return the access_token cookie."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    req = urllib.request.Request(
+        f"{base_url}/api/login",
+        data=json.dumps({"email": email, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    opener.open(req)
+    for cookie in jar:
+        if cookie.name == COOKIE_NAME:
+            return cookie.value
+    sys.exit("Error: login did not return an access token")
+
+
+def iter_frames(frames_dir: Optional[str], camera: Optional[int]) -> Iterator[bytes]:
+    if frames_dir:
+        for name in sorted(os.listdir(frames_dir)):
+            if name.lower().endswith((".jpg", ".jpeg")):
+                with open(os.path.join(frames_dir, name), "rb") as fp:
+                    yield fp.read()
+        return
+    import cv2
+    cap = cv2.VideoCapture(camera)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            ok, buf = cv2.imencode(".jpg", frame)
+            if ok:
+                yield buf.tobytes()
+    finally:
+        cap.release()
+
+
+def print_reply(i: int, reply: Dict[str, Any], rtt_ms: float) -> None:
+    alerts = ", ".join(f"{a['severity']}:{a['type']}" for a in reply.get("alerts") or [])
+    if reply.get("skipped"):
+        status = f"skipped, retry in {reply.get('retry_after_ms')} ms"
+    elif reply.get("error"):
+        status = f"error: {reply['error']}"
+    else:
+        status = f"faces={reply.get('faces_detected')}"
+    print(f"#{i:04d} {rtt_ms:7.1f} ms  {status}  next={reply.get('next_interval_ms')}  {alerts}")
+
+
+def run_stream(ws_url: str, token: str, frames: Iterator[bytes], fixed_interval: Optional[float]) -> bool:
+    """Stream frames over the WebSocket. Returns False if the stream is unavailable."""
+    try:
+        import simple_websocket
+    except ImportError:
+        print("simple-websocket not installed, using HTTP")
+        return False
+    try:
+        ws = simple_websocket.Client.connect(ws_url, headers={"Cookie": f"{COOKIE_NAME}={token}"})
+        hello = json.loads(ws.receive(timeout=10) or "{}")
+    except Exception as e:
+        print(f"Stream unavailable ({e}), using HTTP")
+        return False
+    if hello.get("type") != "ready":
+        print(f"Stream refused: {hello.get('error', hello)}")
+        ws.close()
+        return False
+
+    print(f"Streaming to {ws_url}")
+    delay_ms = hello.get("next_interval_ms", 2000)
+    try:
+        for i, frame in enumerate(frames):
+            started = time.perf_counter()
+            ws.send(frame)
+            reply = json.loads(ws.receive(timeout=30))
+            print_reply(i, reply, (time.perf_counter() - started) * 1000)
+            delay_ms = reply.get("next_interval_ms") or delay_ms
+            time.sleep(fixed_interval if fixed_interval is not None else delay_ms / 1000.0)
+    finally:
+        ws.close()
+    return True
+
+
+def run_http(base_url: str, token: str, assignment_id: str, frames: Iterator[bytes], fixed_interval: Optional[float]) -> None:
+    print(f"Posting to {base_url}/api/check-frame")
+    for i, frame in enumerate(frames):
+        req = urllib.request.Request(
+            f"{base_url}/api/check-frame?{urllib.parse.urlencode({'assignment_id': assignment_id})}",
+            data=frame,
+            headers={"Content-Type": "image/jpeg", "Cookie": f"{COOKIE_NAME}={token}"},
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                reply = json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            reply = json.loads(e.read() or b"{}") or {"error": str(e)}
+        print_reply(i, reply, (time.perf_counter() - started) * 1000)
+        delay_ms = reply.get("next_interval_ms") or 2000
+        time.sleep(fixed_interval if fixed_interval is not None else delay_ms / 1000.0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send proctoring frames over /ws/proctoring or /api/check-frame.")
+    parser.add_argument("--url", default="http://localhost:8000", help="server base URL")
+    parser.add_argument("--assignment", required=True, help="assignment id the frames belong to")
+    parser.add_argument("--email", help="candidate email (with --password)")
+    parser.add_argument("--password", help="candidate password")
+    parser.add_argument("--cookie", help="existing access_token cookie instead of logging in")
+    parser.add_argument("--frames", help="directory of JPEG frames, sent in name order")
+    parser.add_argument("--camera", type=int, nargs="?", const=0, help="capture from this webcam index instead")
+    parser.add_argument("--interval", type=float, help="fixed seconds between frames (default: server hint)")
+    parser.add_argument("--http", action="store_true", help="skip the WebSocket and POST every frame")
+    args = parser.parse_args()
+
+    if not args.frames and args.camera is None:
+        parser.error("one of --frames or --camera is required")
+    base_url = args.url.rstrip("/")
+    token = args.cookie or (login(base_url, args.email, args.password) if args.email else None)
+    if not token:
+        parser.error("--cookie or --email/--password is required")
+
+    frames = iter_frames(args.frames, args.camera)
+    ws_url = base_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+    ws_url = f"{ws_url}/ws/proctoring?assignment_id={args.assignment}"
+    if args.http or not run_stream(ws_url, token, frames, args.interval):
+        run_http(base_url, token, args.assignment, frames, args.interval)
+
+
+if __name__ == "__main__":
+    main()
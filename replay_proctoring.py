@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+OACA Proctoring Replay Harness
+Replays recorded JPEG frame sequences through the proctoring pipeline
+(setup_reference + check_frame logic, no HTTP, no database) and reports
+latency, throughput, peak memory and the violation timeline against labels.
+
+Sequence layout (one directory per sequence):
+
+    frames/
+      two_faces/
+        labels.json      {"interval": 2.0, "reference": "reference.jpg",
+                          "events": [{"type": "MULTIPLE_FACES", "start": 20, "end": 50}]}
+                         (an event without "end" lasts until the last frame)
+        reference.jpg    optional setup capture (defaults to the first frame)
+        0000.jpg 0001.jpg ...
+
+Event types are check_frame alert types (NO_FACE, MULTIPLE_FACES,
+FACE_MISMATCH, ...). Frames are replayed on a simulated clock, one frame
+every ``interval`` seconds, so the 10/15 second rule timers behave as in
+a live exam. Face-count accuracy expects 0 faces during NO_FACE events,
+2 or more during MULTIPLE_FACES events and 1 otherwise.
+
+--detector haar,dnn replays everything once per face detector backend
+and prints a side-by-side summary.
+
+Usage:
+    python replay_proctoring.py frames/
+    python replay_proctoring.py frames/ --no-gate --detector haar,dnn
+    python replay_proctoring.py --synthesize frames/ --face me.jpg --other-face other.jpg
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Sequences are replayed in-process; keep the harness away from the pool
+os.environ.setdefault("FRAME_ANALYSIS_WORKERS", "0")
+
+import frame_analysis  # noqa: E402
+import proctoring  # noqa: E402
+
+DETECTION_SLACK = 30.0  # seconds after an event's end in which its alert still counts
+CRITICAL = "critical"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[idx], 2)
+
+
+def load_sequence(path: str) -> Dict[str, Any]:
+    labels_path = os.path.join(path, "labels.json")
+    labels: Dict[str, Any] = {}
+    if os.path.exists(labels_path):
+        with open(labels_path, "r", encoding="utf-8") as fp:
+            labels = json.load(fp)
+    reference_name = labels.get("reference")
+    frames = sorted(
+        f for f in os.listdir(path)
+        if f.lower().endswith((".jpg", ".jpeg")) and f != reference_name
+    )
+    return {
+        "name": os.path.basename(os.path.normpath(path)),
+        "path": path,
+        "interval": float(labels.get("interval", 2.0)),
+        "reference": os.path.join(path, reference_name) if reference_name else None,
+        "events": labels.get("events", []),
+        "frames": [os.path.join(path, f) for f in frames],
+    }
+
+
+def expected_faces(events: List[Dict[str, Any]], t: float) -> int:
+    for ev in events:
+        end = float(ev["end"]) if "end" in ev else float("inf")
+        if float(ev.get("start", 0)) <= t <= end:
+            if ev["type"] == "NO_FACE":
+                return 0
+            if ev["type"] == "MULTIPLE_FACES":
+                return 2
+    return 1
+
+
+def replay_sequence(seq: Dict[str, Any], verbose: bool = False) -> Dict[str, Any]:
+    """Run one sequence and return its timings and alert timeline."""
+    session = proctoring.ProctoringSession(f"replay-{seq['name']}")
+    setup_ms: Optional[float] = None
+    setup_error: Optional[str] = None
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+    reference_path = seq["reference"] or (seq["frames"][0] if seq["frames"] else None)
+    frame_ms: List[float] = []
+    hints_ms: List[int] = []
+    face_hits = 0
+    timeline: List[Dict[str, Any]] = []
+    cpu_started = time.process_time()
+    with sink:
+        if reference_path:
+            with open(reference_path, "rb") as fp:
+                data = fp.read()
+            t = time.perf_counter()
+            prepared = frame_analysis.prepare_reference(data)
+            if prepared and not prepared.get("error"):
+                session.reference = frame_analysis.ReferenceDescriptor.from_face(prepared["face"])
+            setup_ms = (time.perf_counter() - t) * 1000
+            if prepared is None:
+                setup_error = "undecodable reference image"
+            elif prepared.get("error"):
+                setup_error = prepared["error"]
+        session.last_face_time = 0.0
+
+        for i, frame_path in enumerate(seq["frames"]):
+            with open(frame_path, "rb") as fp:
+                data = fp.read()
+            now = i * seq["interval"]
+            t = time.perf_counter()
+            processed = proctoring.process_frame(session, data, now, frame_analysis.analyze_frame)
+            frame_ms.append((time.perf_counter() - t) * 1000)
+            if processed is None:
+                continue
+            analysis, alerts = processed
+            expected = expected_faces(seq["events"], now)
+            detected = len(analysis["faces"])
+            face_hits += 1 if (detected >= 2 if expected == 2 else detected == expected) else 0
+            hints_ms.append(proctoring.cadence.next_interval_ms(session, load=0.0))
+            for alert in alerts:
+                timeline.append({"t": now, "frame": os.path.basename(frame_path),
+                                 "type": alert["type"], "severity": alert["severity"]})
+    cpu_seconds = time.process_time() - cpu_started
+
+    return {
+        "name": seq["name"],
+        "frames": len(seq["frames"]),
+        "setup_ms": round(setup_ms, 2) if setup_ms is not None else None,
+        "setup_error": setup_error,
+        "frame_ms": frame_ms,
+        "hints_ms": hints_ms,
+        "face_accuracy": round(face_hits / len(seq["frames"]), 3) if seq["frames"] else None,
+        "cpu_seconds": cpu_seconds,
+        "timeline": timeline,
+        "events": score_events(seq["events"], timeline),
+    }
+
+
+def score_events(events: List[Dict[str, Any]], timeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Match critical alerts against labelled events."""
+    matched = []
+    used = set()
+    for ev in events:
+        start = float(ev.get("start", 0))
+        # Events without an end last until the sequence does
+        end = float(ev["end"]) + DETECTION_SLACK if "end" in ev else float("inf")
+        hit = next((i for i, a in enumerate(timeline)
+                    if a["type"] == ev["type"] and a["severity"] == CRITICAL and start <= a["t"] <= end), None)
+        if hit is not None:
+            used.update(i for i, a in enumerate(timeline)
+                        if a["type"] == ev["type"] and a["severity"] == CRITICAL and start <= a["t"] <= end)
+        matched.append({
+            "type": ev["type"],
+            "start": start,
+            "detected_at": timeline[hit]["t"] if hit is not None else None,
+            "latency_s": round(timeline[hit]["t"] - start, 2) if hit is not None else None,
+        })
+    false_alarms = [a for i, a in enumerate(timeline) if a["severity"] == CRITICAL and i not in used]
+    return {
+        "expected": matched,
+        "missed": sum(1 for m in matched if m["detected_at"] is None),
+        "false_alarms": false_alarms,
+    }
+
+
+def synthesize(out_dir: str, face_path: str, other_face_path: Optional[str], frames: int, interval: float) -> None:
+    """Write labelled synthetic sequences built from one or two face photos."""
+    import cv2
+    import numpy as np
+
+    face = cv2.imread(face_path)
+    if face is None:
+        sys.exit(f"Error: cannot read {face_path}")
+    h, w = face.shape[:2]
+    rng = np.random.default_rng(7)
+
+    def jitter(img):
+        # Small sensor noise and a one-pixel shake, like a webcam at rest
+        dx, dy = rng.integers(-1, 2, size=2)
+        shifted = np.roll(np.roll(img, dy, axis=0), dx, axis=1)
+        noise = rng.normal(0, 2.0, img.shape)
+        return np.clip(shifted.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+    empty = np.full_like(face, face.mean(axis=(0, 1)).astype(np.uint8))  # candidate left the frame
+    pair = np.hstack([face, cv2.flip(face, 1)])  # a second person beside the candidate
+    onset = frames // 3
+    sequences: Dict[str, Any] = {
+        "steady": ([face] * frames, []),
+        "no_face": ([face] * onset + [empty] * (frames - onset), [{"type": "NO_FACE", "start": onset * interval}]),
+        "two_faces": ([face] * onset + [pair] * (frames - onset), [{"type": "MULTIPLE_FACES", "start": onset * interval}]),
+    }
+    if other_face_path:
+        other = cv2.imread(other_face_path)
+        if other is None:
+            sys.exit(f"Error: cannot read {other_face_path}")
+        other = cv2.resize(other, (w, h))
+        sequences["person_swap"] = ([face] * onset + [other] * (frames - onset),
+                                    [{"type": "FACE_MISMATCH", "start": onset * interval}])
+
+    for name, (imgs, events) in sequences.items():
+        seq_dir = os.path.join(out_dir, name)
+        os.makedirs(seq_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(seq_dir, "reference.jpg"), face)
+        for i, img in enumerate(imgs):
+            cv2.imwrite(os.path.join(seq_dir, f"{i:04d}.jpg"), jitter(img))
+        with open(os.path.join(seq_dir, "labels.json"), "w", encoding="utf-8") as fp:
+            json.dump({"interval": interval, "reference": "reference.jpg", "events": events}, fp, indent=2)
+        print(f"Wrote {len(imgs)} frames to {seq_dir}")
+
+
+def print_report(results: List[Dict[str, Any]], peak_rss_mb: float) -> None:
+    all_ms = [ms for r in results for ms in r["frame_ms"]]
+    total_frames = sum(r["frames"] for r in results)
+    total_cpu = sum(r["cpu_seconds"] for r in results)
+    print("\n" + "=" * 60)
+    print("  Proctoring replay report")
+    print("=" * 60)
+    for r in results:
+        print(f"\n▶ {r['name']}: {r['frames']} frames, setup {r['setup_ms']} ms"
+              + (f" (rejected: {r['setup_error']})" if r["setup_error"] else ""))
+        print(f"   frame ms p50={percentile(r['frame_ms'], 50)} p95={percentile(r['frame_ms'], 95)} p99={percentile(r['frame_ms'], 99)}")
+        print(f"   face count accuracy {r['face_accuracy']}")
+        if r["hints_ms"]:
+            print(f"   hinted cadence ms avg={sum(r['hints_ms']) / len(r['hints_ms']):.0f} last={r['hints_ms'][-1]}")
+        for ev in r["events"]["expected"]:
+            status = f"detected after {ev['latency_s']}s" if ev["detected_at"] is not None else "MISSED"
+            print(f"   expected {ev['type']} at {ev['start']}s: {status}")
+        for fa in r["events"]["false_alarms"]:
+            print(f"   false alarm {fa['type']} at {fa['t']}s ({fa['frame']})")
+        for a in r["timeline"]:
+            print(f"   {a['t']:7.1f}s  {a['severity']:<8} {a['type']}")
+    print("\n" + "-" * 60)
+    print(f"Frames: {total_frames}")
+    print(f"Latency ms: p50={percentile(all_ms, 50)} p95={percentile(all_ms, 95)} p99={percentile(all_ms, 99)} max={percentile(all_ms, 100)}")
+    print(f"Throughput: {total_frames / total_cpu:.1f} frames/s per core" if total_cpu > 0 else "Throughput: n/a")
+    print(f"Peak RSS: {peak_rss_mb:.1f} MB")
+    print(f"Missed events: {sum(r['events']['missed'] for r in results)}, "
+          f"false alarms: {sum(len(r['events']['false_alarms']) for r in results)}")
+    print(f"Motion gate: {frame_analysis.motion_gate.metrics()}")
+    print(f"Detectors: {proctoring.check_scheduler.metrics()['detectors']}")
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    all_ms = [ms for r in results for ms in r["frame_ms"]]
+    frames = sum(r["frames"] for r in results)
+    cpu = sum(r["cpu_seconds"] for r in results)
+    return {
+        "p50_ms": percentile(all_ms, 50),
+        "p95_ms": percentile(all_ms, 95),
+        "fps_per_core": round(frames / cpu, 1) if cpu > 0 else None,
+        "face_accuracy": round(sum(r["face_accuracy"] * r["frames"] for r in results if r["face_accuracy"] is not None) / frames, 3) if frames else None,
+        "missed": sum(r["events"]["missed"] for r in results),
+        "false_alarms": sum(len(r["events"]["false_alarms"]) for r in results),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay JPEG frame sequences through the proctoring pipeline.")
+    parser.add_argument("frames_dir", help="directory of sequences (or output directory with --synthesize)")
+    parser.add_argument("--synthesize", action="store_true", help="write synthetic labelled sequences instead of replaying")
+    parser.add_argument("--face", help="face photo used by --synthesize")
+    parser.add_argument("--other-face", help="second person for the person_swap sequence")
+    parser.add_argument("--frames", type=int, default=45, help="frames per synthetic sequence")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between synthetic frames")
+    parser.add_argument("--no-gate", action="store_true", help="disable the motion gate")
+    parser.add_argument("--full-checks", action="store_true", help="run every detector on every frame")
+    parser.add_argument("--detector", help="face detector backend(s) to compare, e.g. haar,dnn (default: FACE_DETECTOR)")
+    parser.add_argument("--json", help="also write the raw results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline log lines")
+    args = parser.parse_args()
+
+    if args.synthesize:
+        if not args.face:
+            parser.error("--synthesize requires --face")
+        synthesize(args.frames_dir, args.face, args.other_face, args.frames, args.interval)
+        return
+
+    if args.no_gate:
+        frame_analysis.motion_gate.enabled = False
+    if args.full_checks:
+        proctoring.check_scheduler.intervals = {name: 0.0 for name in proctoring.check_scheduler.intervals}
+
+    seq_dirs = sorted(
+        os.path.join(args.frames_dir, d) for d in os.listdir(args.frames_dir)
+        if os.path.isdir(os.path.join(args.frames_dir, d))
+    )
+    if not seq_dirs:
+        sys.exit(f"Error: no sequence directories in {args.frames_dir}")
+
+    detectors = args.detector.split(",") if args.detector else [frame_analysis.face_detector().name]
+    runs: Dict[str, List[Dict[str, Any]]] = {}
+    for name in detectors:
+        active = frame_analysis.use_face_detector(name.strip()).name
+        results = [replay_sequence(load_sequence(d), verbose=args.verbose) for d in seq_dirs]
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KB on Linux
+        print(f"\nFace detector: {active}")
+        print_report(results, peak_rss_mb)
+        runs[active] = results
+
+    if len(runs) > 1:
+        print("\n" + "=" * 60)
+        print(f"  {'detector':<10}{'p50 ms':>8}{'p95 ms':>8}{'fps/core':>10}{'face acc':>10}{'missed':>8}{'false':>7}")
+        for name, results in runs.items():
+            row = summarize(results)
+            print(f"  {name:<10}{row['p50_ms']!s:>8}{row['p95_ms']!s:>8}{row['fps_per_core']!s:>10}"
+                  f"{row['face_accuracy']!s:>10}{row['missed']:>8}{row['false_alarms']:>7}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump({"runs": runs, "peak_rss_mb": peak_rss_mb}, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
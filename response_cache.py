@@ -0,0 +1,114 @@
+"""
+In-process cache for anonymous, identical-for-everyone JSON responses.
+
+Each entry lives ``ttl`` seconds. Once it expires, the first request
+recomputes it while concurrent requests keep getting the stale copy; on a
+cold start the others wait for that single computation instead of all
+querying MongoDB. Responses carry Cache-Control and an ETag so browsers
+and the Vercel CDN can cache them too.
+"""
+
+import functools
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from flask import Response, make_response, request
+
+from configuration import STATS_CACHE_ENABLED
+
+
+class _Entry:
+    __slots__ = ("body", "status", "mimetype", "etag", "expires_at", "refreshing")
+
+    def __init__(self, body: bytes, status: int, mimetype: str, expires_at: float) -> None:
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.expires_at = expires_at
+        self.refreshing = False
+
+
+class ResponseCache:
+    """Single-flight TTL cache for GET views, keyed by endpoint name and query string."""
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, outcome: str) -> None:
+        # Called with the lock held
+        counters = self._counters.setdefault(name, {"hits": 0, "stale": 0, "misses": 0, "errors": 0})
+        counters[outcome] += 1
+
+    def cached(self, name: str, ttl: float) -> Callable:
+        """Decorator caching the view's 200 responses for ``ttl`` seconds."""
+        def decorator(view: Callable) -> Callable:
+            @functools.wraps(view)
+            def wrapper(*args: Any, **kwargs: Any):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                key = f"{name}?{request.query_string.decode()}"
+                now = time.time()
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.expires_at > now:
+                        self._count(name, "hits")
+                        return self._respond(entry, ttl)
+                    if entry is not None and entry.refreshing:
+                        # Someone is already recomputing: serve what we have
+                        self._count(name, "stale")
+                        return self._respond(entry, ttl)
+                    if entry is not None:
+                        entry.refreshing = True
+                    key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+                with key_lock:
+                    # A cold-start request that waited here may find the work done
+                    with self._lock:
+                        fresh = self._entries.get(key)
+                        if fresh is not None and fresh is not entry and fresh.expires_at > time.time():
+                            self._count(name, "hits")
+                            return self._respond(fresh, ttl)
+                    try:
+                        response = make_response(view(*args, **kwargs))
+                    finally:
+                        if entry is not None:
+                            entry.refreshing = False
+                    with self._lock:
+                        if response.status_code != 200:
+                            # Errors are not cached; the stale entry stays for the next attempt
+                            self._count(name, "errors")
+                            return response
+                        self._count(name, "misses")
+                        fresh = _Entry(response.get_data(), response.status_code, response.mimetype, time.time() + ttl)
+                        self._entries[key] = fresh
+                    return self._respond(fresh, ttl)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _respond(entry: _Entry, ttl: float) -> Response:
+        response = Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = int(ttl)
+        response.cache_control.s_maxage = int(ttl)
+        response.cache_control.stale_while_revalidate = int(ttl)
+        return response.make_conditional(request)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"enabled": self.enabled}
+            for name, counters in self._counters.items():
+                served = counters["hits"] + counters["stale"] + counters["misses"]
+                out[name] = dict(counters, hit_rate=round((counters["hits"] + counters["stale"]) / served, 3) if served else None)
+            return out
+
+
+stats_cache = ResponseCache(STATS_CACHE_ENABLED)
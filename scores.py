@@ -1,18 +1,52 @@
 import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 import os
 import json
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 
 from configuration import get_db, SCORES_COLLECTION, USERS_COLLECTION, ASSIGNMENTS_COLLECTION, NOTIFICATIONS_COLLECTION, USER_ATTEMPTS_COLLECTION
+from configuration import PROCTORING_STREAM_IDLE_TIMEOUT, PROCTORING_STREAM_MAX_FRAME
 from login import _current_user_claims
+from proctoring import ProctoringSession, cadence, check_scheduler, end_session as end_proctoring_session, handle_frame, handle_heartbeat, prescreen, reference_store, session_store
+from frame_analysis import ReferenceDescriptor, analysis_pool, motion_gate, prepare_reference
+from blob_store import decode_data_url, image_store
+from stats import ASSIGNMENT_STATE_FIELDS, daily_rollups, platform_stats, question_usage
+from item_analysis import item_analysis
+from pagination import find_page, keyset_cursor, keyset_match, page_args, page_response, page_total
+from assignment_status import ASSIGNMENT_STATUS
+from response_cache import stats_cache
+from user_profiles import user_profiles
+from users import TUNISIA_AIRPORTS
+from violation_log import is_critical as is_critical_violation, store_image as store_violation_image, violation_buffer
+
+try:
+    from flask_sock import Sock
+except ImportError:  # optional: without it browsers keep posting to /api/check-frame
+    Sock = None
 
 
 scores_bp = Blueprint("scores", __name__)
+
+
+def _update_assignment(filter: Dict[str, Any], update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """update_one on an assignment that keeps the stats counters, question usage and daily rollups in step.
+
+    Returns the assignment's state fields as they were before the update,
+    or None if nothing matched.
+    """
+    before = get_db()[ASSIGNMENTS_COLLECTION].find_one_and_update(filter, update, projection=ASSIGNMENT_STATE_FIELDS)
+    if before is not None:
+        after = dict(before, **update.get("$set", {}))
+        platform_stats.record(before, after)
+        question_usage.assignment_updated(before, after)
+        daily_rollups.assignment_updated(before, after)
+    return before
+
+
 def _send_success_email(target_email: str, correct: int, total: int, percentage: float, per_section: Dict[str, Dict[str, int]]) -> bool:
     """Send success email when candidate passes with >70% score.
     Shows sections where they excelled.
@@ -192,10 +226,11 @@ def create_quiz_assignment():
         per_section: Dict[str, int] = {str(k): int(v) for k, v in (raw_per_section or {}).items() if int(v) > 0}
         
         # Delete any existing unfinished assignments for this user before creating new one
-        db[ASSIGNMENTS_COLLECTION].delete_many({
-            "email": target_email,
-            "finished_at": None  # Only delete unfinished assignments
-        })
+        unfinished = {"email": target_email, "finished_at": None}  # Only delete unfinished assignments
+        stale = list(db[ASSIGNMENTS_COLLECTION].find(unfinished, {"created_at": 1, "started_at": 1, "airport": 1}))
+        if stale:
+            db[ASSIGNMENTS_COLLECTION].delete_many({"_id": {"$in": [d["_id"] for d in stale]}})
+            daily_rollups.assignments_deleted(stale)
 
         # Reset attempts for the user when assigning a new quiz (admin override)
         # This allows admins to reassign quizzes even if user cheated, was rejected, or failed
@@ -310,9 +345,11 @@ def create_quiz_assignment():
             "score": None,
             "total_with_keys": None,
             "attempted": None,
+            "airport": user_profiles.airport(target_email),  # copied for per-airport reports
         }
         db = get_db()
         result = db[ASSIGNMENTS_COLLECTION].insert_one(doc)
+        daily_rollups.assignment_created(doc)
         # Attempts are reset to 0 above, no need to increment here
         
         # Send notification email (SMTP if configured) and store notification
@@ -426,29 +463,72 @@ def create_quiz_assignment():
             "score": None,
             "total_with_keys": None,
             "attempted": None,
+            "airport": user_profiles.airport(target_email),  # copied for per-airport reports
         }
         result = db[ASSIGNMENTS_COLLECTION].insert_one(doc)
+        daily_rollups.assignment_created(doc)
 
         # Don't increment attempts here - wait until quiz actually starts
         # Attempts will be incremented when started_at is set in the questions endpoint
         return jsonify({"ok": True, "assignment_id": str(result.inserted_id)})
 
 
+# Projection profiles of assignment lists: summary for tables and cards, detail for reports.
+# Neither carries images; they are served by /api/violation-image and the reference endpoints.
+ASSIGNMENT_PROFILES = {
+    "summary": {
+        "email": 1, "airport": 1, "assigned_by": 1, "total": 1, "created_at": 1, "started_at": 1,
+        "finished_at": 1, "duration_seconds": 1, "duration_used_seconds": 1, "score": 1, "total_with_keys": 1,
+        "attempted": 1, "percentage_score": 1, "passed": 1, "terminated": 1, "termination_reason": 1,
+        "terminated_at": 1, "violations": 1,
+    },
+    "detail": {"reference_image": 0, "violation_log.captured_image": 0},
+}
+
+
+def _assignment_list(query: Dict[str, Any], index_prefix=()):
+    """Assignments matching query as a plain array, or a keyset page when limit/cursor is given."""
+    try:
+        limit, cursor, projection = page_args(ASSIGNMENT_PROFILES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    coll = get_db()[ASSIGNMENTS_COLLECTION]
+    docs, next_cursor = find_page(coll, query, projection, limit, cursor, index_prefix=index_prefix)
+    for d in docs:
+        # Promote _id to assignment_id (string) for client convenience
+        d["assignment_id"] = str(d.pop("_id"))
+    if limit is None:
+        return jsonify(docs)
+    return jsonify(page_response(docs, next_cursor, page_total(coll, query)))
+
+
 @scores_bp.route("/api/quiz-assignments", methods=["GET"])  # admin list assignments
 def list_quiz_assignments():
+    """List assignments, newest first
+
+    Optional filters: email, airport, status (see assignment_status.py) and
+    q (email contains). See pagination.py for limit, cursor and profile.
+    """
     claims = _current_user_claims()
     if not claims:
         return jsonify({"error": "Unauthorized"}), 401
     if claims.get("role") != "admin":
         return jsonify({"error": "Forbidden"}), 403
-    cursor = get_db()[ASSIGNMENTS_COLLECTION].find({}).sort("created_at", -1)
-    out: List[Dict[str, Any]] = []
-    for doc in cursor:
-        d = dict(doc)
-        if d.get("_id") is not None:
-            d["assignment_id"] = str(d.pop("_id"))
-        out.append(d)
-    return jsonify(out)
+    status = request.args.get("status") or None
+    if status and status not in ASSIGNMENT_STATUS:
+        return jsonify({"error": f"status must be one of: {', '.join(ASSIGNMENT_STATUS)}"}), 400
+    query: Dict[str, Any] = dict(ASSIGNMENT_STATUS[status]) if status else {}
+    prefix = []
+    if request.args.get("email"):
+        query["email"] = request.args["email"].strip().lower()
+        prefix.append("email")
+    elif request.args.get("q"):
+        import re
+        query["email"] = {"$regex": re.escape(request.args["q"].strip()), "$options": "i"}
+    if request.args.get("airport"):
+        query["airport"] = request.args["airport"]
+        prefix = prefix or ["airport"]
+    return _assignment_list(query, prefix)
 
 
 @scores_bp.route("/api/quiz-sections", methods=["GET"])  # list available sections
@@ -484,16 +564,7 @@ def my_assignments():
     claims = _current_user_claims()
     if not claims:
         return jsonify({"error": "Unauthorized"}), 401
-    email = claims.get("email")
-    cursor = get_db()[ASSIGNMENTS_COLLECTION].find({"email": email}).sort("created_at", -1)
-    out: List[Dict[str, Any]] = []
-    for doc in cursor:
-        d = dict(doc)
-        # Promote _id to assignment_id (string) for client convenience
-        if d.get("_id") is not None:
-            d["assignment_id"] = str(d.pop("_id"))
-        out.append(d)
-    return jsonify(out)
+    return _assignment_list({"email": claims.get("email")}, ("email",))
 
 @scores_bp.route("/api/my/attempts", methods=["GET"])  # get user's attempts info
 def get_my_attempts():
@@ -519,6 +590,14 @@ def get_my_attempts():
     })
 
 
+HISTORY_PROFILES = {
+    "summary": {f: 1 for f in ("created_at", "started_at", "finished_at", "score", "total_with_keys", "attempted",
+                               "percentage_score", "passed", "terminated", "termination_reason",
+                               "duration_used_seconds", "duration_seconds", "total")},
+}
+HISTORY_PROFILES["detail"] = dict(HISTORY_PROFILES["summary"], per_section=1)
+
+
 @scores_bp.route("/api/my/test-history", methods=["GET"])  # get user's test history
 def get_my_test_history():
     """Get user's completed test history with scores and details"""
@@ -526,19 +605,18 @@ def get_my_test_history():
     if not claims:
         return jsonify({"error": "Unauthorized"}), 401
     
-    email = claims.get("email")
-    db = get_db()
+    try:
+        limit, cursor, projection = page_args(HISTORY_PROFILES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    coll = get_db()[ASSIGNMENTS_COLLECTION]
     
-    # Get all completed assignments for this user (finished_at is not None)
-    cursor = db[ASSIGNMENTS_COLLECTION].find(
-        {
-            "email": email,
-            "finished_at": {"$ne": None}
-        }
-    ).sort("finished_at", -1)  # Most recent first
+    # Completed assignments for this user (finished_at is not None), most recent first
+    query = {"email": claims.get("email"), "finished_at": {"$ne": None}}
+    docs, next_cursor = find_page(coll, query, projection, limit, cursor, field="finished_at", index_prefix=("email",))
     
     history: List[Dict[str, Any]] = []
-    for doc in cursor:
+    for doc in docs:
         d = dict(doc)
         # Convert _id to string
         if d.get("_id") is not None:
@@ -559,12 +637,15 @@ def get_my_test_history():
             "termination_reason": d.get("termination_reason"),
             "duration_used_seconds": d.get("duration_used_seconds"),
             "duration_seconds": d.get("duration_seconds", 15 * 60),
-            "per_section": d.get("per_section", {}),
             "total": d.get("total", 0),
         }
+        if "per_section" in projection:
+            history_item["per_section"] = d.get("per_section", {})
         history.append(history_item)
     
-    return jsonify(history)
+    if limit is None:
+        return jsonify(history)
+    return jsonify(page_response(history, next_cursor, page_total(coll, query)))
 
 
 @scores_bp.route("/api/quiz-assignments/questions", methods=["POST"])  # get questions for an assignment id
@@ -595,7 +676,7 @@ def get_assignment_questions():
         if elapsed >= duration:
             # Auto-finish on timeout but still allow viewing questions
             try:
-                get_db()[ASSIGNMENTS_COLLECTION].update_one(
+                _update_assignment(
                     {"_id": assignment["_id"]},
                     {"$set": {
                         "finished_at": now,
@@ -604,6 +685,7 @@ def get_assignment_questions():
                 )
             except Exception:
                 pass
+            end_proctoring_session(assignment_id)
             expired = True
 
     # Load quiz data and materialize selected questions
@@ -662,7 +744,7 @@ def get_assignment_questions():
     # Mark started_at if not set and count attempt
     if not assignment.get("started_at"):
         db = get_db()
-        db[ASSIGNMENTS_COLLECTION].update_one({"_id": assignment["_id"]}, {"$set": {"started_at": now}})
+        _update_assignment({"_id": assignment["_id"]}, {"$set": {"started_at": now}})
         # Count attempt immediately when quiz starts
         email = assignment.get("email")
         if email:
@@ -690,7 +772,7 @@ def get_assignment_questions():
                 # Notify admins that this candidate started the quiz (best-effort, non-blocking)
                 try:
                     # local helper to avoid top-level side-effects
-                    def _notify_admins_on_quiz_start(assignment_obj_id):
+                    def _notify_admins_on_quiz_start(a):
                         try:
                             smtp_server = os.environ.get("SMTP_SERVER", "")
                             smtp_port = int(os.environ.get("SMTP_PORT", "587"))
@@ -701,16 +783,9 @@ def get_assignment_questions():
                                 return False
 
                             db2 = get_db()
-                            a = db2[ASSIGNMENTS_COLLECTION].find_one({"_id": assignment_obj_id})
-                            if not a:
-                                return False
                             candidate_email = a.get("email")
                             # resolve candidate display name if available
-                            user = db2[USERS_COLLECTION].find_one({"email": candidate_email}, {"display_name": 1, "username": 1})
-                            display_name = None
-                            if user:
-                                display_name = user.get("display_name") or user.get("username")
-                            display_name = display_name or (candidate_email.split("@")[0] if candidate_email else "Unknown")
+                            display_name = user_profiles.display_name(candidate_email)
 
                             # get admin emails
                             admins_cursor = db2[USERS_COLLECTION].find({"role": "admin"}, {"email": 1})
@@ -719,7 +794,7 @@ def get_assignment_questions():
                                 return False
 
                             # build email HTML with embedded reference image if available
-                            ref_img = a.get("reference_image")
+                            ref_img = image_store.data_url(a.get("reference_image_id")) or a.get("reference_image")
                             start_url = f"{os.environ.get('APP_BASE_URL', 'http://localhost:8000').rstrip('/')}/assigned_quiz.html?assignment_id={str(a.get('_id'))}"
                             msg = MIMEMultipart('alternative')
                             msg['Subject'] = f"OACA – Quiz started by {display_name}"
@@ -746,9 +821,8 @@ def get_assignment_questions():
                             return False
 
                     try:
-                        # call helper with the ObjectId value
-                        from bson import ObjectId
-                        _notify_admins_on_quiz_start(assignment["_id"])
+                        # call helper with the assignment already loaded above
+                        _notify_admins_on_quiz_start(assignment)
                     except Exception:
                         pass
                 except Exception:
@@ -829,7 +903,7 @@ def submit_score():
                 # ignore malformed answers; proceed with basic score update
                 detailed = []
                 per_section = {}
-            db[ASSIGNMENTS_COLLECTION].update_one(
+            _update_assignment(
                 {"_id": ObjectId(assignment_id)},
                 {"$set": {
                     "finished_at": now,
@@ -841,8 +915,10 @@ def submit_score():
                     "per_section": per_section if per_section else None,
                     "percentage_score": percentage_score,
                     "passed": percentage_score > 70,
+                    "airport": user_profiles.airport(claims.get("email")),
                 }}
             )
+            end_proctoring_session(assignment_id)
             
             # Send success email if candidate passed (score > 70%)
             if percentage_score > 70 and per_section:
@@ -912,7 +988,7 @@ def assignment_status():
             if remaining == 0:
                 # finalize if not already
                 try:
-                    db[ASSIGNMENTS_COLLECTION].update_one(
+                    _update_assignment(
                         {"_id": a["_id"]},
                         {"$set": {
                             "finished_at": now,
@@ -920,6 +996,7 @@ def assignment_status():
                         }}
                     )
                     finished_at = now
+                    end_proctoring_session(assignment_id)
                 except Exception:
                     pass
         return jsonify({
@@ -935,6 +1012,12 @@ def assignment_status():
         return jsonify({"error": "Bad request"}), 400
 
 
+SCORE_PROFILES = {
+    "summary": {"email": 1, "category": 1, "attempted": 1, "correct": 1, "total_with_keys": 1, "created_at": 1},
+    "detail": {},
+}
+
+
 @scores_bp.route("/api/scores", methods=["GET"])  # admin lists scores
 def list_scores():
     claims = _current_user_claims()
@@ -942,8 +1025,18 @@ def list_scores():
         return jsonify({"error": "Unauthorized"}), 401
     if claims.get("role") != "admin":
         return jsonify({"error": "Forbidden"}), 403
-    cursor = get_db()[SCORES_COLLECTION].find({}, {"_id": 0}).sort("created_at", -1)
-    return jsonify(list(cursor))
+    try:
+        limit, cursor, projection = page_args(SCORE_PROFILES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query: Dict[str, Any] = {"email": request.args["email"].strip().lower()} if request.args.get("email") else {}
+    coll = get_db()[SCORES_COLLECTION]
+    docs, next_cursor = find_page(coll, query, projection, limit, cursor, index_prefix=("email",) if query else ())
+    for d in docs:
+        d.pop("_id", None)
+    if limit is None:
+        return jsonify(docs)
+    return jsonify(page_response(docs, next_cursor, page_total(coll, query)))
 
 
 @scores_bp.route("/api/log-violation", methods=["POST"])  # log seat detection violations
@@ -961,7 +1054,7 @@ def log_violation():
     if not assignment_id:
         return jsonify({"error": "assignment_id required"}), 400
     
-    # Store violation log
+    # Store violation log; the image goes to the blob store, the log keeps its key
     violation_doc = {
         "email": claims.get("email"),
         "assignment_id": assignment_id,
@@ -969,50 +1062,42 @@ def log_violation():
         "message": message,
         "timestamp": datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00')) if timestamp else datetime.datetime.utcnow(),
         "created_at": datetime.datetime.utcnow(),
-        "captured_image": captured_image if captured_image else None,
+        "image_id": None,
     }
     
-    # Try to update assignment with violation count and mark as terminated
+    # Repeats of non-critical violations are merged and written in batches
+    if not is_critical_violation(violation_type):
+        violation_buffer.add(violation_doc, captured_image)
+        return jsonify({"ok": True})
+    
+    # Critical violations terminate the quiz and are written now, after anything still buffered
+    store_violation_image(violation_doc, captured_image)
     try:
         from bson import ObjectId
-        db = get_db()
-        
-        # Check if this is a critical violation that should terminate the quiz
-        critical_violations = ['no_face_detected', 'multiple_faces', 'face_mismatch', 'seat_movement', 'NO_FACE', 'MULTIPLE_FACES', 'FACE_MISMATCH', 'DISTANCE_CHANGE']
-        # NO_FACE is always critical now (both with and without movement)
-        is_critical = violation_type in critical_violations
-        
-        update_data = {
-            "$inc": {"violations": 1}, 
-            "$push": {"violation_log": violation_doc}
-        }
+        violation_buffer.flush(assignment_id)
         
-        if is_critical:
-            # Mark assignment as terminated
-            update_data["$set"] = {
-                "terminated": True,
-                "termination_reason": violation_type,
-                "termination_message": message,
-                "terminated_at": datetime.datetime.utcnow(),
-                "finished_at": datetime.datetime.utcnow()  # treat terminated as finished for reporting
-            }
-        
-        db[ASSIGNMENTS_COLLECTION].update_one(
+        _update_assignment(
             {"_id": ObjectId(assignment_id)},
-            update_data
+            {
+                "$inc": {"violations": 1},
+                "$push": {"violation_log": violation_doc},
+                # Mark assignment as terminated
+                "$set": {
+                    "terminated": True,
+                    "termination_reason": violation_type,
+                    "termination_message": message,
+                    "terminated_at": datetime.datetime.utcnow(),
+                    "finished_at": datetime.datetime.utcnow()  # treat terminated as finished for reporting
+                }
+            }
         )
+        end_proctoring_session(assignment_id)
     except Exception:
         pass
     
     return jsonify({"ok": True})
 
 
-# Global variables for face tracking (per assignment)
-reference_faces = {}  # assignment_id -> reference_face
-last_face_times = {}  # assignment_id -> timestamp
-face_positions = {}   # assignment_id -> list of positions
-multiple_face_start_times = {}  # assignment_id -> when multiple faces first detected
-
 @scores_bp.route("/api/check-face-setup", methods=["POST"])  # check if face setup is complete
 def check_face_setup():
     """Check if reference face has been set up for this assignment"""
@@ -1026,8 +1111,8 @@ def check_face_setup():
     if not assignment_id:
         return jsonify({"error": "assignment_id required"}), 400
     
-    # Check if reference face exists for this assignment
-    face_setup_complete = assignment_id in reference_faces and reference_faces[assignment_id] is not None
+    # Check if reference face exists for this assignment (persisted, so any worker can answer)
+    face_setup_complete = reference_store.get(assignment_id) is not None
     
     return jsonify({
         "face_setup_complete": face_setup_complete,
@@ -1054,85 +1139,47 @@ def setup_reference():
     
     try:
         import base64
-        import cv2
-        import numpy as np
         import time
         
-        print("OpenCV imported successfully")
-        
         # Decode base64 image
         if ',' in image_data:
             image_data = image_data.split(',')[1]
         image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
-        if img is None:
+        # Detect the face and validate its size and lighting
+        prepared = prepare_reference(image_bytes)
+        if prepared is None:
             print("Failed to decode image")
             return jsonify({"error": "Invalid image"}), 400
+        if prepared.get("error"):
+            print(f"Reference face rejected: {prepared['error']}")
+            return jsonify({'success': False, 'error': prepared["error"]})
         
-        print(f"Image decoded successfully: {img.shape}")
-        
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Load OpenCV's pre-trained face detection model
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        if face_cascade.empty():
-            print("Failed to load face cascade classifier")
-            return jsonify({'success': False, 'error': 'Face detection model not available'})
-        
-        print("Face cascade loaded successfully")
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 3)
-        print(f"Detected {len(faces)} faces")
-        
-        if len(faces) == 0:
-            print("No faces detected")
-            return jsonify({'success': False, 'error': 'No face detected. Please ensure your face is clearly visible in the camera.'})
-        
-        if len(faces) > 1:
-            print(f"Multiple faces detected: {len(faces)}")
-            return jsonify({'success': False, 'error': f'Multiple faces detected ({len(faces)}). Please ensure only your face is visible.'})
-        
-        # Store reference face region with enhanced validation
-        x, y, w, h = faces[0]
-        reference_face = gray[y:y+h, x:x+w]
+        reference_face = prepared["face"]
+        face_ratio = prepared["face_ratio"]
+        mean_brightness = prepared["brightness"]
         print(f"Reference face stored: {reference_face.shape}")
         
-        # Validate face quality
-        face_area = w * h
-        total_area = img.shape[0] * img.shape[1]
-        face_ratio = face_area / total_area
-        
-        if face_ratio < 0.05:  # Face too small
-            return jsonify({'success': False, 'error': 'Face too small. Please move closer to the camera.'})
-        elif face_ratio > 0.3:  # Face too large
-            return jsonify({'success': False, 'error': 'Face too large. Please move away from the camera.'})
-        
-        # Check face brightness/contrast
-        mean_brightness = np.mean(reference_face)
-        if mean_brightness < 50:  # Too dark
-            return jsonify({'success': False, 'error': 'Face too dark. Please improve lighting.'})
-        elif mean_brightness > 200:  # Too bright
-            return jsonify({'success': False, 'error': 'Face too bright. Please adjust lighting.'})
-        
         # Initialize tracking variables for this assignment
         if assignment_id:
-            reference_faces[assignment_id] = reference_face
-            last_face_times[assignment_id] = time.time()
-            face_positions[assignment_id] = []
+            session = ProctoringSession(assignment_id)
+            # Identity-check features are computed once here, not on every frame
+            session.reference = ReferenceDescriptor.from_face(reference_face)
+            session.last_face_time = time.time()
+            session_store.save(session)
+            try:
+                reference_store.save(assignment_id, reference_face, session.reference)
+            except Exception as e:
+                print(f"Failed to persist reference face: {e}")
             print(f"Reference face captured and tracking initialized for assignment: {assignment_id}")
             print(f"Face quality - Ratio: {face_ratio:.3f}, Brightness: {mean_brightness:.1f}")
-            # Persist original captured image (base64 data URL) to assignment for later reference/email
+            # Persist original captured image to the blob store for later reference/email
             try:
                 from bson import ObjectId
                 db = get_db()
                 db[ASSIGNMENTS_COLLECTION].update_one(
                     {"_id": ObjectId(assignment_id)},
-                    {"$set": {"reference_image": image_data}}
+                    {"$set": {"reference_image_id": image_store.put(image_bytes)}}
                 )
             except Exception:
                 pass
@@ -1155,267 +1202,34 @@ def check_frame():
     if not claims:
         return jsonify({"error": "Unauthorized"}), 401
     
-    body: Dict[str, Any] = request.get_json(silent=True) or {}
-    image_data = body.get("image")
-    assignment_id = body.get("assignment_id")
-    
-    if not image_data:
-        return jsonify({"error": "image required"}), 400
+    if request.mimetype.startswith("image/"):
+        # Binary upload: JPEG bytes in the body, assignment in the query string
+        image_data = None
+        image_bytes = request.get_data()
+        assignment_id = request.args.get("assignment_id")
+        if not image_bytes:
+            return jsonify({"error": "image required"}), 400
+    else:
+        body: Dict[str, Any] = request.get_json(silent=True) or {}
+        image_data = body.get("image")
+        assignment_id = body.get("assignment_id")
+        
+        if not image_data:
+            return jsonify({"error": "image required"}), 400
     
     try:
         import base64
-        import cv2
-        import numpy as np
-        import time
-        from datetime import datetime
-        from bson import ObjectId
         
         # Decode base64 image
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if image_data:
+            if ',' in image_data:
+                image_data = image_data.split(',')[1]
+            image_bytes = base64.b64decode(image_data)
         
-        if img is None:
+        result = handle_frame(assignment_id, image_bytes)
+        if result is None:
             return jsonify({"error": "Invalid image"}), 400
-        
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Load OpenCV's pre-trained face detection model
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 3)
-        face_count = len(faces)
-        
-        alerts = []
-        current_time = time.time()
-        
-        # Initialize tracking variables for this assignment
-        if assignment_id not in reference_faces:
-            reference_faces[assignment_id] = None
-            last_face_times[assignment_id] = None
-            face_positions[assignment_id] = []
-
-        # Attempts are now counted immediately when quiz starts in the questions endpoint
-        
-        # Check 1: No face detected - wait 15 seconds before rejecting (more lenient)
-        if face_count == 0:
-            if last_face_times[assignment_id] and (current_time - last_face_times[assignment_id]) > 15:
-                # Check if movement was detected before no face
-                movement_key = f"{assignment_id}_movement"
-                if movement_key in multiple_face_start_times:
-                    # Movement + no face for 15s = REJECT (potential cheating)
-                    alert = {
-                        'type': 'NO_FACE',
-                        'message': 'No face detected for more than 15 seconds after movement - rejecting',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'critical'
-                    }
-                    alerts.append(alert)
-                else:
-                    # Just no face without movement - wait 15 seconds then reject
-                    alert = {
-                        'type': 'NO_FACE',
-                        'message': 'No face detected for more than 15 seconds - rejecting',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'critical'
-                    }
-                    alerts.append(alert)
-        else:
-            last_face_times[assignment_id] = current_time
-            
-            # Reset movement timer when face is detected again
-            movement_key = f"{assignment_id}_movement"
-            if movement_key in multiple_face_start_times:
-                del multiple_face_start_times[movement_key]
-            
-            # Check 2: Multiple faces - wait 10 seconds before rejection
-            if face_count > 1:
-                # Check if multiple faces detected for more than 10 seconds
-                if assignment_id not in multiple_face_start_times:
-                    multiple_face_start_times[assignment_id] = current_time
-                elif (current_time - multiple_face_start_times[assignment_id]) > 10:
-                    alert = {
-                        'type': 'MULTIPLE_FACES',
-                        'message': f'{face_count} faces detected for more than 10 seconds - rejecting',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'critical'
-                    }
-                    alerts.append(alert)
-            else:
-                # Reset multiple face timer if only one face detected
-                if assignment_id in multiple_face_start_times:
-                    del multiple_face_start_times[assignment_id]
-            
-            # Check 3: Face position change (standing up detection)
-            x, y, w, h = faces[0]
-            face_center_y = y + h/2
-            img_height = img.shape[0]
-            face_position_ratio = face_center_y / img_height
-            
-            face_positions[assignment_id].append(face_position_ratio)
-            if len(face_positions[assignment_id]) > 30:  # Keep last 30 frames
-                face_positions[assignment_id].pop(0)
-            
-            if len(face_positions[assignment_id]) >= 10:
-                avg_position = np.mean(face_positions[assignment_id][-10:])
-                if abs(face_position_ratio - avg_position) > 0.3:
-                    # Movement detected - just alert, don't reject yet
-                    alert = {
-                        'type': 'POSITION_CHANGE',
-                        'message': 'Significant position change detected - possible movement',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'low'
-                    }
-                    alerts.append(alert)
-                    
-                    # Start tracking movement + no face combination
-                    movement_key = f"{assignment_id}_movement"
-                    if movement_key not in multiple_face_start_times:
-                        multiple_face_start_times[movement_key] = current_time
-                else:
-                    # Reset movement timer if position is normal
-                    movement_key = f"{assignment_id}_movement"
-                    if movement_key in multiple_face_start_times:
-                        del multiple_face_start_times[movement_key]
-            
-            # Check 4: Face size change (moving away/closer)
-            face_size_ratio = (w * h) / (img.shape[0] * img.shape[1])
-            if face_size_ratio < 0.02:  # Face too small - moved away
-                # Check if distance change detected for more than 10 seconds
-                distance_key = f"{assignment_id}_distance_small"
-                if distance_key not in multiple_face_start_times:
-                    multiple_face_start_times[distance_key] = current_time
-                elif (current_time - multiple_face_start_times[distance_key]) > 10:
-                    alert = {
-                        'type': 'DISTANCE_CHANGE',
-                        'message': 'Student moved too far from camera for more than 10 seconds',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'medium'
-                    }
-                    alerts.append(alert)
-            elif face_size_ratio > 0.15:  # Face too large - too close
-                # Check if distance change detected for more than 10 seconds
-                distance_key = f"{assignment_id}_distance_large"
-                if distance_key not in multiple_face_start_times:
-                    multiple_face_start_times[distance_key] = current_time
-                elif (current_time - multiple_face_start_times[distance_key]) > 10:
-                    alert = {
-                        'type': 'DISTANCE_CHANGE',
-                        'message': 'Student moved too close to camera for more than 10 seconds',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'low'
-                    }
-                    alerts.append(alert)
-            else:
-                # Reset distance change timers if face size is normal
-                distance_key_small = f"{assignment_id}_distance_small"
-                distance_key_large = f"{assignment_id}_distance_large"
-                if distance_key_small in multiple_face_start_times:
-                    del multiple_face_start_times[distance_key_small]
-                if distance_key_large in multiple_face_start_times:
-                    del multiple_face_start_times[distance_key_large]
-            
-            # Check 5: Face comparison (person switching) - Enhanced detection
-            if reference_faces[assignment_id] is not None:
-                current_face = gray[y:y+h, x:x+w]
-                
-                # Resize to same size for comparison
-                try:
-                    current_face_resized = cv2.resize(current_face, (reference_faces[assignment_id].shape[1], reference_faces[assignment_id].shape[0]))
-                    
-                    # Multiple similarity checks for better accuracy
-                    # 1. Histogram comparison
-                    hist_ref = cv2.calcHist([reference_faces[assignment_id]], [0], None, [256], [0, 256])
-                    hist_cur = cv2.calcHist([current_face_resized], [0], None, [256], [0, 256])
-                    hist_similarity = cv2.compareHist(hist_ref, hist_cur, cv2.HISTCMP_CORREL)
-                    
-                    # 2. Template matching
-                    result = cv2.matchTemplate(current_face_resized, reference_faces[assignment_id], cv2.TM_CCOEFF_NORMED)
-                    template_similarity = np.max(result)
-                    
-                    # 3. Structural similarity (SSIM-like)
-                    # Resize both to same small size for structural comparison
-                    ref_small = cv2.resize(reference_faces[assignment_id], (64, 64))
-                    cur_small = cv2.resize(current_face_resized, (64, 64))
-                    
-                    # Calculate mean squared error
-                    mse = np.mean((ref_small.astype("float") - cur_small.astype("float")) ** 2)
-                    ssim_similarity = 1 - (mse / (255 ** 2))  # Normalize to 0-1
-                    
-                    # Combined similarity score (weighted average)
-                    combined_similarity = (hist_similarity * 0.4 + template_similarity * 0.4 + ssim_similarity * 0.2)
-                    
-                    print(f"Face similarity check - Hist: {hist_similarity:.3f}, Template: {template_similarity:.3f}, SSIM: {ssim_similarity:.3f}, Combined: {combined_similarity:.3f}")
-                    
-                    # More strict threshold for face matching - wait 10 seconds before rejection
-                    if combined_similarity < 0.7:  # Increased from 0.6 to 0.7 for stricter matching
-                        # Check if face mismatch detected for more than 10 seconds
-                        mismatch_key = f"{assignment_id}_mismatch"
-                        if mismatch_key not in multiple_face_start_times:
-                            multiple_face_start_times[mismatch_key] = current_time
-                        elif (current_time - multiple_face_start_times[mismatch_key]) > 10:
-                            alert = {
-                                'type': 'FACE_MISMATCH',
-                                'message': f'Different person detected (similarity: {combined_similarity:.2f}) for more than 10 seconds - rejecting',
-                                'timestamp': datetime.now().isoformat(),
-                                'severity': 'critical'
-                            }
-                            alerts.append(alert)
-                            
-                            # Log the violation
-                            print(f"FACE MISMATCH DETECTED: Similarity {combined_similarity:.3f} below threshold 0.7 - REJECTING USER")
-                    else:
-                        # Reset face mismatch timer if face matches
-                        mismatch_key = f"{assignment_id}_mismatch"
-                        if mismatch_key in multiple_face_start_times:
-                            del multiple_face_start_times[mismatch_key]
-                        
-                except Exception as e:
-                    print(f"Face comparison error: {e}")
-                    # If comparison fails, assume potential mismatch
-                    alert = {
-                        'type': 'FACE_MISMATCH',
-                        'message': 'Face comparison failed - possible person switch',
-                        'timestamp': datetime.now().isoformat(),
-                        'severity': 'critical'
-                    }
-                    alerts.append(alert)
-            else:
-                # Set reference face on first detection
-                reference_faces[assignment_id] = gray[y:y+h, x:x+w]
-                print(f"Reference face set for assignment {assignment_id}")
-            
-            # Check 6: Eye detection within face region
-            roi_gray = gray[y:y+h, x:x+w]
-            eyes = eye_cascade.detectMultiScale(roi_gray)
-            
-            if len(eyes) == 0:
-                alert = {
-                    'type': 'NO_EYES',
-                    'message': 'Eyes not detected - face may be obscured',
-                    'timestamp': datetime.now().isoformat(),
-                    'severity': 'medium'
-                }
-                alerts.append(alert)
-            elif len(eyes) > 2:
-                alert = {
-                    'type': 'MULTIPLE_EYES',
-                    'message': 'Multiple eye pairs detected - possible cheating',
-                    'timestamp': datetime.now().isoformat(),
-                    'severity': 'high'
-                }
-                alerts.append(alert)
-        
-        return jsonify({
-            'success': True,
-            'faces_detected': face_count,
-            'alerts': alerts
-        })
+        return jsonify(result)
         
     except ImportError:
         # OpenCV not available, return basic response
@@ -1428,9 +1242,134 @@ def check_frame():
         return jsonify({"error": str(e)}), 500
 
 
+@scores_bp.route("/api/proctoring/heartbeat", methods=["POST"])  # pre-screened tick without a frame
+def proctoring_heartbeat():
+    """Browser pre-screening saw nothing new: acknowledge, maybe request an audit frame"""
+    claims = _current_user_claims()
+    if not claims:
+        return jsonify({"error": "Unauthorized"}), 401
+    if not prescreen.enabled:
+        return jsonify({"error": "Pre-screening disabled"}), 400
+    
+    body: Dict[str, Any] = request.get_json(silent=True) or {}
+    assignment_id = body.get("assignment_id")
+    if not assignment_id:
+        return jsonify({"error": "assignment_id required"}), 400
+    try:
+        local_faces = int(body.get("faces"))
+    except (TypeError, ValueError):
+        local_faces = None
+    return jsonify(handle_heartbeat(assignment_id, local_faces))
+
+
+def proctoring_stream(ws):
+    """Stream proctoring frames over one WebSocket (/ws/proctoring?assignment_id=...).
+
+    The cookie is checked once, at the handshake. The client then sends raw
+    JPEG frames as binary messages and gets the same JSON reply as
+    /api/check-frame (plus a "type") for each one. Text messages carry
+    control commands: {"type": "ping"}, {"type": "close"}, or a pre-screening
+    {"type": "heartbeat", "faces": n}, answered like /api/proctoring/heartbeat.
+    """
+    claims = _current_user_claims()
+    if not claims:
+        ws.send(json.dumps({"type": "error", "error": "Unauthorized"}))
+        return
+
+    assignment_id = request.args.get("assignment_id")
+    try:
+        from bson import ObjectId
+        owned = get_db()[ASSIGNMENTS_COLLECTION].find_one(
+            {"_id": ObjectId(assignment_id), "email": claims.get("email")}, {"_id": 1}
+        )
+    except Exception:
+        owned = None
+    if not owned:
+        ws.send(json.dumps({"type": "error", "error": "Assignment not found"}))
+        return
+
+    ws.send(json.dumps({"type": "ready", "next_interval_ms": cadence.base_ms, "prescreen": prescreen.enabled}))
+    while True:
+        message = ws.receive(timeout=PROCTORING_STREAM_IDLE_TIMEOUT)
+        if message is None:
+            # Idle client: let it reconnect (or fall back to HTTP) later
+            break
+        if isinstance(message, str):
+            try:
+                command = json.loads(message)
+                kind = command.get("type")
+            except (ValueError, AttributeError):
+                kind = None
+            if kind == "ping":
+                ws.send(json.dumps({"type": "pong"}))
+            elif kind == "close":
+                break
+            elif kind == "heartbeat" and prescreen.enabled:
+                faces = command.get("faces")
+                reply = handle_heartbeat(assignment_id, faces if isinstance(faces, int) else None)
+                ws.send(json.dumps(dict(reply, type="heartbeat")))
+            continue
+
+        try:
+            result = handle_frame(assignment_id, message)
+        except ImportError:
+            # OpenCV not available, same basic reply as the HTTP endpoint
+            result = {'success': True, 'faces_detected': 1, 'alerts': []}
+        except Exception as e:
+            ws.send(json.dumps({"type": "error", "error": str(e)}))
+            continue
+        if result is None:
+            ws.send(json.dumps({"type": "error", "error": "Invalid image"}))
+            continue
+        ws.send(json.dumps(dict(result, type="skipped" if result.get("skipped") else "result")))
+
+
+if Sock is not None:
+    # Registered on the blueprint, so no app-level setup beyond the socket options
+    Sock().route("/ws/proctoring", bp=scores_bp)(proctoring_stream)
+    scores_bp.record_once(lambda state: state.app.config.setdefault(
+        "SOCK_SERVER_OPTIONS", {"ping_interval": 25, "max_message_size": PROCTORING_STREAM_MAX_FRAME}
+    ))
+
+
+@scores_bp.route("/api/proctoring/metrics", methods=["GET"])  # frame analysis pool metrics (admin)
+def get_proctoring_metrics():
+    """Queue depth, analysis time, shed frame, motion gate and per-detector CPU counters"""
+    claims = _current_user_claims()
+    if not claims:
+        return jsonify({"error": "Unauthorized"}), 401
+    if claims.get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify({
+        "analysis_pool": analysis_pool.metrics(),
+        "motion_gate": motion_gate.metrics(),
+        "check_scheduler": check_scheduler.metrics(),
+        "cadence": cadence.metrics(),
+        "prescreen": prescreen.metrics(),
+        "violation_writes": violation_buffer.metrics(),
+        "stats_cache": stats_cache.metrics(),
+        "user_profiles": user_profiles.metrics(),
+        "active_sessions": len(session_store),
+    })
+
+
+def _parse_report_date(value: str) -> datetime.datetime:
+    """ISO date or datetime from a query string, as naive UTC like the stored dates."""
+    dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt
+
+
 @scores_bp.route("/api/violation-reports", methods=["GET"])  # get violation reports for dashboard
 def get_violation_reports():
-    """Get violation reports for admin dashboard"""
+    """Get violation reports for admin dashboard
+
+    Optional query parameters: since/until (ISO dates on created_at, until
+    exclusive), type (violation type or termination reason), airport, and
+    limit/cursor for pagination. next_cursor is returned while more reports
+    remain; without limit every matching report is returned.
+    """
     claims = _current_user_claims()
     if not claims:
         return jsonify({"error": "Unauthorized"}), 401
@@ -1439,90 +1378,136 @@ def get_violation_reports():
     if claims.get("role") != "admin":
         return jsonify({"error": "Admin access required"}), 403
     
+    violation_type = request.args.get("type") or None
+    airport = request.args.get("airport") or None
+    cursor = request.args.get("cursor") or None
+    try:
+        since = _parse_report_date(request.args["since"]) if request.args.get("since") else None
+        until = _parse_report_date(request.args["until"]) if request.args.get("until") else None
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+        cursor_match = keyset_match(cursor) if cursor else None
+    except Exception:
+        return jsonify({"error": "Invalid since, until, limit or cursor"}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "limit must be positive"}), 400
+    
     try:
         db = get_db()
         
-        # Get all assignments with violations or terminated
-        assignments = list(db[ASSIGNMENTS_COLLECTION].find(
-            {"$or": [
-                {"violations": {"$gt": 0}},
-                {"terminated": True}
-            ]},
-            {"violation_log": 1, "email": 1, "created_at": 1, "finished_at": 1, "violations": 1, "terminated": 1, "termination_reason": 1, "termination_message": 1, "terminated_at": 1}
-        ).sort("created_at", -1))
+        # Assignments with violations or terminated
+        match: List[Dict[str, Any]] = [{"$or": [
+            {"violations": {"$gt": 0}},
+            {"terminated": True}
+        ]}]
+        if since or until:
+            created: Dict[str, Any] = {}
+            if since:
+                created["$gte"] = since
+            if until:
+                created["$lt"] = until
+            match.append({"created_at": created})
+        if violation_type:
+            match.append({"$or": [
+                {"violation_log.type": violation_type},
+                {"termination_reason": violation_type}
+            ]})
+        if airport:
+            match.append({"airport": airport})
+        if cursor_match:
+            match.append(cursor_match)
+        
+        # Project violation metadata only: images never leave the database
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"$and": match}},
+            {"$sort": {"created_at": -1, "_id": -1}},
+        ]
+        if limit is not None:
+            pipeline.append({"$limit": limit + 1})
+        pipeline.append({"$project": {
+            "email": 1, "created_at": 1, "finished_at": 1, "violations": 1, "terminated": 1,
+            "termination_reason": 1, "termination_message": 1, "terminated_at": 1,
+            "violation_log": {"$map": {
+                "input": {"$ifNull": ["$violation_log", []]},
+                "as": "v",
+                "in": {
+                    "assignment_id": "$$v.assignment_id",
+                    "type": "$$v.type",
+                    "message": "$$v.message",
+                    "timestamp": "$$v.timestamp",
+                    "count": "$$v.count",
+                    "has_image": {"$or": [
+                        {"$ne": [{"$ifNull": ["$$v.image_id", ""]}, ""]},
+                        {"$ne": [{"$ifNull": ["$$v.captured_image", ""]}, ""]}
+                    ]}
+                }
+            }}
+        }})
+        assignments = list(db[ASSIGNMENTS_COLLECTION].aggregate(pipeline))
+        
+        next_cursor = None
+        if limit is not None and len(assignments) > limit:
+            assignments = assignments[:limit]
+            next_cursor = keyset_cursor(assignments[-1])
         
         reports = []
         for assignment in assignments:
-            violation_log = assignment.get("violation_log", [])
+            violation_log = assignment.get("violation_log") or []
             is_terminated = assignment.get("terminated", False)
+            assignment_id_str = str(assignment["_id"])
             
-            # Include terminated assignments even without violation log
-            if violation_log or is_terminated:
-                # Group violations by assignment
-                assignment_report = {
-                    "assignment_id": str(assignment["_id"]),
-                    "email": assignment.get("email"),
-                    "created_at": assignment.get("created_at"),
-                    "finished_at": assignment.get("finished_at"),
-                    "terminated": is_terminated,
-                    "termination_reason": assignment.get("termination_reason"),
-                    "termination_message": assignment.get("termination_message"),
-                    "terminated_at": assignment.get("terminated_at"),
-                    "total_violations": assignment.get("violations", 0),
-                    "violations": []
-                }
-                
-                assignment_id_str = str(assignment["_id"])
-                
-                for violation in violation_log:
-                    # Use assignment_id from violation if available, otherwise use parent assignment_id
-                    violation_assignment_id = violation.get("assignment_id") or assignment_id_str
-                    violation_info = {
-                        "assignment_id": violation_assignment_id,  # Link violation to specific quiz/test
-                        "type": violation.get("type"),
-                        "message": violation.get("message"),
-                        "timestamp": violation.get("timestamp"),
-                        "has_image": bool(violation.get("captured_image"))
-                    }
-                    assignment_report["violations"].append(violation_info)
-                
-                # Add synthetic violation for terminated assignments without violation log
-                if is_terminated and not violation_log:
-                    synthetic_violation = {
-                        "assignment_id": assignment_id_str,  # Link violation to specific quiz/test
-                        "type": assignment.get("termination_reason", "UNKNOWN_VIOLATION"),
-                        "message": assignment.get("termination_message", "Quiz terminated due to violation"),
-                        "timestamp": assignment.get("terminated_at", assignment.get("created_at")),
-                        "has_image": False
-                    }
-                    assignment_report["violations"].append(synthetic_violation)
-                
-                reports.append(assignment_report)
+            violations = []
+            for index, violation in enumerate(violation_log):
+                if violation_type and violation.get("type") != violation_type:
+                    continue
+                # Use assignment_id from violation if available, otherwise use parent assignment_id
+                violations.append({
+                    "assignment_id": violation.get("assignment_id") or assignment_id_str,  # Link violation to specific quiz/test
+                    "index": index,  # Position in violation_log, for /api/violation-image
+                    "type": violation.get("type"),
+                    "message": violation.get("message"),
+                    "timestamp": violation.get("timestamp"),
+                    "count": violation.get("count") or 1,  # repeats merged into this entry
+                    "has_image": bool(violation.get("has_image"))
+                })
+            
+            # Add synthetic violation for terminated assignments without violation log
+            if is_terminated and not violations:
+                violations.append({
+                    "assignment_id": assignment_id_str,  # Link violation to specific quiz/test
+                    "type": assignment.get("termination_reason", "UNKNOWN_VIOLATION"),
+                    "message": assignment.get("termination_message", "Quiz terminated due to violation"),
+                    "timestamp": assignment.get("terminated_at", assignment.get("created_at")),
+                    "has_image": False
+                })
+            
+            reports.append({
+                "assignment_id": assignment_id_str,
+                "email": assignment.get("email"),
+                "created_at": assignment.get("created_at"),
+                "finished_at": assignment.get("finished_at"),
+                "terminated": is_terminated,
+                "termination_reason": assignment.get("termination_reason"),
+                "termination_message": assignment.get("termination_message"),
+                "terminated_at": assignment.get("terminated_at"),
+                "total_violations": assignment.get("violations", 0),
+                "violations": violations
+            })
         
-        return jsonify({"reports": reports})
+        return jsonify({"reports": reports, "next_cursor": next_cursor})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @scores_bp.route("/api/stats/success-rate", methods=["GET"])  # get overall success rate (public)
+@stats_cache.cached("success-rate", ttl=60)
 def get_success_rate():
     """Calculate success rate as percentage of users who passed (score > 70%) - Public endpoint"""
     try:
-        db = get_db()
-        
-        # Count total users who completed the quiz (have a finished assignment)
-        total_completed = db[ASSIGNMENTS_COLLECTION].count_documents({
-            "finished_at": {"$ne": None},
-            "terminated": {"$ne": True}  # Don't count terminated assignments
-        })
-        
-        # Count users who passed (score > 70%)
-        passed = db[ASSIGNMENTS_COLLECTION].count_documents({
-            "finished_at": {"$ne": None},
-            "terminated": {"$ne": True},
-            "passed": True
-        })
+        # Completed = finished and not terminated; counters are maintained on write
+        stats = platform_stats.read()
+        total_completed = stats.get("completed", 0)
+        passed = stats.get("passed", 0)
         
         success_rate = (passed / total_completed * 100) if total_completed > 0 else 0
         
@@ -1537,38 +1522,20 @@ def get_success_rate():
 
 
 @scores_bp.route("/api/stats/dashboard", methods=["GET"])  # get dashboard stats (public)
+@stats_cache.cached("dashboard", ttl=60)
 def get_dashboard_stats():
     """Get dashboard statistics including total users registered, tests passed, and best score - Public endpoint"""
     try:
-        db = get_db()
-        
-        # Count total users registered (all users, not just last month)
-        total_users = db[USERS_COLLECTION].count_documents({})
-        
-        # Count tests passed (assignments that were finished successfully with passed=True)
-        tests_passed = db[ASSIGNMENTS_COLLECTION].count_documents({
-            "finished_at": {"$ne": None},
-            "terminated": {"$ne": True},
-            "passed": True
-        })
-        
-        # Get best score rate (highest percentage_score)
-        best_assignment = db[ASSIGNMENTS_COLLECTION].find_one(
-            {
-                "finished_at": {"$ne": None},
-                "terminated": {"$ne": True},
-                "percentage_score": {"$ne": None}
-            },
-            sort=[("percentage_score", -1)]
-        )
+        stats = platform_stats.read()
         
+        # Best score rate is the highest percentage_score of a completed assignment
         best_score_rate = 0
-        if best_assignment and best_assignment.get("percentage_score") is not None:
-            best_score_rate = round(float(best_assignment.get("percentage_score")), 1)
+        if stats.get("best_score") is not None:
+            best_score_rate = round(float(stats["best_score"]), 1)
         
         return jsonify({
-            "total_users": total_users,
-            "tests_passed": tests_passed,
+            "total_users": stats.get("total_users", 0),
+            "tests_passed": stats.get("passed", 0),
             "best_score_rate": best_score_rate
         })
     except Exception as e:
@@ -1576,6 +1543,7 @@ def get_dashboard_stats():
 
 
 @scores_bp.route("/api/stats/top-scores", methods=["GET"])  # get top 5 best scores (public)
+@stats_cache.cached("top-scores", ttl=120)
 def get_top_scores():
     """Get top 5 best scores from all users - Public endpoint"""
     try:
@@ -1597,18 +1565,15 @@ def get_top_scores():
             }
         ).sort("percentage_score", -1).limit(5))
         
+        # Resolve every display name in one lookup
+        names = user_profiles.display_names(a.get("email") for a in top_assignments)
+        
         top_scores = []
         for assignment in top_assignments:
             email = assignment.get("email", "Unknown")
-            # Get user display name if available
-            user = db[USERS_COLLECTION].find_one({"email": email}, {"display_name": 1, "username": 1})
-            display_name = None
-            if user:
-                display_name = user.get("display_name") or user.get("username")
-            
             top_scores.append({
                 "email": email,
-                "display_name": display_name or email.split("@")[0],
+                "display_name": names.get(email) or email.split("@")[0],
                 "percentage_score": round(float(assignment.get("percentage_score", 0)), 1),
                 "score": assignment.get("score", 0),
                 "total": assignment.get("total_with_keys", 0),
@@ -1621,59 +1586,19 @@ def get_top_scores():
 
 
 @scores_bp.route("/api/stats/most-asked", methods=["GET"])  # get most asked questions and sections (public)
+@stats_cache.cached("most-asked", ttl=300)
 def get_most_asked():
     """Get most asked questions and sections - Public endpoint"""
     try:
-        db = get_db()
-        
-        # Get all finished assignments with selected questions
-        assignments = list(db[ASSIGNMENTS_COLLECTION].find(
-            {
-                "finished_at": {"$ne": None},
-                "selected": {"$exists": True, "$ne": None}
-            },
-            {"selected": 1}
-        ))
-        
-        # Count question occurrences
-        question_counts = {}  # {(section, question_id): count}
-        section_counts = {}  # {section: count}
-        
-        for assignment in assignments:
-            selected = assignment.get("selected", [])
-            if not selected:
-                continue
-            
-            for item in selected:
-                section = item.get("section")
-                question_id = item.get("id")
-                
-                if section and question_id is not None:
-                    # Count question
-                    key = (str(section), int(question_id))
-                    question_counts[key] = question_counts.get(key, 0) + 1
-                    
-                    # Count section
-                    section_counts[str(section)] = section_counts.get(str(section), 0) + 1
-        
-        # Get top 5 most asked questions
-        top_questions = sorted(question_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        most_asked_questions = []
-        for (section, qid), count in top_questions:
-            most_asked_questions.append({
-                "section": section,
-                "question_id": qid,
-                "count": count
-            })
-        
-        # Get top 5 most asked sections
-        top_sections = sorted(section_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        most_asked_sections = []
-        for section, count in top_sections:
-            most_asked_sections.append({
-                "section": section,
-                "count": count
-            })
+        # Counters are incremented as assignments finish; see stats.QuestionUsage
+        most_asked_questions = [
+            {"section": row.get("section"), "question_id": row.get("question_id"), "count": row.get("count", 0)}
+            for row in question_usage.top("question", 5)
+        ]
+        most_asked_sections = [
+            {"section": row.get("section"), "count": row.get("count", 0)}
+            for row in question_usage.top("section", 5)
+        ]
         
         return jsonify({
             "most_asked_questions": most_asked_questions,
@@ -1695,83 +1620,157 @@ def get_airport_report():
 
     airport = request.args.get("airport") or ""
     try:
-        db = get_db()
-        # Find users assigned to the airport
-        users_cursor = db[USERS_COLLECTION].find({"airport": airport}, {"email": 1})
-        emails = [u.get("email") for u in users_cursor if u.get("email")]
+        return jsonify(_airport_reports([airport])[0])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # If no users found, still return zeros
-        if not emails:
-            # Return empty metrics with count of users = 0
-            return jsonify({
-                "airport": airport,
-                "total_users": 0,
-                "total_completed": 0,
-                "avg_percentage_score": None,
-                "avg_score": None,
-                "avg_attempts_used": None,
-                "pass_rate": None
-            })
 
-        # Query finished, non-terminated assignments for these users
-        cursor = db[ASSIGNMENTS_COLLECTION].find({
-            "email": {"$in": emails},
-            "finished_at": {"$ne": None},
-            "terminated": {"$ne": True}
-        }, {"percentage_score": 1, "score": 1, "attempted": 1})
-
-        total_completed = 0
-        sum_percentage = 0.0
-        sum_score = 0.0
-        sum_attempted = 0
-        passed_count = 0
-        for a in cursor:
-            total_completed += 1
-            pct = a.get("percentage_score")
-            if pct is not None:
-                try:
-                    sum_percentage += float(pct)
-                except Exception:
-                    pass
-            sc = a.get("score")
-            if isinstance(sc, (int, float)):
-                sum_score += float(sc)
-            att = a.get("attempted")
-            if isinstance(att, int):
-                sum_attempted += att
-            # determine pass by percentage if present
-            if pct is not None:
-                try:
-                    if float(pct) > 70:
-                        passed_count += 1
-                except Exception:
-                    pass
+@scores_bp.route("/api/stats/airport-reports", methods=["GET"])  # airport reports for every airport (admin)
+def get_airport_reports():
+    """Return the airport report of every Tunisian airport in one call"""
+    claims = _current_user_claims()
+    if not claims:
+        return jsonify({"error": "Unauthorized"}), 401
+    if claims.get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    try:
+        return jsonify({"airports": _airport_reports(TUNISIA_AIRPORTS)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-        # Compute averages
-        avg_percentage = round(sum_percentage / total_completed, 2) if total_completed > 0 else None
-        avg_score = round(sum_score / total_completed, 2) if total_completed > 0 else None
-        avg_attempts = round(sum_attempted / total_completed, 2) if total_completed > 0 else None
-        pass_rate = round((passed_count / total_completed) * 100, 2) if total_completed > 0 else None
+@scores_bp.route("/api/stats/rollups", methods=["GET"])  # daily time series for the dashboard charts (admin)
+def get_stats_rollups():
+    """Daily created/started/finished/passed/terminated counts with average score and duration
 
-        # Also return number of registered users for airport (including those without completed assignments)
-        total_users = len(emails)
+    Query parameters: days (default 30, up to 366) or since/until (YYYY-MM-DD,
+    inclusive), and optional airport. Also returns all-time totals, per-section
+    accuracy over the range and user counts by role.
+    """
+    claims = _current_user_claims()
+    if not claims:
+        return jsonify({"error": "Unauthorized"}), 401
+    if claims.get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    try:
+        today = datetime.datetime.utcnow().date()
+        until = _parse_report_date(request.args["until"]).date() if request.args.get("until") else today
+        if request.args.get("since"):
+            since = _parse_report_date(request.args["since"]).date()
+        else:
+            since = until - datetime.timedelta(days=int(request.args.get("days") or 30) - 1)
+    except Exception:
+        return jsonify({"error": "Invalid days, since or until"}), 400
+    if since > until or (until - since).days >= 366:
+        return jsonify({"error": "Range must be between 1 and 366 days"}), 400
+
+    try:
+        result = daily_rollups.series(since.isoformat(), until.isoformat(), request.args.get("airport") or None)
+        roles = get_db()[USERS_COLLECTION].aggregate([{"$group": {"_id": "$role", "count": {"$sum": 1}}}])
+        result["users_by_role"] = {str(r["_id"] or "user"): r["count"] for r in roles}
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+
+@scores_bp.route("/api/stats/item-analysis", methods=["GET", "POST"])  # per-question difficulty and discrimination (admin)
+def get_item_analysis():
+    """Item analysis from the stored answers of finished assignments
+
+    GET query parameters: section, min_responses (default 1), sort
+    (discrimination, difficulty or responses) and limit. POST folds the
+    submissions finished since the last run into the statistics (full=1
+    recomputes everything).
+    """
+    claims = _current_user_claims()
+    if not claims:
+        return jsonify({"error": "Unauthorized"}), 401
+    if claims.get("role") != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    if request.method == "POST":
+        try:
+            return jsonify(dict(item_analysis.run(full=request.args.get("full") == "1"), ok=True))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    sort = request.args.get("sort") or "discrimination"
+    if sort not in ("discrimination", "difficulty", "responses"):
+        return jsonify({"error": "sort must be discrimination, difficulty or responses"}), 400
+    try:
+        min_responses = int(request.args.get("min_responses") or 1)
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+    except ValueError:
+        return jsonify({"error": "Invalid min_responses or limit"}), 400
+
+    try:
+        items = item_analysis.items(request.args.get("section") or None, min_responses)
+        # Weakest items first: lowest discrimination, hardest, or least answered
+        items.sort(key=lambda i: (i[sort] is None, i[sort] if i[sort] is not None else 0))
+        watermark = item_analysis.watermark()
         return jsonify({
-            "airport": airport,
-            "total_users": total_users,
-            "total_completed": total_completed,
-            "avg_percentage_score": avg_percentage,
-            "avg_score": avg_score,
-            "avg_attempts_used": avg_attempts,
-            "pass_rate": pass_rate,
+            "items": items[:limit] if limit else items,
+            "total": len(items),
+            "finished_through": watermark.isoformat() if watermark else None,
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _airport_reports(airports: List[str]) -> List[Dict[str, Any]]:
+    """Airport report metrics, one $group over assignments (airport is copied onto each assignment)."""
+    db = get_db()
+    completed = {
+        row["_id"]: row for row in db[ASSIGNMENTS_COLLECTION].aggregate([
+            {"$match": {
+                "airport": {"$in": airports},
+                "finished_at": {"$ne": None},
+                "terminated": {"$ne": True}
+            }},
+            {"$group": {
+                "_id": "$airport",
+                "total_completed": {"$sum": 1},
+                # $sum skips missing and non-numeric values, which count as 0 in the averages
+                "sum_percentage": {"$sum": "$percentage_score"},
+                "sum_score": {"$sum": "$score"},
+                "sum_attempted": {"$sum": "$attempted"},
+                "passed": {"$sum": {"$cond": [{"$gt": ["$percentage_score", 70]}, 1, 0]}},
+            }},
+        ])
+    }
+    users = {
+        row["_id"]: row["count"] for row in db[USERS_COLLECTION].aggregate([
+            {"$match": {"airport": {"$in": airports}}},
+            {"$group": {"_id": "$airport", "count": {"$sum": 1}}},
+        ])
+    }
+
+    reports = []
+    for airport in airports:
+        row = completed.get(airport) or {}
+        total_completed = row.get("total_completed", 0)
+        reports.append({
+            "airport": airport,
+            # Registered users for the airport (including those without completed assignments)
+            "total_users": users.get(airport, 0),
+            "total_completed": total_completed,
+            "avg_percentage_score": round(row["sum_percentage"] / total_completed, 2) if total_completed > 0 else None,
+            "avg_score": round(row["sum_score"] / total_completed, 2) if total_completed > 0 else None,
+            "avg_attempts_used": round(row["sum_attempted"] / total_completed, 2) if total_completed > 0 else None,
+            "pass_rate": round((row["passed"] / total_completed) * 100, 2) if total_completed > 0 else None,
+        })
+    return reports
+
+
 @scores_bp.route("/api/violation-image/<assignment_id>/<int:violation_index>", methods=["GET"])  # get violation image
 def get_violation_image(assignment_id, violation_index):
-    """Get captured image for a specific violation"""
+    """Stream the captured image for a specific violation as binary (?size=thumb for a thumbnail)
+
+    Images are content-addressed, so the ETag is their hash and browsers may
+    cache them for good.
+    """
     claims = _current_user_claims()
     if not claims:
         return jsonify({"error": "Unauthorized"}), 401
@@ -1780,30 +1779,48 @@ def get_violation_image(assignment_id, violation_index):
     if claims.get("role") != "admin":
         return jsonify({"error": "Admin access required"}), 403
     
+    thumb = request.args.get("size") == "thumb"
     try:
         from bson import ObjectId
         db = get_db()
         
-        assignment = db[ASSIGNMENTS_COLLECTION].find_one(
-            {"_id": ObjectId(assignment_id)},
-            {"violation_log": 1}
-        )
+        # Fetch only the requested violation_log element
+        found = list(db[ASSIGNMENTS_COLLECTION].aggregate([
+            {"$match": {"_id": ObjectId(assignment_id)}},
+            {"$project": {"violation": {"$arrayElemAt": [{"$ifNull": ["$violation_log", []]}, violation_index]}}}
+        ]))
         
-        if not assignment:
+        if not found:
             return jsonify({"error": "Assignment not found"}), 404
         
-        violation_log = assignment.get("violation_log", [])
-        if violation_index >= len(violation_log):
+        violation = found[0].get("violation")
+        if not violation:
             return jsonify({"error": "Violation not found"}), 404
         
-        violation = violation_log[violation_index]
-        captured_image = violation.get("captured_image")
+        # Migrated entries reference the blob store; older ones still hold the data URL
+        key = violation.get("image_id")
+        inline = None if key else decode_data_url(violation.get("captured_image"))
+        if inline is not None:
+            key = image_store.key_for(inline[0])
+        if not key:
+            return jsonify({"error": "No image available"}), 404
         
-        if not captured_image:
+        if thumb:
+            image = image_store.thumbnail(key, source=inline[0] if inline else None)
+        else:
+            image = inline or image_store.get(key)
+        if image is None:
             return jsonify({"error": "No image available"}), 404
         
-        # Return the base64 image data
-        return jsonify({"image": captured_image})
+        data, content_type = image
+        response = Response(data, mimetype=content_type)
+        response.set_etag(f"{key}.thumb" if thumb else key)
+        response.cache_control.private = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+        if isinstance(violation.get("timestamp"), datetime.datetime):
+            response.last_modified = violation["timestamp"]
+        return response.make_conditional(request)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
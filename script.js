@@ -360,7 +360,7 @@ async function loadAirportSections() {
     // Load airports and users in parallel
     const [airportsRes, usersRes] = await Promise.all([
       fetch("/api/airports", { credentials: "include" }),
-      fetch("/api/users", { credentials: "include" })
+      fetch("/api/users?profile=summary", { credentials: "include" })
     ])
 
     if (!airportsRes.ok || !usersRes.ok) {
@@ -547,14 +547,14 @@ async function loadSelectedAirportSection(airportName) {
 
   try {
     // Load users for this airport
-    const usersRes = await fetch("/api/users", { credentials: "include" })
+    const params = new URLSearchParams({ profile: "summary", airport: airportName })
+    const usersRes = await fetch(`/api/users?${params}`, { credentials: "include" })
     if (!usersRes.ok) {
       container.innerHTML = '<div style="color: var(--danger); text-align: center; padding: 20px;">Failed to load users</div>'
       return
     }
 
-    const users = await usersRes.json()
-    const airportUsers = users.filter(user => (user.airport || "") === airportName)
+    const airportUsers = await usersRes.json()
 
     // Create the airport section
     const section = createAirportSection(airportName, airportUsers)
@@ -575,7 +575,7 @@ window.__assignSelectedAirports = new Set()
 
 async function loadUsersForAssign() {
   try {
-    const res = await fetch("/api/users", { credentials: "include" })
+    const res = await fetch("/api/users?profile=summary", { credentials: "include" })
     if (!res.ok) return
     window.__assignUsers = await res.json()
     // Initialize or prune the selection set
@@ -860,22 +860,17 @@ async function loadUsers() {
   const userSearch = (document.getElementById("userSearch")?.value || "").trim().toLowerCase()
 
   try {
-    const res = await fetch("/api/users", { credentials: "include" })
+    const params = new URLSearchParams({ profile: "summary" })
+    if (selectedAirport) params.set("airport", selectedAirport)
+    if (userSearch) params.set("q", userSearch)
+    const res = await fetch(`/api/users?${params}`, { credentials: "include" })
     if (!res.ok) {
       console.error("Failed to load users:", res.status)
       ul.innerHTML = '<li style="color: var(--danger); text-align: center; padding: 20px;">Failed to load users</li>'
       return
     }
 
-    let users = await res.json()
-    if (selectedAirport) users = users.filter((u) => (u.airport || "") === selectedAirport)
-    if (userSearch) {
-      users = users.filter((u) => {
-        const email = (u.email || "").toLowerCase()
-        const mat = (u.matricule || "").toLowerCase()
-        return email.includes(userSearch) || mat.includes(userSearch)
-      })
-    }
+    const users = await res.json()
 
     if (!users || users.length === 0) {
       ul.innerHTML = '<li style="color: var(--muted); text-align: center; padding: 20px;">No users found</li>'
@@ -934,7 +929,7 @@ async function loadScores() {
   ul.innerHTML = ""
   // Fetch scores and violations in parallel
   const [resScores, resViol] = await Promise.all([
-    fetch("/api/scores", { credentials: "include" }),
+    fetch("/api/scores?profile=summary", { credentials: "include" }),
     fetch("/api/violation-reports", { credentials: "include" }),
   ])
   if (!resScores.ok) return
@@ -1003,8 +998,9 @@ async function loadScores() {
 
 async function loadLatestAssignmentReportFor(email) {
   try {
-    // fetch all assignments and pick most recent finished for this user
-    const res = await fetch("/api/quiz-assignments", { credentials: "include" })
+    // fetch this user's finished assignments and pick the most recent
+    const params = new URLSearchParams({ email, status: "finished", profile: "detail" })
+    const res = await fetch(`/api/quiz-assignments?${params}`, { credentials: "include" })
     if (!res.ok) {
       showToast("Failed to load assignments", "error")
       return
@@ -1120,7 +1116,7 @@ async function renderAssignmentReport(a) {
     const violationLog = Array.isArray(a.violation_log) ? a.violation_log : []
     
     if (violationLog.length > 0) {
-      const violationsWithImages = violationLog.filter(v => v.captured_image)
+      const violationsWithImages = violationLog.filter(v => v.captured_image || v.image_id)
       
       // Show violation section even if there are no images, but prioritize showing ones with images
       const violationsToShow = violationsWithImages.length > 0 ? violationsWithImages : violationLog
@@ -1152,10 +1148,12 @@ async function renderAssignmentReport(a) {
           violationInfo.innerHTML = `<strong>Violation #${idx + 1}:</strong> ${violation.type || "Unknown"} — ${violation.message || "No message"} — <span class="dim">${timestamp}</span>`
           violationItem.appendChild(violationInfo)
 
-          // Only show image if captured_image exists
-          if (violation.captured_image) {
+          // Only show image if one was captured (stored images are fetched by log index)
+          if (violation.captured_image || violation.image_id) {
             const img = document.createElement("img")
-            img.src = violation.captured_image
+            const imageUrl = `/api/violation-image/${a.assignment_id}/${violationLog.indexOf(violation)}`
+            img.src = violation.captured_image || `${imageUrl}?size=thumb`
+            img.loading = "lazy"
             img.style.maxWidth = "100%"
             img.style.height = "auto"
             img.style.borderRadius = "8px"
@@ -1180,7 +1178,7 @@ async function renderAssignmentReport(a) {
               modal.style.cursor = "pointer"
               
               const fullImg = document.createElement("img")
-              fullImg.src = violation.captured_image
+              fullImg.src = violation.captured_image || imageUrl
               fullImg.style.maxWidth = "90%"
               fullImg.style.maxHeight = "90%"
               fullImg.style.objectFit = "contain"
@@ -1843,34 +1841,37 @@ async function deleteQuestion(questionId) {
   }
 }
 
-async function loadAssignments() {
+const ASSIGNMENTS_PAGE_SIZE = 50
+// Statuses of assignment_status.py accepted by /api/quiz-assignments
+const ASSIGNMENT_STATUSES = ["pending", "in_progress", "finished", "passed", "failed", "terminated"]
+let assignmentsCursor = null
+
+// Loads the first page of assignments matching the search and airport filter, or the next page when append is true
+async function loadAssignments(append = false) {
   const ul = document.getElementById("assignmentsList")
   if (!ul) return
-  ul.innerHTML = ""
+  if (!append) {
+    ul.innerHTML = ""
+    assignmentsCursor = null
+  }
+  const moreBtn = document.getElementById("loadMoreAssignmentsBtn")
   try {
-    const res = await fetch("/api/quiz-assignments", { credentials: "include" })
-    if (!res.ok) return
-    let rows = await res.json()
     const search = (document.getElementById("assignmentSearch")?.value || "").trim().toLowerCase()
     const airportFilter = (document.getElementById("assignmentsAirportFilter")?.value || "").trim()
-    if (search) {
-      rows = rows.filter((r) => {
-        const email = (r.email || "").toLowerCase()
-        const status = r.finished_at ? "completed" : r.started_at ? "started" : "pending"
-        const terminated = r.terminated ? "terminated" : ""
-        return email.includes(search) || status.includes(search) || terminated.includes(search)
-      })
-    }
-    if (airportFilter) {
-      const emailToAirport = new Map((Array.isArray(window.__assignUsers) ? window.__assignUsers : []).map((u) => [String(u.email || '').toLowerCase(), u.airport || '']))
-      rows = rows.filter((r) => {
-        const fromRow = r.airport || ''
-        const fromUser = emailToAirport.get(String(r.email || '').toLowerCase()) || ''
-        const resolved = fromRow || fromUser
-        return resolved === airportFilter
-      })
+    const params = new URLSearchParams({ profile: "summary", limit: ASSIGNMENTS_PAGE_SIZE })
+    if (search) params.set(ASSIGNMENT_STATUSES.includes(search) ? "status" : "q", search)
+    if (airportFilter) params.set("airport", airportFilter)
+    if (append && assignmentsCursor) params.set("cursor", assignmentsCursor)
+    const res = await fetch(`/api/quiz-assignments?${params}`, { credentials: "include" })
+    if (!res.ok) return
+    const page = await res.json()
+    const rows = page.items || []
+    assignmentsCursor = page.next_cursor || null
+    if (moreBtn) {
+      moreBtn.style.display = assignmentsCursor ? "inline-block" : "none"
+      moreBtn.textContent = `Load More (${ul.children.length + rows.length} of ${page.total_estimated ? "~" : ""}${page.total})`
     }
-    if (!rows.length) {
+    if (!rows.length && !append) {
       ul.innerHTML = '<li class="muted">No quiz assignments yet</li>'
       return
     }
@@ -1883,7 +1884,7 @@ async function loadAssignments() {
       const right = document.createElement("div")
       const started = r.started_at ? new Date(r.started_at).toLocaleString() : ""
       const finished = r.finished_at ? new Date(r.finished_at).toLocaleString() : ""
-      const total = r.total || r.question_count || (Array.isArray(r.selected) ? r.selected.length : undefined)
+      const total = r.total || r.question_count
       left.innerHTML = `<div style="font-weight:700;">${r.email}</div>
         <div class="dim">${r.category || "All"} — ${typeof total === "number" ? total : "?"} questions ${started ? " — started " + started : ""}${finished ? " — finished " + finished : ""}${typeof r.score === "number" ? ` — score ${r.score}/${r.total_with_keys}` : ""}</div>`
       const viewBtn = document.createElement("button")
@@ -1943,27 +1944,36 @@ async function showAssignmentQuestions(row) {
   }
 }
 
-async function loadViolationReports() {
+const VIOLATION_REPORTS_PAGE_SIZE = 25
+let violationReportsCursor = null
+
+// Loads the first page of violation reports, or the next page when append is true
+async function loadViolationReports(append = false) {
   try {
-    const res = await fetch("/api/violation-reports", { credentials: "include" })
+    const params = new URLSearchParams({ limit: VIOLATION_REPORTS_PAGE_SIZE })
+    if (append && violationReportsCursor) params.set("cursor", violationReportsCursor)
+    const res = await fetch(`/api/violation-reports?${params}`, { credentials: "include" })
     if (!res.ok) {
       showToast("Failed to load violation reports", "error")
       return
     }
     const data = await res.json()
     const reports = data.reports || []
+    violationReportsCursor = data.next_cursor || null
 
     const panel = document.getElementById("violationReportsPanel")
     const list = document.getElementById("violationReportsList")
+    const moreBtn = document.getElementById("loadMoreReportsBtn")
 
     if (panel) panel.style.display = "block"
+    if (moreBtn) moreBtn.style.display = violationReportsCursor ? "inline-block" : "none"
     if (list) {
-      if (reports.length === 0) {
+      if (reports.length === 0 && !append) {
         list.innerHTML = '<p class="muted">No violations reported.</p>'
         return
       }
 
-      list.innerHTML = reports
+      const html = reports
         .map((report) => {
           const createdDate = new Date(report.created_at).toLocaleString()
           const finishedDate = report.finished_at ? new Date(report.finished_at).toLocaleString() : "Not finished"
@@ -2080,7 +2090,7 @@ async function loadViolationReports() {
                     <div style="display: flex; justify-content: space-between; align-items: start;">
                       <div style="flex: 1;">
                         <div style="display: flex; align-items: center; gap: 8px; margin-bottom: 6px;">
-                          <div style="color: #fca5a5; font-weight: 600; font-size: 14px;">${violationType}</div>
+                          <div style="color: #fca5a5; font-weight: 600; font-size: 14px;">${violationType}${violation.count > 1 ? ` ×${violation.count}` : ""}</div>
                           ${isCritical ? '<span style="background: var(--danger); color: white; padding: 2px 6px; border-radius: 4px; font-size: 10px; font-weight: 700;">CRITICAL</span>' : ""}
                         </div>
                         <div class="muted" style="font-size: 13px; margin-bottom: 6px;">${violation.message || "No message"}</div>
@@ -2094,7 +2104,14 @@ async function loadViolationReports() {
                         ${
                           violation.has_image
                             ? `
-                          <button onclick="showViolationImage('${violation.assignment_id || report.assignment_id}', ${idx})" style="
+                          <img src="/api/violation-image/${violation.assignment_id || report.assignment_id}/${violation.index ?? idx}?size=thumb" loading="lazy" alt="Evidence thumbnail"
+                            onclick="showViolationImage('${violation.assignment_id || report.assignment_id}', ${violation.index ?? idx})" style="
+                            width: 64px;
+                            border-radius: 6px;
+                            border: 1px solid rgba(239, 68, 68, 0.4);
+                            cursor: pointer;
+                          ">
+                          <button onclick="showViolationImage('${violation.assignment_id || report.assignment_id}', ${violation.index ?? idx})" style="
                             background: var(--accent);
                             border: none;
                             color: white;
@@ -2130,6 +2147,8 @@ async function loadViolationReports() {
         `
         })
         .join("")
+      if (append) list.insertAdjacentHTML("beforeend", html)
+      else list.innerHTML = html
     }
   } catch (e) {
     showToast("Failed to load violation reports", "error")
@@ -2191,6 +2210,15 @@ async function generateAirportReport() {
   }
 }
 
+// Download the selected airport's assignments as CSV, streamed by the server
+function exportAirportAssignments() {
+  const sel = document.getElementById("reportAirportSelect")
+  const airport = sel ? sel.value : ""
+  const params = new URLSearchParams({ format: "csv" })
+  if (airport) params.set("airport", airport)
+  window.location.href = `/api/export/assignments?${params}`
+}
+
 function getTimeAgo(date) {
   const now = new Date()
   const diffMs = now - date
@@ -2233,12 +2261,14 @@ function showAllReports() {
 
 async function showViolationImage(assignmentId, violationIndex) {
   try {
-    const res = await fetch(`/api/violation-image/${assignmentId}/${violationIndex}`, { credentials: "include" })
+    // The image is cacheable, so the <img> below reuses this response
+    const imageUrl = `/api/violation-image/${assignmentId}/${violationIndex}`
+    const res = await fetch(imageUrl, { credentials: "include" })
     if (!res.ok) {
       showToast("Failed to load violation image", "error")
       return
     }
-    const data = await res.json()
+    const capturedAt = res.headers.get("Last-Modified")
 
     const modal = document.createElement("div")
     modal.style.cssText = `
@@ -2300,7 +2330,7 @@ async function showViolationImage(assignmentId, violationIndex) {
           </p>
         </div>
         
-        <img src="data:image/jpeg;base64,${data.image}" style="
+        <img src="${imageUrl}" style="
           max-width: 100%;
           max-height: 500px;
           border-radius: 12px;
@@ -2315,7 +2345,7 @@ async function showViolationImage(assignmentId, violationIndex) {
           margin-top: 16px;
         ">
           <p style="color: var(--muted); margin: 0; font-size: 14px;">
-            <strong>Captured:</strong> ${new Date(data.timestamp).toLocaleString()}
+            <strong>Captured:</strong> ${capturedAt ? new Date(capturedAt).toLocaleString() : "Unknown time"}
           </p>
           <p style="color: var(--muted); margin: 4px 0 0 0; font-size: 12px;">
             This evidence is stored permanently and cannot be modified
@@ -2456,4 +2486,4 @@ document.getElementById("assignmentSearch").addEventListener(
 
 // Wire airport filter controls
 document.getElementById('assignAirportFilter')?.addEventListener('change', renderAssignUsers)
-document.getElementById('assignmentsAirportFilter')?.addEventListener('change', loadAssignments)
+document.getElementById('assignmentsAirportFilter')?.addEventListener('change', () => loadAssignments())
@@ -0,0 +1,455 @@
+"""
+Materialized platform statistics.
+
+The public success-rate and dashboard counters live in one document of the
+stats collection. Writes that finish or terminate an assignment read the
+document's ASSIGNMENT_STATE_FIELDS before the update, and record() adjusts
+the counters from the state before and after; user creation and deletion
+bump total_users. A full
+recount replaces the document every STATS_RECONCILE_INTERVAL seconds to
+correct any drift (and to lower best_score after a terminated best run).
+
+Question usage (how often each question and section was asked) is counted
+from the same before/after pair: finishing an assignment $inc's one counter
+per selected question and section, and the most-asked endpoint reads the top counters
+through an index on count.
+
+Daily rollups keep one bucket per (day, airport) with assignments created,
+started, finished, passed and terminated plus score and duration sums, and
+one per (day, section) with questions attempted and answered correctly.
+They are bumped from the same before/after pair, so the dashboard charts
+read a few hundred small documents instead of every assignment.
+
+The three are independent: the caller that writes the assignment (scores.py)
+hands the pair to each of them.
+"""
+
+import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from configuration import (
+    get_db,
+    ASSIGNMENTS_COLLECTION,
+    USERS_COLLECTION,
+    STATS_COLLECTION,
+    STATS_RECONCILE_INTERVAL,
+    QUESTION_USAGE_COLLECTION,
+    DAILY_ROLLUPS_COLLECTION,
+)
+
+
+STATS_ID = "platform"
+# Assignment fields the counters, usage and rollups derive from
+ASSIGNMENT_STATE_FIELDS = {
+    "finished_at": 1, "terminated": 1, "passed": 1, "percentage_score": 1,
+    "selected.section": 1, "selected.id": 1,
+    "started_at": 1, "terminated_at": 1, "airport": 1,
+}
+_COMPLETED = {"finished_at": {"$ne": None}, "terminated": {"$ne": True}}
+
+
+def _outcome(doc: Optional[Dict[str, Any]]) -> Optional[bool]:
+    """True/False (passed/failed) if the assignment counts as completed, else None."""
+    if not doc or doc.get("finished_at") is None or doc.get("terminated") is True:
+        return None
+    return doc.get("passed") is True
+
+
+class PlatformStats:
+    """completed / passed / failed / best_score / total_users in one document."""
+
+    def __init__(self, reconcile_interval: float) -> None:
+        self.reconcile_interval = reconcile_interval
+
+    def _coll(self):
+        return get_db()[STATS_COLLECTION]
+
+    def record(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        was, now = _outcome(before), _outcome(after)
+        inc: Dict[str, int] = {}
+        if was is not None:
+            inc["completed"] = inc.get("completed", 0) - 1
+            inc["passed" if was else "failed"] = inc.get("passed" if was else "failed", 0) - 1
+        if now is not None:
+            inc["completed"] = inc.get("completed", 0) + 1
+            inc["passed" if now else "failed"] = inc.get("passed" if now else "failed", 0) + 1
+        update: Dict[str, Any] = {}
+        inc = {k: v for k, v in inc.items() if v}
+        if inc:
+            update["$inc"] = inc
+        if now is not None and after.get("percentage_score") is not None:
+            update["$max"] = {"best_score": float(after["percentage_score"])}
+        self._apply(update)
+
+    def user_added(self) -> None:
+        self._apply({"$inc": {"total_users": 1}})
+
+    def user_removed(self) -> None:
+        self._apply({"$inc": {"total_users": -1}})
+
+    def _apply(self, update: Dict[str, Any]) -> None:
+        if not update:
+            return
+        try:
+            # Created without reconciled_at, so the first read() recounts it
+            self._coll().update_one({"_id": STATS_ID}, update, upsert=True)
+        except Exception as e:
+            print(f"Platform stats update failed: {e}")
+
+    def reconcile(self) -> Dict[str, Any]:
+        """Recount everything from the assignments and users collections."""
+        db = get_db()
+        completed = db[ASSIGNMENTS_COLLECTION].count_documents(_COMPLETED)
+        passed = db[ASSIGNMENTS_COLLECTION].count_documents(dict(_COMPLETED, passed=True))
+        best = db[ASSIGNMENTS_COLLECTION].find_one(
+            dict(_COMPLETED, percentage_score={"$ne": None}),
+            {"percentage_score": 1},
+            sort=[("percentage_score", -1)]
+        )
+        doc = {
+            "completed": completed,
+            "passed": passed,
+            "failed": completed - passed,
+            "best_score": float(best["percentage_score"]) if best else None,
+            "total_users": db[USERS_COLLECTION].count_documents({}),
+            "reconciled_at": datetime.datetime.utcnow(),
+        }
+        self._coll().replace_one({"_id": STATS_ID}, doc, upsert=True)
+        return dict(doc, _id=STATS_ID)
+
+    def read(self) -> Dict[str, Any]:
+        """The stats document: one point read, plus a recount once it is due."""
+        doc = self._coll().find_one({"_id": STATS_ID})
+        if doc is None:
+            return self.reconcile()
+        reconciled_at = doc.get("reconciled_at")
+        due = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.reconcile_interval)
+        if reconciled_at is None or reconciled_at <= due:
+            # Only the request that claims the recount runs it; the others serve the current counters
+            claimed = self._coll().update_one(
+                {"_id": STATS_ID, "reconciled_at": reconciled_at},
+                {"$set": {"reconciled_at": datetime.datetime.utcnow()}}
+            )
+            if claimed.modified_count:
+                return self.reconcile()
+        return doc
+
+
+class QuestionUsage:
+    """Per-question and per-section counts of finished assignments that asked them.
+
+    One document per counter: {kind: "question", section, question_id, count}
+    or {kind: "section", section, count}, indexed on (kind, count).
+    """
+
+    def __init__(self) -> None:
+        self._indexed = False
+
+    def _collection(self):
+        coll = get_db()[QUESTION_USAGE_COLLECTION]
+        if not self._indexed:
+            try:
+                coll.create_index([("kind", 1), ("section", 1), ("question_id", 1)], unique=True)
+                coll.create_index([("kind", 1), ("count", -1)])
+            except Exception:
+                pass
+            self._indexed = True
+        return coll
+
+    @staticmethod
+    def _counts(selected: Optional[Iterable[Dict[str, Any]]]) -> Tuple[Dict[Tuple[str, int], int], Dict[str, int]]:
+        questions: Dict[Tuple[str, int], int] = {}
+        sections: Dict[str, int] = {}
+        for item in selected or []:
+            section, question_id = item.get("section"), item.get("id")
+            if section and question_id is not None:
+                try:
+                    key = (str(section), int(question_id))
+                except (TypeError, ValueError):
+                    continue
+                questions[key] = questions.get(key, 0) + 1
+                sections[key[0]] = sections.get(key[0], 0) + 1
+        return questions, sections
+
+    @staticmethod
+    def _filter(kind: str, section: str, question_id: Optional[int] = None) -> Dict[str, Any]:
+        return {"kind": kind, "section": section, "question_id": question_id}
+
+    def record(self, selected: Optional[Iterable[Dict[str, Any]]]) -> None:
+        """Count one finished assignment's questions."""
+        from pymongo import UpdateOne
+
+        questions, sections = self._counts(selected)
+        ops = [UpdateOne(self._filter("question", s, q), {"$inc": {"count": n}}, upsert=True) for (s, q), n in questions.items()]
+        ops += [UpdateOne(self._filter("section", s), {"$inc": {"count": n}}, upsert=True) for s, n in sections.items()]
+        if not ops:
+            return
+        try:
+            self._collection().bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"Question usage update failed: {e}")
+
+    def assignment_updated(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        if before.get("finished_at") is None and after.get("finished_at") is not None:
+            self.record(before.get("selected"))
+
+    def top(self, kind: str, limit: int = 5) -> List[Dict[str, Any]]:
+        return list(self._collection().find(
+            {"kind": kind}, {"_id": 0, "section": 1, "question_id": 1, "count": 1}
+        ).sort("count", -1).limit(limit))
+
+    def backfill(self) -> Tuple[int, int]:
+        """Recount every counter from finished assignments. Returns (questions, sections)."""
+        from pymongo import ReplaceOne
+
+        valid = {"selected.section": {"$nin": [None, ""]}, "selected.id": {"$ne": None}}
+        pipeline = [
+            {"$match": {"finished_at": {"$ne": None}, "selected": {"$exists": True, "$ne": None}}},
+            {"$project": {"selected.section": 1, "selected.id": 1}},
+            {"$unwind": "$selected"},
+            {"$match": valid},
+            {"$group": {"_id": {"section": "$selected.section", "id": "$selected.id"}, "count": {"$sum": 1}}},
+        ]
+        questions: Dict[Tuple[str, int], int] = {}
+        for row in get_db()[ASSIGNMENTS_COLLECTION].aggregate(pipeline, allowDiskUse=True):
+            try:
+                key = (str(row["_id"]["section"]), int(row["_id"]["id"]))
+            except (TypeError, ValueError):
+                continue
+            # "3" and 3 are the same question once normalised
+            questions[key] = questions.get(key, 0) + row["count"]
+        sections: Dict[str, int] = {}
+        for (section, _), n in questions.items():
+            sections[section] = sections.get(section, 0) + n
+
+        coll = self._collection()
+        ops = [ReplaceOne(self._filter("question", s, q), dict(self._filter("question", s, q), count=n), upsert=True)
+               for (s, q), n in questions.items()]
+        ops += [ReplaceOne(self._filter("section", s), dict(self._filter("section", s), count=n), upsert=True)
+                for s, n in sections.items()]
+        # Counters are replaced in place, so the endpoint never sees an empty table
+        for i in range(0, len(ops), 1000):
+            coll.bulk_write(ops[i:i + 1000], ordered=False)
+        return len(questions), len(sections)
+
+
+ROLLUP_FIELDS = ("created", "started", "finished", "passed", "terminated",
+                 "score_sum", "score_count", "duration_sum", "duration_count")
+SECTION_ROLLUP_FIELDS = ("attempted", "correct", "finished")
+
+
+def _day(value: Any) -> Optional[str]:
+    return value.strftime("%Y-%m-%d") if isinstance(value, datetime.datetime) else None
+
+
+def _rollup_deltas(before: Dict[str, Any], after: Dict[str, Any]) -> List[Tuple[str, str, Optional[str], Dict[str, float]]]:
+    """(kind, day, airport-or-section, $inc) for one assignment state change."""
+    airport = after.get("airport")
+    deltas: List[Tuple[str, str, Optional[str], Dict[str, float]]] = []
+
+    started = _day(after.get("started_at"))
+    if not before.get("started_at") and started:
+        deltas.append(("airport", started, airport, {"started": 1}))
+
+    finished = _day(after.get("finished_at"))
+    if before.get("finished_at") is None and finished:
+        inc: Dict[str, float] = {"finished": 1}
+        if after.get("terminated") is True:
+            inc["terminated"] = 1
+        else:
+            if after.get("passed") is True:
+                inc["passed"] = 1
+            if isinstance(after.get("percentage_score"), (int, float)):
+                inc["score_sum"] = float(after["percentage_score"])
+                inc["score_count"] = 1
+            if isinstance(after.get("duration_used_seconds"), (int, float)):
+                inc["duration_sum"] = float(after["duration_used_seconds"])
+                inc["duration_count"] = 1
+        deltas.append(("airport", finished, airport, inc))
+        per_section = after.get("per_section")
+        if isinstance(per_section, dict):
+            for section, counts in per_section.items():
+                if isinstance(counts, dict):
+                    deltas.append(("section", finished, str(section), {
+                        "attempted": int(counts.get("attempted") or 0),
+                        "correct": int(counts.get("correct") or 0),
+                        "finished": 1,
+                    }))
+    elif before.get("terminated") is not True and after.get("terminated") is True:
+        # Terminated after it had already finished
+        day = _day(after.get("terminated_at")) or finished
+        if day:
+            deltas.append(("airport", day, airport, {"terminated": 1}))
+    return deltas
+
+
+class DailyRollups:
+    """Daily analytics buckets, {kind: "airport", day, airport, ...ROLLUP_FIELDS} and
+    {kind: "section", day, section, ...SECTION_ROLLUP_FIELDS}, updated with $inc."""
+
+    def __init__(self) -> None:
+        self._indexed = False
+
+    def _collection(self):
+        coll = get_db()[DAILY_ROLLUPS_COLLECTION]
+        if not self._indexed:
+            try:
+                coll.create_index([("kind", 1), ("day", 1), ("airport", 1), ("section", 1)], unique=True)
+            except Exception:
+                pass
+            self._indexed = True
+        return coll
+
+    @staticmethod
+    def _filter(kind: str, day: str, key: Optional[str]) -> Dict[str, Any]:
+        if kind == "section":
+            return {"kind": kind, "day": day, "airport": None, "section": key}
+        return {"kind": kind, "day": day, "airport": key, "section": None}
+
+    def _apply(self, deltas: List[Tuple[str, str, Optional[str], Dict[str, float]]]) -> None:
+        from pymongo import UpdateOne
+
+        ops = [UpdateOne(self._filter(kind, day, key), {"$inc": inc}, upsert=True) for kind, day, key, inc in deltas if inc]
+        if not ops:
+            return
+        try:
+            self._collection().bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"Daily rollup update failed: {e}")
+
+    def assignment_created(self, doc: Dict[str, Any]) -> None:
+        day = _day(doc.get("created_at"))
+        if day:
+            self._apply([("airport", day, doc.get("airport"), {"created": 1})])
+
+    def assignments_deleted(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """Undo the created/started counts of unfinished assignments that were deleted."""
+        deltas: List[Tuple[str, str, Optional[str], Dict[str, float]]] = []
+        for doc in docs:
+            if _day(doc.get("created_at")):
+                deltas.append(("airport", _day(doc["created_at"]), doc.get("airport"), {"created": -1}))
+            if _day(doc.get("started_at")):
+                deltas.append(("airport", _day(doc["started_at"]), doc.get("airport"), {"started": -1}))
+        self._apply(deltas)
+
+    def assignments_moved(self, docs: Iterable[Dict[str, Any]], airport: Optional[str]) -> None:
+        """Move the created/started counts of unfinished assignments to their new airport."""
+        deltas: List[Tuple[str, str, Optional[str], Dict[str, float]]] = []
+        for doc in docs:
+            for field, name in (("created_at", "created"), ("started_at", "started")):
+                day = _day(doc.get(field))
+                if day:
+                    deltas.append(("airport", day, doc.get("airport"), {name: -1}))
+                    deltas.append(("airport", day, airport, {name: 1}))
+        self._apply(deltas)
+
+    def assignment_updated(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        self._apply(_rollup_deltas(before, after))
+
+    def series(self, since: Optional[str], until: Optional[str], airport: Optional[str] = None) -> Dict[str, Any]:
+        """Per-day airport metrics between since and until (inclusive, YYYY-MM-DD), their
+        totals, all-time totals and per-section totals for the range."""
+        day_match: Dict[str, Any] = {}
+        if since:
+            day_match["$gte"] = since
+        if until:
+            day_match["$lte"] = until
+        match: Dict[str, Any] = {"kind": "airport"}
+        if airport:
+            match["airport"] = airport
+        sums = {field: {"$sum": f"${field}"} for field in ROLLUP_FIELDS}
+
+        coll = self._collection()
+        ranged = dict(match, day=day_match) if day_match else match
+        days = list(coll.aggregate([
+            {"$match": ranged},
+            {"$group": dict(_id="$day", **sums)},
+            {"$sort": {"_id": 1}},
+        ]))
+        all_time = list(coll.aggregate([{"$match": match}, {"$group": dict(_id=None, **sums)}]))
+        section_match: Dict[str, Any] = {"kind": "section"}
+        if day_match:
+            section_match["day"] = day_match
+        sections = list(coll.aggregate([
+            {"$match": section_match},
+            {"$group": dict(_id="$section", **{f: {"$sum": f"${f}"} for f in SECTION_ROLLUP_FIELDS})},
+            {"$sort": {"attempted": -1}},
+            {"$limit": 20},
+        ]))
+
+        by_day = {row["_id"]: row for row in days}
+        if since and until:
+            # Continuous series: days without activity are zero
+            start = datetime.datetime.strptime(since, "%Y-%m-%d")
+            end = datetime.datetime.strptime(until, "%Y-%m-%d")
+            span = [(start + datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+        else:
+            span = sorted(by_day)
+        series = [dict(_summarize(by_day.get(day, {})), day=day) for day in span]
+        return {
+            "since": since,
+            "until": until,
+            "airport": airport,
+            "days": series,
+            "totals": _summarize({f: sum(row.get(f, 0) for row in days) for f in ROLLUP_FIELDS}),
+            "all_time": _summarize(all_time[0] if all_time else {}),
+            "sections": [
+                {
+                    "section": row["_id"],
+                    "attempted": row.get("attempted", 0),
+                    "correct": row.get("correct", 0),
+                    "finished": row.get("finished", 0),
+                    "accuracy": round(row["correct"] / row["attempted"] * 100, 1) if row.get("attempted") else None,
+                }
+                for row in sections
+            ],
+        }
+
+    def backfill(self) -> int:
+        """Rebuild every bucket from the assignments collection. Returns the number of buckets."""
+        from pymongo import ReplaceOne
+
+        buckets: Dict[Tuple[str, str, Optional[str]], Dict[str, float]] = {}
+
+        def add(kind: str, day: str, key: Optional[str], inc: Dict[str, float]) -> None:
+            bucket = buckets.setdefault((kind, day, key), {})
+            for field, value in inc.items():
+                bucket[field] = bucket.get(field, 0) + value
+
+        fields = {"created_at": 1, "started_at": 1, "finished_at": 1, "terminated": 1, "terminated_at": 1, "passed": 1,
+                  "percentage_score": 1, "duration_used_seconds": 1, "per_section": 1, "airport": 1}
+        for doc in get_db()[ASSIGNMENTS_COLLECTION].find({}, fields):
+            day = _day(doc.get("created_at"))
+            if day:
+                add("airport", day, doc.get("airport"), {"created": 1})
+            for delta in _rollup_deltas({}, doc):
+                add(*delta)
+
+        coll = self._collection()
+        ops = [ReplaceOne(self._filter(kind, day, key), dict(self._filter(kind, day, key), **inc), upsert=True)
+               for (kind, day, key), inc in buckets.items()]
+        for i in range(0, len(ops), 1000):
+            coll.bulk_write(ops[i:i + 1000], ordered=False)
+        return len(ops)
+
+
+def _summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts plus averages from summed rollup fields."""
+    finished = row.get("finished", 0)
+    terminated = row.get("terminated", 0)
+    passed = row.get("passed", 0)
+    return {
+        "created": row.get("created", 0),
+        "started": row.get("started", 0),
+        "finished": finished,
+        "passed": passed,
+        "failed": max(finished - terminated - passed, 0),
+        "terminated": terminated,
+        "avg_score": round(row["score_sum"] / row["score_count"], 1) if row.get("score_count") else None,
+        "avg_duration_used": round(row["duration_sum"] / row["duration_count"]) if row.get("duration_count") else None,
+    }
+
+
+platform_stats = PlatformStats(STATS_RECONCILE_INTERVAL)
+question_usage = QuestionUsage()
+daily_rollups = DailyRollups()
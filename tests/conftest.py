@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory database behind configuration.get_db()."""
+    mongomock = pytest.importorskip("mongomock")
+    import configuration
+    monkeypatch.setattr(configuration, "_mongo_client", mongomock.MongoClient())
+    return configuration.get_db()
+
+
+@pytest.fixture
+def client(db):
+    """client(email, role) -> Flask test client signed in as that user."""
+    from app import app
+    from jwthelper import create_jwt
+
+    def make(email="cand@example.com", role="user"):
+        c = app.test_client()
+        c.set_cookie("access_token", create_jwt({"sub": "1", "email": email, "role": role}))
+        return c
+    return make
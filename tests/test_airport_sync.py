@@ -0,0 +1,55 @@
+import datetime
+
+from configuration import ASSIGNMENTS_COLLECTION, DAILY_ROLLUPS_COLLECTION, USERS_COLLECTION
+from stats import daily_rollups
+
+DAY1 = datetime.datetime(2026, 3, 1, 9, 0)
+DAY2 = datetime.datetime(2026, 3, 2, 9, 0)
+
+
+def _buckets(db):
+    """Non-zero airport bucket counts keyed by (day, airport)."""
+    out = {}
+    for row in db[DAILY_ROLLUPS_COLLECTION].find({"kind": "airport"}):
+        counts = {k: v for k, v in row.items() if k in ("created", "started", "finished", "passed") and v}
+        if counts:
+            out[(row["day"], row["airport"])] = counts
+    return out
+
+
+def _seed(db):
+    db[USERS_COLLECTION].insert_one({"email": "cand@example.com", "airport": "Tunis", "role": "user"})
+    db[ASSIGNMENTS_COLLECTION].insert_many([
+        {"email": "cand@example.com", "airport": "Tunis", "created_at": DAY1, "started_at": DAY1,
+         "finished_at": DAY1, "passed": True},
+        {"email": "cand@example.com", "airport": "Tunis", "created_at": DAY2, "started_at": DAY2, "finished_at": None},
+        {"email": "cand@example.com", "airport": "Tunis", "created_at": DAY2, "finished_at": None},
+    ])
+    daily_rollups.backfill()
+
+
+def test_airport_change_moves_open_assignments_and_their_rollups(db, client):
+    _seed(db)
+    r = client("admin@example.com", "admin").put("/api/users/cand@example.com", json={"airport": "Djerba"})
+    assert r.status_code == 200
+
+    airports = {d["created_at"]: d["airport"] for d in db[ASSIGNMENTS_COLLECTION].find({"finished_at": {"$ne": None}})}
+    assert airports == {DAY1: "Tunis"}  # history keeps the airport it was taken at
+    assert db[ASSIGNMENTS_COLLECTION].count_documents({"finished_at": None, "airport": "Djerba"}) == 2
+
+    assert _buckets(db) == {
+        ("2026-03-01", "Tunis"): {"created": 1, "started": 1, "finished": 1, "passed": 1},
+        ("2026-03-02", "Djerba"): {"created": 2, "started": 1},
+    }
+    # The incremental buckets agree with a rebuild from the assignments
+    incremental = _buckets(db)
+    db[DAILY_ROLLUPS_COLLECTION].delete_many({})
+    daily_rollups.backfill()
+    assert _buckets(db) == incremental
+
+
+def test_unchanged_airport_moves_nothing(db, client):
+    _seed(db)
+    before = _buckets(db)
+    assert client().put("/api/profile", json={"airport": "Tunis"}).status_code == 200
+    assert _buckets(db) == before
@@ -0,0 +1,93 @@
+"""
+ReferenceDescriptor.similarity against the original per-frame formula.
+
+The original check resized the current crop to the reference size, compared
+256-bin histograms with HISTCMP_CORREL, took TM_CCOEFF_NORMED at full crop
+size and 1 - MSE/255^2 on 64x64 thumbnails. The descriptor computes the
+template term on the thumbnails instead, so scores may drift slightly; the
+FACE_MISMATCH decision in apply_rules must not.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from frame_analysis import ReferenceDescriptor
+
+# combined_similarity threshold of the FACE_MISMATCH rule in proctoring.apply_rules
+MISMATCH_THRESHOLD = 0.7
+TOLERANCE = 0.015
+
+
+def original_similarity(reference, face):
+    face = cv2.resize(face, (reference.shape[1], reference.shape[0]))
+    hist = cv2.compareHist(
+        cv2.calcHist([reference], [0], None, [256], [0, 256]),
+        cv2.calcHist([face], [0], None, [256], [0, 256]),
+        cv2.HISTCMP_CORREL,
+    )
+    template = np.max(cv2.matchTemplate(face, reference, cv2.TM_CCOEFF_NORMED))
+    ref_small = cv2.resize(reference, (64, 64)).astype("float")
+    cur_small = cv2.resize(face, (64, 64)).astype("float")
+    ssim = 1 - np.mean((ref_small - cur_small) ** 2) / (255 ** 2)
+    return float(hist * 0.4 + template * 0.4 + ssim * 0.2)
+
+
+def synthetic_face(seed, width=120, height=150, eyes=0.35, mouth=0.72, skin=170):
+    """Grayscale face-like crop: head ellipse, eyes, nose and mouth plus sensor noise."""
+    img = np.full((height, width), 60, np.uint8)
+    cv2.ellipse(img, (width // 2, height // 2), (int(width * 0.42), int(height * 0.46)), 0, 0, 360, skin, -1)
+    for x in (0.32, 0.68):
+        cv2.circle(img, (int(width * x), int(height * eyes)), int(width * 0.07), 40, -1)
+    cv2.line(img, (width // 2, int(height * 0.42)), (width // 2, int(height * 0.58)), 120, 3)
+    cv2.ellipse(img, (width // 2, int(height * mouth)), (int(width * 0.18), int(height * 0.05)), 0, 0, 360, 90, -1)
+    img = cv2.GaussianBlur(img, (5, 5), 0)
+    noise = np.random.default_rng(seed).normal(0, 6, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+REFERENCE = synthetic_face(1)
+OTHER_PERSON = dict(eyes=0.45, mouth=0.8, skin=200)
+
+PAIRS = {
+    "same person, new frame": synthetic_face(3),
+    "same person, brighter": cv2.convertScaleAbs(synthetic_face(3), beta=15),
+    "same person, smaller crop": cv2.resize(synthetic_face(4), (100, 130)),
+    "same person, larger crop": cv2.resize(synthetic_face(6), (150, 180)),
+    "different person": synthetic_face(2, **OTHER_PERSON),
+}
+
+
+@pytest.mark.parametrize("name", list(PAIRS))
+def test_combined_score_matches_original(name):
+    face = PAIRS[name]
+    new = ReferenceDescriptor.from_face(REFERENCE).similarity(face)
+    assert new["combined"] == pytest.approx(original_similarity(REFERENCE, face), abs=TOLERANCE)
+    assert set(new) == {"hist", "template", "ssim", "combined"}
+
+
+def test_identical_face_scores_one():
+    assert ReferenceDescriptor.from_face(REFERENCE).similarity(REFERENCE.copy())["combined"] == pytest.approx(1.0, abs=1e-4)
+
+
+def test_mismatch_decision_matches_original_across_threshold():
+    """Blend the reference into another person and check both sides of the threshold."""
+    descriptor = ReferenceDescriptor.from_face(REFERENCE)
+    other = synthetic_face(5, **OTHER_PERSON)
+    sides = set()
+    for alpha in np.linspace(0, 1, 41):
+        face = cv2.addWeighted(REFERENCE, 1 - alpha, other, alpha, 0)
+        old = original_similarity(REFERENCE, face)
+        new = descriptor.similarity(face)["combined"]
+        assert new == pytest.approx(old, abs=TOLERANCE)
+        if abs(old - MISMATCH_THRESHOLD) > TOLERANCE:
+            assert (new < MISMATCH_THRESHOLD) == (old < MISMATCH_THRESHOLD), alpha
+            sides.add(old < MISMATCH_THRESHOLD)
+    assert sides == {True, False}
+
+
+def test_document_round_trip_keeps_scores():
+    descriptor = ReferenceDescriptor.from_face(REFERENCE)
+    restored = ReferenceDescriptor.from_document(descriptor.to_document())
+    for face in PAIRS.values():
+        assert restored.similarity(face) == pytest.approx(descriptor.similarity(face))
@@ -0,0 +1,93 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import frame_analysis
+import proctoring
+from frame_analysis import AnalysisOverloaded, FrameAnalysisPool, MotionGate, frame_thumbnail
+from proctoring import ProctoringSession, process_frame
+
+
+def _jpeg(shift=0):
+    img = np.full((480, 640, 3), 90, np.uint8)
+    cv2.ellipse(img, (320 + shift, 240), (110, 140), 0, 0, 360, (190, 170, 150), -1)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def _analysis(*args, **kwargs):
+    return {
+        "faces": [[260, 120, 120, 150]], "height": 480, "width": 640, "similarity": None,
+        "similarity_error": None, "new_reference": None, "eyes": None, "face_positions": None,
+        "checks": {}, "timings": {}, "analysis_ms": 1.0,
+    }
+
+
+def test_full_queue_sheds_frames_with_a_retry_hint(monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_analyze(*args):
+        entered.set()
+        release.wait(5)
+        return _analysis()
+
+    monkeypatch.setattr(frame_analysis, "analyze_frame", slow_analyze)
+    pool = FrameAnalysisPool(workers=0, max_pending=1, timeout=5, retry_after_ms=1000)
+    busy = threading.Thread(target=pool.analyze, args=(b"frame",))
+    busy.start()
+    try:
+        assert entered.wait(5)
+        with pytest.raises(AnalysisOverloaded) as shed:
+            pool.analyze(b"frame")
+        assert 1000 <= shed.value.retry_after_ms <= 1500
+    finally:
+        release.set()
+        busy.join(5)
+
+    metrics = pool.metrics()
+    assert (metrics["mode"], metrics["queue_depth"], metrics["analysed"], metrics["shed"]) == ("inline", 0, 1, 1)
+    assert pool.analyze(b"frame")["faces"]  # the slot is free again
+
+
+def test_shed_frame_tells_the_client_to_back_off(db):
+    def overloaded(*args):
+        raise AnalysisOverloaded(2000)
+
+    reply = proctoring.handle_frame("shed-assignment", _jpeg(), analyze=overloaded)
+    assert reply["skipped"] is True
+    assert reply["retry_after_ms"] == 2000
+    assert reply["next_interval_ms"] >= 2000
+    assert reply["alerts"] == []
+
+
+def test_motion_gate_decisions():
+    gate = MotionGate(enabled=True, threshold=4.0, max_age=10)
+    still = frame_thumbnail(_jpeg())
+    assert gate.should_reuse("a1", still, frame_thumbnail(_jpeg()), age=2.0)
+    assert not gate.should_reuse("a1", still, frame_thumbnail(_jpeg(shift=120)), age=2.0)
+    assert not gate.should_reuse("a1", still, still, age=11.0)
+    assert not gate.should_reuse("a1", None, still, age=None)
+    assert not MotionGate(enabled=False, threshold=4.0, max_age=10).should_reuse("a1", still, still, age=1.0)
+    assert gate.metrics()["reused"] == 1 and gate.metrics()["analysed"] == 3
+
+
+def test_unchanged_frame_reuses_the_last_verdict(monkeypatch):
+    monkeypatch.setattr(proctoring, "motion_gate", MotionGate(enabled=True, threshold=4.0, max_age=10))
+    calls = []
+
+    def analyze(*args):
+        calls.append(args)
+        return _analysis()
+
+    session = ProctoringSession("gate-assignment")
+    first, _ = process_frame(session, _jpeg(), 1000.0, analyze)
+    again, _ = process_frame(session, _jpeg(), 1002.0, analyze)
+    assert len(calls) == 1
+    assert again["faces"] == first["faces"]
+    assert session.last_analysis_at == 1000.0
+    assert session.last_face_time == 1002.0  # rule timers still advance on a reused verdict
+
+    process_frame(session, _jpeg(shift=120), 1004.0, analyze)
+    process_frame(session, _jpeg(shift=120), 1015.0, analyze)  # older than max_age
+    assert len(calls) == 3
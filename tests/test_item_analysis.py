@@ -0,0 +1,102 @@
+"""
+Item statistics on a hand-computed answer matrix.
+
+    candidate  q1 (key A)  q2 (key C)
+    c1         A  right    C  right
+    c2         A  right    -  blank
+    c3         B  wrong    D  wrong
+    c4         A  right    C  right
+
+q1: p = 3/4. The rest score is q2 = (1, 0, 0, 1), so the mean is 1/2 with
+sd 1/2. The mean rest score is 2/3 for right answers and 0 for the wrong
+one, so r_pb = (2/3 - 0) / (1/2) * sqrt(3/4 * 1/4) = 1/sqrt(3).
+q2: p = 1/2 against a rest score (1, 1, 0, 1), which by symmetry also gives
+r_pb = 1/sqrt(3).
+"""
+
+import datetime
+import math
+
+import pytest
+
+import item_analysis as item_analysis_module
+from configuration import ASSIGNMENTS_COLLECTION, ITEM_ANALYSIS_COLLECTION
+from item_analysis import ItemAnalysis
+
+ROWS = [("A", "C"), ("A", ""), ("B", "D"), ("A", "C")]
+
+
+def _answers(q1, q2):
+    return [
+        {"id": 1, "section": "Meteo", "your": q1, "correct": "A", "is_correct": q1 == "A"},
+        {"id": 2, "section": "Meteo", "your": q2, "correct": "C", "is_correct": q2 == "C"},
+    ]
+
+
+def _finish(db, rows, finished_at, **fields):
+    db[ASSIGNMENTS_COLLECTION].insert_many([
+        dict({"email": f"c{i}@example.com", "finished_at": finished_at, "answers": _answers(*row)}, **fields)
+        for i, row in enumerate(rows)
+    ])
+
+
+def _by_question(items):
+    return {item["question_id"]: item for item in items}
+
+
+def test_difficulty_and_discrimination_match_hand_computation(db):
+    _finish(db, ROWS, datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+    # Terminated attempts are not scored
+    _finish(db, [("B", "D")], datetime.datetime.utcnow() - datetime.timedelta(hours=1), terminated=True)
+    analysis = ItemAnalysis(chunk_size=3)  # forces two chunks
+    assert analysis.run()["candidates"] == 4
+
+    items = _by_question(analysis.items())
+    assert items[1]["difficulty"] == 0.75
+    assert items[2]["difficulty"] == 0.5
+    assert items[1]["discrimination"] == round(1 / math.sqrt(3), 3)
+    assert items[2]["discrimination"] == round(1 / math.sqrt(3), 3)
+    assert items[1]["option_rates"] == {"A": 0.75, "B": 0.25, "C": 0.0, "D": 0.0, "": 0.0}
+    assert items[2]["option_rates"] == {"A": 0.0, "B": 0.0, "C": 0.5, "D": 0.25, "": 0.25}
+
+
+def test_incremental_run_folds_in_only_new_submissions(db, monkeypatch):
+    monkeypatch.setattr(item_analysis_module, "_SETTLE_SECONDS", 0)
+    _finish(db, ROWS[:2], datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+    analysis = ItemAnalysis()
+    analysis.run()
+    first = analysis.watermark()
+    assert _by_question(analysis.items())[1]["responses"] == 2
+
+    _finish(db, ROWS[2:], datetime.datetime.utcnow())
+    # Finished before the watermark: an incremental run must not count it
+    _finish(db, [("B", "D")], first - datetime.timedelta(seconds=1))
+    assert analysis.run()["candidates"] == 2
+    assert analysis.watermark() > first
+    assert analysis.run()["candidates"] == 0  # nothing new since
+
+    incremental = _by_question(analysis.items())
+    assert incremental[1]["responses"] == 4
+    assert incremental[1]["difficulty"] == 0.75
+    assert incremental[1]["discrimination"] == round(1 / math.sqrt(3), 3)
+
+
+def test_full_run_replaces_items_in_place(db):
+    _finish(db, ROWS, datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+    analysis = ItemAnalysis()
+    analysis.run()
+    db[ITEM_ANALYSIS_COLLECTION].insert_one({"section": "Old", "question_id": 99, "responses": 5, "correct": 1})
+
+    assert analysis.run(full=True)["candidates"] == 4
+    items = _by_question(analysis.items())
+    assert set(items) == {1, 2}
+    assert items[1]["responses"] == 4
+    assert db[ITEM_ANALYSIS_COLLECTION].find_one({"_id": "_watermark"}) is not None
+
+
+def test_metrics_leave_undefined_discrimination_empty():
+    [item] = item_analysis_module.metrics([{"section": "S", "question_id": 1, "responses": 3, "correct": 3,
+                                           "rest_sum": 3, "rest_sq_sum": 3, "rest_correct_sum": 3}])
+    assert item["difficulty"] == 1.0
+    assert item["discrimination"] is None
+    assert pytest.approx(item["option_rates"][""]) == 0.0
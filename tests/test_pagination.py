@@ -0,0 +1,67 @@
+import datetime
+
+from configuration import ASSIGNMENTS_COLLECTION
+
+
+def _assignment(**fields):
+    doc = {
+        "email": "cand@example.com", "created_at": datetime.datetime(2026, 1, 1), "total": 2,
+        "answers": [{"id": 1, "your": "A", "correct": "A", "is_correct": True}], "selected": [1, 2],
+        "violation_log": [{"type": "TAB_SWITCH", "captured_image": "data:image/jpeg;base64,AAAA"}],
+        "reference_image": "data:image/jpeg;base64,AAAA",
+    }
+    doc.update(fields)
+    return doc
+
+
+def test_lists_default_to_the_summary_profile(db, client):
+    db[ASSIGNMENTS_COLLECTION].insert_one(_assignment())
+    admin = client("admin@example.com", "admin")
+    for url in ("/api/quiz-assignments", "/api/quiz-assignments?limit=10"):
+        body = admin.get(url).json
+        row = (body["items"] if isinstance(body, dict) else body)[0]
+        assert row["email"] == "cand@example.com"
+        assert not {"answers", "selected", "violation_log", "reference_image"} & set(row)
+    mine = client().get("/api/my/assignments").json[0]
+    assert "answers" not in mine and "violation_log" not in mine
+
+
+def test_detail_profile_is_explicit_and_never_carries_images(db, client):
+    db[ASSIGNMENTS_COLLECTION].insert_one(_assignment())
+    row = client("admin@example.com", "admin").get("/api/quiz-assignments?profile=detail").json[0]
+    assert row["answers"] and row["selected"] == [1, 2]
+    assert row["violation_log"] == [{"type": "TAB_SWITCH"}]
+    assert "reference_image" not in row
+
+
+def test_unknown_profile_is_rejected(db, client):
+    assert client("admin@example.com", "admin").get("/api/quiz-assignments?profile=full").status_code == 400
+
+
+def test_keyset_pages_cover_undated_documents_once(db, client):
+    dated = [_assignment(created_at=datetime.datetime(2026, 1, d)) for d in (1, 2, 2, 3)]
+    undated = [_assignment(created_at=None), _assignment(created_at=None)]
+    undated[1].pop("created_at")
+    ids = db[ASSIGNMENTS_COLLECTION].insert_many(dated + undated).inserted_ids
+    admin = client("admin@example.com", "admin")
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        query = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = admin.get("/api/quiz-assignments", query_string=query).json
+        seen += [row["assignment_id"] for row in page["items"]]
+        cursor, pages = page["next_cursor"], pages + 1
+        if not cursor:
+            break
+    assert pages == 3
+    # Newest first, ties broken by _id descending, undated documents last
+    expected = [ids[3], ids[2], ids[1], ids[0], ids[5], ids[4]]
+    assert seen == [str(i) for i in expected]
+    assert admin.get("/api/quiz-assignments?limit=2").json["total"] == 6
+
+
+def test_malformed_cursor_is_rejected(db, client):
+    admin = client("admin@example.com", "admin")
+    assert admin.get("/api/quiz-assignments?cursor=nope").status_code == 400
+    assert admin.get("/api/quiz-assignments?cursor=2026-01-01T00:00:00|zzz").status_code == 400
+    assert admin.get("/api/quiz-assignments?limit=0").status_code == 400
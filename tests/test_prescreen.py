@@ -0,0 +1,69 @@
+"""
+No-face grace period with browser pre-screening.
+
+Heartbeats carry only the browser's own face count, so they must not move
+the no-face timer: only frames the server analysed can.
+"""
+
+from proctoring import ProctoringSession, apply_rules, prescreen
+
+
+def analysis(faces):
+    return {
+        "faces": [[200, 150, 160, 160]] * faces, "height": 480, "width": 640,
+        "similarity": None, "similarity_error": None, "new_reference": None,
+        "eyes": None, "face_positions": None,
+    }
+
+
+def analysed_frame(session, faces, now):
+    """What process_frame does for a frame that went through analysis."""
+    result = analysis(faces)
+    session.last_analysis = result
+    session.last_analysis_at = now
+    return [a["type"] for a in apply_rules(session, result, now)]
+
+
+def test_heartbeat_does_not_touch_face_timer():
+    session = ProctoringSession("a1")
+    analysed_frame(session, 1, 1000.0)
+    prescreen.on_heartbeat(session, 1, 1030.0)
+    assert session.last_face_time == 1000.0
+
+
+def test_grace_starts_at_first_empty_frame_after_heartbeats():
+    session = ProctoringSession("a1")
+    analysed_frame(session, 1, 1000.0)
+    for t in range(1001, 1031):
+        prescreen.on_heartbeat(session, 1, float(t))
+    assert analysed_frame(session, 0, 1031.0) == []
+    assert analysed_frame(session, 0, 1040.0) == []
+    assert "NO_FACE" in analysed_frame(session, 0, 1047.0)
+
+
+def test_heartbeats_cannot_extend_a_no_face_run():
+    """A client answering with one-face heartbeats between empty audit frames still gets NO_FACE."""
+    session = ProctoringSession("a1")
+    analysed_frame(session, 1, 1000.0)
+    prescreen.on_heartbeat(session, 1, 1001.0)
+    raised = []
+    for t in range(1002, 1030, 2):
+        raised += analysed_frame(session, 0, float(t))
+        prescreen.on_heartbeat(session, 1, t + 1.0)
+    assert "NO_FACE" in raised
+
+
+def test_no_face_without_heartbeats_keeps_original_timing():
+    session = ProctoringSession("a1")
+    analysed_frame(session, 1, 1000.0)
+    assert analysed_frame(session, 0, 1010.0) == []
+    assert "NO_FACE" in analysed_frame(session, 0, 1016.0)
+
+
+def test_heartbeat_gap_survives_the_session_document():
+    session = ProctoringSession("a1")
+    analysed_frame(session, 1, 1000.0)
+    prescreen.on_heartbeat(session, 1, 1020.0)
+    restored = ProctoringSession.from_document(session.to_document())
+    assert restored.heartbeat_gap
+    assert analysed_frame(restored, 0, 1021.0) == []
@@ -0,0 +1,112 @@
+import datetime
+import threading
+
+import pytest
+from flask import Flask, jsonify
+
+from response_cache import ResponseCache
+
+
+def _expire(cache):
+    for entry in cache._entries.values():
+        entry.expires_at = 0
+
+
+@pytest.fixture
+def counted():
+    """(app client, cache, state) for a view returning {"value": state["value"]}."""
+    app = Flask(__name__)
+    cache = ResponseCache(enabled=True)
+    state = {"value": 1, "calls": 0, "status": 200}
+
+    @app.route("/value")
+    @cache.cached("value", ttl=60)
+    def value():
+        state["calls"] += 1
+        return jsonify({"value": state["value"]}), state["status"]
+
+    return app.test_client(), cache, state
+
+
+def test_fresh_entry_is_served_without_recomputing(counted):
+    client, cache, state = counted
+    first = client.get("/value")
+    state["value"] = 2
+    second = client.get("/value")
+    assert first.json == second.json == {"value": 1}
+    assert state["calls"] == 1
+    assert "public" in second.headers["Cache-Control"] and "max-age=60" in second.headers["Cache-Control"]
+    assert client.get("/value", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    assert client.get("/value?x=1").json == {"value": 2}  # the query string is part of the key
+
+
+def test_expired_entry_is_recomputed_with_a_new_etag(counted):
+    client, cache, state = counted
+    first = client.get("/value")
+    state["value"] = 2
+    _expire(cache)
+    second = client.get("/value")
+    assert second.json == {"value": 2}
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert client.get("/value", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+    assert cache.metrics()["value"]["misses"] == 2
+
+
+def test_errors_are_not_cached_and_keep_the_stale_copy(counted):
+    client, cache, state = counted
+    client.get("/value")
+    _expire(cache)
+    state["status"] = 500
+    assert client.get("/value").status_code == 500
+    state["status"] = 200
+    state["value"] = 3
+    assert client.get("/value").json == {"value": 3}
+    assert cache.metrics()["value"]["errors"] == 1
+
+
+def test_stale_copy_is_served_while_one_request_refreshes():
+    app = Flask(__name__)
+    cache = ResponseCache(enabled=True)
+    started, release = threading.Event(), threading.Event()
+    state = {"value": 1}
+
+    @app.route("/slow")
+    @cache.cached("slow", ttl=60)
+    def slow():
+        if state["value"] > 1:
+            started.set()
+            release.wait(5)
+        return jsonify({"value": state["value"]})
+
+    client = app.test_client()
+    client.get("/slow")
+    _expire(cache)
+    state["value"] = 2
+    refresher = threading.Thread(target=lambda: app.test_client().get("/slow"))
+    refresher.start()
+    try:
+        assert started.wait(5)
+        assert client.get("/slow").json == {"value": 1}
+    finally:
+        release.set()
+        refresher.join(5)
+    assert client.get("/slow").json == {"value": 2}
+    assert cache.metrics()["slow"]["stale"] == 1
+
+
+def test_success_rate_follows_new_results_once_its_entry_expires(db, monkeypatch):
+    from app import app
+    from configuration import ASSIGNMENTS_COLLECTION
+    from response_cache import stats_cache
+    from scores import _update_assignment
+
+    monkeypatch.setattr(stats_cache, "enabled", True)
+    monkeypatch.setattr(stats_cache, "_entries", {})
+    anonymous = app.test_client()
+    assert anonymous.get("/api/stats/success-rate").json["total_completed"] == 0
+
+    assignment_id = db[ASSIGNMENTS_COLLECTION].insert_one({"email": "cand@example.com", "finished_at": None}).inserted_id
+    _update_assignment({"_id": assignment_id}, {"$set": {"finished_at": datetime.datetime.utcnow(), "passed": True}})
+    assert anonymous.get("/api/stats/success-rate").json["total_completed"] == 0  # still cached
+    _expire(stats_cache)
+    assert anonymous.get("/api/stats/success-rate").json == {"failed": 0, "passed": 1, "success_rate": 100.0, "total_completed": 1}
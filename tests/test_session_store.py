@@ -0,0 +1,65 @@
+import threading
+import time
+
+from proctoring import MemorySessionBackend, MongoSessionBackend, ProctoringSession, SessionStore
+
+
+class BlockingBackend(MemorySessionBackend):
+    """Memory backend whose load of one session waits until released, like a slow Mongo read."""
+
+    def __init__(self, slow_id):
+        super().__init__(100)
+        self.slow_id = slow_id
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def load(self, assignment_id):
+        if assignment_id == self.slow_id:
+            self.entered.set()
+            self.release.wait(5)
+        return super().load(assignment_id)
+
+
+def test_slow_backend_io_does_not_block_other_sessions():
+    backend = BlockingBackend("slow")
+    store = SessionStore(backend, ttl_seconds=3600)
+    store.save(ProctoringSession("fast"))
+    slow = threading.Thread(target=store.get_or_create, args=("slow",))
+    slow.start()
+    try:
+        assert backend.entered.wait(5)
+        started = time.time()
+        assert store.get("fast").assignment_id == "fast"
+        store.save(ProctoringSession("other"))
+        store.discard("other")
+        assert time.time() - started < 1
+    finally:
+        backend.release.set()
+        slow.join(5)
+
+
+def test_memory_backend_is_safe_under_concurrent_saves():
+    store = SessionStore(MemorySessionBackend(50), ttl_seconds=3600)
+
+    def churn(offset):
+        for i in range(200):
+            store.save(ProctoringSession(f"s{offset + i}"))
+            store.get(f"s{offset + i // 2}")
+
+    threads = [threading.Thread(target=churn, args=(n * 1000,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store) == 50
+
+
+def test_mongo_backend_round_trip_and_idle_expiry(db):
+    store = SessionStore(MongoSessionBackend(3600), ttl_seconds=3600)
+    session = ProctoringSession("a1")
+    session.last_face_time = 123.0
+    store.save(session)
+    assert store.get("a1").last_face_time == 123.0
+
+    store.backend.evict_idle(time.time() + 1)
+    assert store.get("a1") is None
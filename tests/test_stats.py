@@ -0,0 +1,56 @@
+import datetime
+
+from configuration import ASSIGNMENTS_COLLECTION, DAILY_ROLLUPS_COLLECTION, QUESTION_USAGE_COLLECTION, STATS_COLLECTION
+from stats import STATS_ID, PlatformStats, question_usage
+
+NOW = datetime.datetime(2026, 3, 2, 10, 0)
+
+
+def _finished(**fields):
+    return dict({"finished_at": NOW, "passed": True, "percentage_score": 80.0}, **fields)
+
+
+def test_first_update_creates_the_stats_document(db):
+    stats = PlatformStats(reconcile_interval=3600)
+    stats.record({"finished_at": None}, _finished())
+    doc = db[STATS_COLLECTION].find_one({"_id": STATS_ID})
+    assert doc["completed"] == 1 and doc["passed"] == 1 and doc["best_score"] == 80.0
+    assert "reconciled_at" not in doc
+
+
+def test_read_recounts_a_document_never_reconciled(db):
+    db[ASSIGNMENTS_COLLECTION].insert_many([_finished(), _finished(passed=False, percentage_score=40.0)])
+    stats = PlatformStats(reconcile_interval=3600)
+    stats.record({"finished_at": None}, _finished())  # counted before the first recount
+    doc = stats.read()
+    assert (doc["completed"], doc["passed"], doc["failed"]) == (2, 1, 1)
+    assert doc["reconciled_at"] is not None
+
+
+def test_stats_writer_leaves_usage_and_rollups_alone(db):
+    PlatformStats(reconcile_interval=3600).record({"finished_at": None}, _finished(selected=[{"section": "Meteo", "id": 1}]))
+    assert db[QUESTION_USAGE_COLLECTION].count_documents({}) == 0
+    assert db[DAILY_ROLLUPS_COLLECTION].count_documents({}) == 0
+
+
+def test_question_usage_counts_only_the_finishing_update(db):
+    selected = [{"section": "Meteo", "id": 1}, {"section": "Meteo", "id": 2}]
+    question_usage.assignment_updated({"finished_at": None, "selected": selected}, {"finished_at": NOW})
+    question_usage.assignment_updated({"finished_at": NOW, "selected": selected}, {"finished_at": NOW, "terminated": True})
+    assert question_usage.top("section") == [{"section": "Meteo", "question_id": None, "count": 2}]
+
+
+def test_assignment_writes_update_counters_usage_and_rollups(db):
+    from scores import _update_assignment
+
+    assignment_id = db[ASSIGNMENTS_COLLECTION].insert_one({
+        "email": "cand@example.com", "airport": "Tunis", "created_at": NOW, "started_at": NOW,
+        "finished_at": None, "selected": [{"section": "Meteo", "id": 1}],
+    }).inserted_id
+    before = _update_assignment({"_id": assignment_id}, {"$set": _finished()})
+    assert before["finished_at"] is None
+    assert db[STATS_COLLECTION].find_one({"_id": STATS_ID})["completed"] == 1
+    assert db[QUESTION_USAGE_COLLECTION].count_documents({"kind": "question"}) == 1
+    bucket = db[DAILY_ROLLUPS_COLLECTION].find_one({"kind": "airport", "airport": "Tunis"})
+    assert bucket["finished"] == 1 and bucket["passed"] == 1
+    assert _update_assignment({"_id": "missing"}, {"$set": {"finished_at": NOW}}) is None
@@ -0,0 +1,73 @@
+import base64
+
+import cv2
+import numpy as np
+import pytest
+
+import blob_store
+from configuration import ASSIGNMENTS_COLLECTION
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store.image_store, "backend", blob_store.DiskBackend(str(tmp_path)))
+    return blob_store.image_store
+
+
+def _jpeg(width=640, height=480):
+    img = np.zeros((height, width, 3), np.uint8)
+    cv2.circle(img, (width // 2, height // 2), height // 3, (200, 180, 160), -1)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def _assignment(db, *violations):
+    return str(db[ASSIGNMENTS_COLLECTION].insert_one({"email": "cand@example.com", "violation_log": list(violations)}).inserted_id)
+
+
+def test_image_is_served_with_content_etag_and_revalidates_to_304(db, client, store):
+    data = _jpeg()
+    key = store.put(data)
+    assignment_id = _assignment(db, {"type": "TAB_SWITCH", "image_id": key})
+    admin = client("admin@example.com", "admin")
+
+    first = admin.get(f"/api/violation-image/{assignment_id}/0")
+    assert first.status_code == 200
+    assert first.data == data and first.mimetype == "image/jpeg"
+    assert first.headers["ETag"] == f'"{key}"'
+    assert "immutable" in first.headers["Cache-Control"] and "private" in first.headers["Cache-Control"]
+
+    again = admin.get(f"/api/violation-image/{assignment_id}/0", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+
+
+def test_thumbnail_has_its_own_etag(db, client, store):
+    key = store.put(_jpeg())
+    assignment_id = _assignment(db, {"type": "TAB_SWITCH", "image_id": key})
+    admin = client("admin@example.com", "admin")
+
+    thumb = admin.get(f"/api/violation-image/{assignment_id}/0?size=thumb")
+    assert thumb.status_code == 200
+    assert thumb.headers["ETag"] == f'"{key}.thumb"'
+    assert cv2.imdecode(np.frombuffer(thumb.data, np.uint8), cv2.IMREAD_COLOR).shape[1] == blob_store.IMAGE_THUMBNAIL_WIDTH
+    stale = admin.get(f"/api/violation-image/{assignment_id}/0?size=thumb", headers={"If-None-Match": f'"{key}"'})
+    assert stale.status_code == 200
+
+
+def test_legacy_inline_image_gets_the_same_etag(db, client, store):
+    data = _jpeg()
+    inline = "data:image/jpeg;base64," + base64.b64encode(data).decode()
+    assignment_id = _assignment(db, {"type": "NO_FACE", "captured_image": inline})
+    admin = client("admin@example.com", "admin")
+
+    r = admin.get(f"/api/violation-image/{assignment_id}/0")
+    assert r.data == data
+    assert r.headers["ETag"] == f'"{store.key_for(data)}"'
+    assert admin.get(f"/api/violation-image/{assignment_id}/0", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+
+
+def test_missing_image_and_access(db, client, store):
+    assignment_id = _assignment(db, {"type": "TAB_SWITCH"})
+    assert client("admin@example.com", "admin").get(f"/api/violation-image/{assignment_id}/0").status_code == 404
+    assert client("admin@example.com", "admin").get(f"/api/violation-image/{assignment_id}/5").status_code == 404
+    assert client().get(f"/api/violation-image/{assignment_id}/0").status_code == 403
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+
+from configuration import ASSIGNMENTS_COLLECTION
+from violation_log import ViolationBuffer, is_critical, violation_buffer
+
+
+@pytest.mark.parametrize("violation_type", [
+    "NO_FACE", "no_face", "MULTIPLE_FACES", "multiple_faces", "FACE_MISMATCH", "face_mismatch",
+    "no_face_detected", "seat_movement", "DISTANCE_CHANGE", "distance_change",
+])
+def test_terminating_violations(violation_type):
+    assert is_critical(violation_type)
+
+
+@pytest.mark.parametrize("violation_type", ["TAB_SWITCH", "looking_away", "AUDIT_MISSED", "", None])
+def test_other_violations_are_buffered(violation_type):
+    assert not is_critical(violation_type)
+
+
+def test_lower_cased_critical_violation_terminates_at_once(db, client):
+    """The exam page sends alert.type.toLowerCase(); it must not wait in the buffer."""
+    assignment_id = db[ASSIGNMENTS_COLLECTION].insert_one({
+        "email": "cand@example.com", "created_at": datetime.datetime.utcnow(), "violations": 0,
+    }).inserted_id
+    r = client().post("/api/log-violation", json={"assignment_id": str(assignment_id), "type": "no_face", "message": "gone"})
+    assert r.status_code == 200
+    doc = db[ASSIGNMENTS_COLLECTION].find_one({"_id": assignment_id})
+    assert doc["terminated"] is True
+    assert doc["termination_reason"] == "no_face"
+    assert [v["type"] for v in doc["violation_log"]] == ["no_face"]
+
+
+def _new_assignment(db):
+    return str(db[ASSIGNMENTS_COLLECTION].insert_one({
+        "email": "cand@example.com", "created_at": datetime.datetime.utcnow(), "violations": 0, "violation_log": [],
+    }).inserted_id)
+
+
+def test_repeats_within_the_window_become_one_entry(db):
+    assignment_id = _new_assignment(db)
+    buffer = ViolationBuffer(window=60, max_batch=10)
+    for i in range(5):
+        buffer.add({"assignment_id": assignment_id, "type": "TAB_SWITCH", "timestamp": f"t{i}"})
+    buffer.add({"assignment_id": assignment_id, "type": "LOOKING_AWAY", "timestamp": "t9"})
+    assert db[ASSIGNMENTS_COLLECTION].find_one()["violation_log"] == []
+
+    assert buffer.flush(assignment_id) == 2
+    doc = db[ASSIGNMENTS_COLLECTION].find_one()
+    assert doc["violations"] == 6
+    log = {v["type"]: v for v in doc["violation_log"]}
+    assert log["TAB_SWITCH"]["count"] == 5
+    assert log["TAB_SWITCH"]["timestamp"] == "t0" and log["TAB_SWITCH"]["last_timestamp"] == "t4"
+    assert log["LOOKING_AWAY"]["count"] == 1
+    metrics = buffer.metrics()
+    assert (metrics["received"], metrics["merged"], metrics["written"], metrics["batches"], metrics["pending"]) == (6, 4, 2, 1, 0)
+
+
+def test_zero_window_writes_every_violation(db):
+    assignment_id = _new_assignment(db)
+    buffer = ViolationBuffer(window=0, max_batch=10)
+    buffer.add({"assignment_id": assignment_id, "type": "TAB_SWITCH"})
+    buffer.add({"assignment_id": assignment_id, "type": "TAB_SWITCH"})
+    assert db[ASSIGNMENTS_COLLECTION].find_one()["violations"] == 2
+
+
+def test_critical_violation_flushes_buffered_entries_first(db, client):
+    assignment_id = _new_assignment(db)
+    candidate = client()
+    for _ in range(3):
+        assert candidate.post("/api/log-violation", json={"assignment_id": assignment_id, "type": "tab_switch"}).status_code == 200
+    assert db[ASSIGNMENTS_COLLECTION].find_one()["violation_log"] == []
+
+    candidate.post("/api/log-violation", json={"assignment_id": assignment_id, "type": "FACE_MISMATCH"})
+    doc = db[ASSIGNMENTS_COLLECTION].find_one()
+    assert [(v["type"], v.get("count", 1)) for v in doc["violation_log"]] == [("tab_switch", 3), ("FACE_MISMATCH", 1)]
+    assert doc["violations"] == 4
+    assert doc["terminated"] is True
+    assert violation_buffer.flush(assignment_id) == 0
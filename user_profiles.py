@@ -0,0 +1,88 @@
+"""
+Display-name resolution for user emails.
+
+Endpoints that label rows with user names ask for all their emails at
+once: cached names are served from memory and the rest are loaded with a
+single $in query. Names are cached for USER_PROFILE_CACHE_TTL seconds,
+including "no such user", and forgotten when a profile changes.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from configuration import get_db, USERS_COLLECTION, USER_PROFILE_CACHE_TTL, USER_PROFILE_CACHE_SIZE
+
+
+def fallback_name(email: Optional[str]) -> str:
+    return email.split("@")[0] if email else "Unknown"
+
+
+class UserProfiles:
+    """LRU + TTL cache of email -> display_name (or username) over the users collection."""
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._names: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    def display_names(self, emails: Iterable[Optional[str]]) -> Dict[str, str]:
+        """Display name for each email, falling back to the local part of the address."""
+        wanted = {e for e in emails if e}
+        found: Dict[str, Optional[str]] = {}
+        now = time.time()
+        with self._lock:
+            for email in wanted:
+                cached = self._names.get(email)
+                if cached is not None and cached[1] > now:
+                    self._names.move_to_end(email)
+                    found[email] = cached[0]
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+
+        missing = wanted - found.keys()
+        if missing:
+            loaded: Dict[str, Optional[str]] = {email: None for email in missing}
+            for user in get_db()[USERS_COLLECTION].find(
+                {"email": {"$in": list(missing)}}, {"email": 1, "display_name": 1, "username": 1}
+            ):
+                loaded[user["email"]] = user.get("display_name") or user.get("username")
+            with self._lock:
+                self.queries += 1
+                expires_at = now + self.ttl
+                for email, name in loaded.items():
+                    self._names[email] = (name, expires_at)
+                    self._names.move_to_end(email)
+                while len(self._names) > self.max_entries:
+                    self._names.popitem(last=False)
+            found.update(loaded)
+
+        return {email: name or fallback_name(email) for email, name in found.items()}
+
+    def display_name(self, email: Optional[str]) -> str:
+        if not email:
+            return fallback_name(email)
+        return self.display_names([email])[email]
+
+    def airport(self, email: Optional[str]) -> Optional[str]:
+        """The user's current airport, read fresh (not cached) since it is copied into assignments."""
+        if not email:
+            return None
+        user = get_db()[USERS_COLLECTION].find_one({"email": email}, {"airport": 1})
+        return (user or {}).get("airport") or None
+
+    def forget(self, email: Optional[str]) -> None:
+        with self._lock:
+            self._names.pop(email, None)
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {"cached": len(self._names), "hits": self.hits, "misses": self.misses, "queries": self.queries}
+
+
+user_profiles = UserProfiles(USER_PROFILE_CACHE_TTL, USER_PROFILE_CACHE_SIZE)
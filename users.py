@@ -14,6 +14,9 @@ from werkzeug.utils import secure_filename
 
 from configuration import get_db, USERS_COLLECTION, NOTIFICATIONS_COLLECTION, ASSIGNMENTS_COLLECTION, USER_ATTEMPTS_COLLECTION, SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SMTP_FROM_EMAIL, SMTP_FROM_NAME
 from login import _current_user_claims
+from stats import daily_rollups, platform_stats
+from user_profiles import user_profiles
+from pagination import find_page, page_args, page_response, page_total
 
 
 users_bp = Blueprint("users", __name__)
@@ -113,9 +116,11 @@ def auto_assign_quiz_to_user(target_email: str) -> bool:
             "score": None,
             "total_with_keys": None,
             "attempted": None,
+            "airport": user_profiles.airport(target_email),  # copied for per-airport reports
         }
 
         result = db[ASSIGNMENTS_COLLECTION].insert_one(doc)
+        daily_rollups.assignment_created(doc)
 
         # Send assignment notification email
         try:
@@ -218,6 +223,26 @@ TUNISIA_AIRPORTS = [
     "Remada (RMA)",
 ]
 
+def _sync_assignment_airport(email: str, airport: Any) -> None:
+    """Keep the airport copied onto the user's unfinished assignments in step with their profile.
+
+    Their created/started rollup counts move with them. Finished assignments
+    are history: they and their rollup buckets keep the airport they were
+    taken at (`python maintenance.py backfill-airports` rewrites them).
+    """
+    try:
+        coll = get_db()[ASSIGNMENTS_COLLECTION]
+        moved = []
+        # One update per assignment (a user has few open ones): only those still unfinished move their counts
+        for doc in coll.find({"email": email, "finished_at": None, "airport": {"$ne": airport}},
+                             {"created_at": 1, "started_at": 1, "airport": 1}):
+            if coll.update_one({"_id": doc["_id"], "finished_at": None}, {"$set": {"airport": airport}}).modified_count:
+                moved.append(doc)
+        daily_rollups.assignments_moved(moved, airport)
+    except Exception as e:
+        print(f"Failed to update assignment airport for {email}: {e}")
+
+
 @users_bp.route("/api/airports", methods=["GET"])  # list Tunisia airports
 def list_airports():
     claims = _current_user_claims()
@@ -621,6 +646,7 @@ def create_user():
     }
     
     users.insert_one(user_data)
+    platform_stats.user_added()
 
     # Automatically assign a quiz to the new user
     quiz_assigned = auto_assign_quiz_to_user(email)
@@ -637,6 +663,12 @@ def create_user():
     })
 
 
+USER_PROFILES = {
+    "summary": {"email": 1, "name": 1, "matricule": 1, "role": 1, "airport": 1, "created_at": 1},
+    "detail": {"password_hash": 0},
+}
+
+
 @users_bp.route("/api/users", methods=["GET"])  # admin list users
 def list_users():
     claims = _current_user_claims()
@@ -644,8 +676,25 @@ def list_users():
         return jsonify({"error": "Unauthorized"}), 401
     if claims.get("role") != "admin":
         return jsonify({"error": "Forbidden"}), 403
-    cursor = get_db()[USERS_COLLECTION].find({}, {"_id": 0, "password_hash": 0}).sort("created_at", -1)
-    return jsonify(list(cursor))
+    try:
+        limit, cursor, projection = page_args(USER_PROFILES)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query: Dict[str, Any] = {}
+    if request.args.get("airport"):
+        query["airport"] = request.args["airport"]
+    if request.args.get("q"):
+        # email or matricule containing the search text
+        import re
+        pattern = {"$regex": re.escape(request.args["q"].strip()), "$options": "i"}
+        query["$or"] = [{"email": pattern}, {"matricule": pattern}]
+    coll = get_db()[USERS_COLLECTION]
+    docs, next_cursor = find_page(coll, query, projection, limit, cursor, index_prefix=("airport",) if "airport" in query else ())
+    for d in docs:
+        d.pop("_id", None)
+    if limit is None:
+        return jsonify(docs)
+    return jsonify(page_response(docs, next_cursor, page_total(coll, query)))
 
 
 @users_bp.route("/api/users/<path:target_email>", methods=["PUT"])  # admin updates a user (role/airport/matricule)
@@ -681,6 +730,8 @@ def admin_update_user(target_email: str):
     result = db[USERS_COLLECTION].update_one({"email": str(target_email).lower()}, {"$set": updates})
     if result.matched_count == 0:
         return jsonify({"error": "User not found"}), 404
+    if "airport" in updates:
+        _sync_assignment_airport(str(target_email).lower(), updates["airport"])
     return jsonify({"ok": True})
 
 
@@ -695,6 +746,8 @@ def admin_delete_user(target_email: str):
     res = db[USERS_COLLECTION].delete_one({"email": str(target_email).lower()})
     if res.deleted_count == 0:
         return jsonify({"error": "User not found"}), 404
+    platform_stats.user_removed()
+    user_profiles.forget(str(target_email).lower())
     return jsonify({"ok": True})
 
 
@@ -737,6 +790,9 @@ def update_profile():
         return jsonify({"error": "No updates"}), 400
     db = get_db()
     db[USERS_COLLECTION].update_one({"email": claims.get("email")}, {"$set": updates})
+    user_profiles.forget(claims.get("email"))
+    if "airport" in updates:
+        _sync_assignment_airport(claims.get("email"), updates["airport"])
     return jsonify({"ok": True})
 
 
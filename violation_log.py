@@ -0,0 +1,166 @@
+"""
+Coalescing of proctoring violation writes.
+
+A flapping detector can report the same violation many times a minute.
+Repeats of one (assignment, type) within the window become a single
+violation_log entry with a count and one representative image, and due
+entries are written together in one bulk_write. Critical violations do not
+go through the buffer: log_violation writes them at once.
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from configuration import get_db, ASSIGNMENTS_COLLECTION, VIOLATION_COALESCE_WINDOW, VIOLATION_FLUSH_BATCH
+from blob_store import image_store
+
+
+# Violations that terminate the quiz, compared upper-cased (the exam page lower-cases alert types)
+CRITICAL_VIOLATIONS = {
+    "NO_FACE_DETECTED", "SEAT_MOVEMENT", "NO_FACE", "MULTIPLE_FACES", "FACE_MISMATCH", "DISTANCE_CHANGE",
+}
+
+
+def is_critical(violation_type: Optional[str]) -> bool:
+    return str(violation_type or "").upper() in CRITICAL_VIOLATIONS
+
+
+def store_image(violation: Dict[str, Any], captured_image: Optional[str]) -> None:
+    """Put the captured image in the blob store and reference it from ``violation``."""
+    if not captured_image:
+        return
+    try:
+        violation["image_id"] = image_store.put_data_url(captured_image)
+    except Exception as e:
+        # Keep the evidence inline rather than lose it
+        print(f"Image store unavailable, keeping violation image inline: {e}")
+        violation["captured_image"] = captured_image
+
+
+class ViolationBuffer:
+    """Per-process buffer of non-critical violations, keyed by (assignment, type).
+
+    The first report of a key opens a window of ``window`` seconds; repeats
+    only bump the entry's count and last_timestamp. Entries are written once
+    their window closes, by a background flusher and by the next add() on
+    hosts that freeze between requests.
+    """
+
+    def __init__(self, window: float, max_batch: int) -> None:
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._flusher: Optional[threading.Thread] = None
+        self.received = 0
+        self.merged = 0
+        self.written = 0
+        self.batches = 0
+
+    def add(self, violation: Dict[str, Any], captured_image: Optional[str] = None) -> None:
+        now = time.time()
+        entry = {"violation": dict(violation, count=1), "image": captured_image or None, "due": now + self.window}
+        with self._lock:
+            self.received += 1
+            if self.window > 0:
+                key = (str(violation.get("assignment_id")), str(violation.get("type")))
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = entry
+                    self._start_flusher()
+                else:
+                    self.merged += 1
+                    merged = pending["violation"]
+                    merged["count"] += 1
+                    merged["last_timestamp"] = violation.get("timestamp")
+                    # One representative image per entry: the first one captured
+                    pending["image"] = pending["image"] or entry["image"]
+                entry = None
+        if entry is not None:
+            self._write([entry])
+        self.flush(due_only=True)
+
+    def flush(self, assignment_id: Optional[str] = None, due_only: bool = False) -> int:
+        """Write pending entries (all, one assignment's, or only those due). Returns entries written."""
+        # Entries about to close ride along, so one flush covers a burst of windows
+        now = time.time() + self.window * 0.1
+        with self._lock:
+            keys = [
+                key for key, entry in self._pending.items()
+                if (assignment_id is None or key[0] == str(assignment_id))
+                and (not due_only or entry["due"] <= now)
+            ]
+            entries = [self._pending.pop(key) for key in keys]
+        if entries:
+            self._write(entries)
+        return len(entries)
+
+    def _write(self, entries: List[Dict[str, Any]]) -> None:
+        from bson import ObjectId
+        from pymongo import UpdateOne
+
+        by_assignment: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for entry in entries:
+            violation = entry["violation"]
+            store_image(violation, entry["image"])
+            by_assignment.setdefault(str(violation.get("assignment_id")), []).append(violation)
+
+        ops = []
+        for assignment_id, violations in by_assignment.items():
+            try:
+                oid = ObjectId(assignment_id)
+            except Exception:
+                print(f"Dropping violations for invalid assignment id {assignment_id!r}")
+                continue
+            ops.append((UpdateOne({"_id": oid}, {
+                "$inc": {"violations": sum(v["count"] for v in violations)},
+                "$push": {"violation_log": {"$each": violations}},
+            }), len(violations)))
+
+        coll = get_db()[ASSIGNMENTS_COLLECTION]
+        for i in range(0, len(ops), self.max_batch):
+            batch = ops[i:i + self.max_batch]
+            try:
+                coll.bulk_write([op for op, _ in batch], ordered=False)
+            except Exception as e:
+                print(f"Violation flush failed for {len(batch)} assignments: {e}")
+                continue
+            with self._lock:
+                self.batches += 1
+                self.written += sum(n for _, n in batch)
+
+    def _start_flusher(self) -> None:
+        # Called with the lock held
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run_flusher, name="violation-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._flusher = None
+                    return
+                wait = min(entry["due"] for entry in self._pending.values()) - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self.flush(due_only=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window_seconds": self.window,
+                "received": self.received,
+                "merged": self.merged,
+                "merged_share": round(self.merged / self.received, 3) if self.received else None,
+                "written": self.written,
+                "batches": self.batches,
+                "pending": len(self._pending),
+            }
+
+
+violation_buffer = ViolationBuffer(VIOLATION_COALESCE_WINDOW, VIOLATION_FLUSH_BATCH)
+atexit.register(violation_buffer.flush)